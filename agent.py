@@ -9,25 +9,40 @@ class Agent(Abstract):
 	def __init__(self, simulation, memberID):
 		self._sim = simulation
 		self.member = memberID
-		self.cstate = simulation.state.members[memberID]
-		self.cstats = simulation.stats[memberID]
 		# self.astate = AgentState()
 
+	# The member's state and stats are looked up on use: resetMember() installs a new Member
+	#   and loading a state replaces the whole State, so a stored reference would go stale
+	@property
+	def cstate(self):
+		return self._sim.state.members[self.member]
+
+	@property
+	def cstats(self):
+		return self._sim.stats[self.member]
+
 	def __str__(self):
 		# This is probably a hacky solution, consider refactoring
 		# The goal is to return the filename associated with the agent (same value one would use to init this class within Simulation)
 		return self.__module__.split(".")[-1]
 
-	# Determines the potential targets for a cast event
-	# TODO: Consider moving this to a simulation class member function
+	# Position index of the member in the battle circle (None if they are not in it)
+	def slot(self):
+		position = self._sim.state.position
+		return position.index(self.member) if self.member in position else None
+
+	# Position indexes of the opposing side (agents should target relative to their own side,
+	#   as the same agent may play either side, e.g. in a tournament)
+	def opponents(self):
+		slot = self.slot()
+		return range(0, 4) if slot is not None and slot >= 4 else range(4, 8)
+
+	# Determines the legal selections (and their targets) for a cast event
 	# This function is not built with the intent of being overridden (excluding wild cheats like HoH)
-	# spell -> spellID of intended cast
+	# Returns a tuple of (spell index, target) pairs with (None, None) first (see Simulation.legalMoves())
+	# TODO: Determine if threat impacts the available selections
 	def getTargets(self):
-		# Categorize the battle members
-		friendlies = []
-		opponents = []
-
-		# TODO: Determine if threat impacts the available selections
+		return self._sim.legalMoves(self.member)
 
 	# Returns tuple of selected spell (index) and target index (or list of target indexes)
 	@abstractmethod
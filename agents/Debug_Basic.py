@@ -9,8 +9,6 @@
 from agent import Agent as Base
 # from agent import AgentState
 
-from random import random
-
 class Agent(Base):
     def select(self):
         # Select first spell on opponent
@@ -18,7 +16,7 @@ class Agent(Base):
 
         spellIdx = None
         weights = [0.2, 0.2, 0.3]   # Pass = 0.3
-        rand = random()
+        rand = self._sim.rng.random()
         cum = 0
         for i, x in enumerate(weights):
             cum += x
@@ -27,8 +25,8 @@ class Agent(Base):
                 break
         
         # Blade is cast on self
-        target = 4
+        target = self.opponents()[0]
         if spellIdx == 0:
-            target = 0
+            target = self.slot()
         
         return spellIdx, target
\ No newline at end of file
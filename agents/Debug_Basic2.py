@@ -9,15 +9,13 @@
 from agent import Agent as Base
 # from agent import AgentState
 
-from random import random
-
 class Agent(Base):
     def select(self):
         # return 0, 0
 
         spellIdx = None
         weights = [0.3, 0.2, 0.2]   # Pass = 0.3
-        rand = random()
+        rand = self._sim.rng.random()
         cum = 0
         for i, x in enumerate(weights):
             cum += x
@@ -26,8 +24,8 @@ class Agent(Base):
                 break
         
         # Blade is cast on self
-        target = 0
+        target = self.opponents()[0]
         if spellIdx == 0:
-            target = 4
+            target = self.slot()
         
         return spellIdx, target
\ No newline at end of file
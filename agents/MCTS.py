@@ -0,0 +1,236 @@
+# -- AGENT INFO --
+# Monte Carlo tree search agent.
+# Plays out many battles from clones of the current simulation and picks the most visited selection.
+# The tree is "open loop": nodes are sequences of this member's own selections, while the other
+# members (and every chance event) are sampled fresh in each rollout.
+#
+# Tuning (set as attributes after Simulation.loadAgent()):
+#   iterations  -> Rollouts per decision (None for no limit)
+#   budget      -> Wall-clock seconds per decision (None for no limit; DEFAULT_BUDGET if iterations is also None)
+#   workers     -> Processes for root parallelism (each grows its own tree; visit counts are summed)
+#   horizon     -> Rounds to play past the current round before scoring a rollout with evalState()
+#   exploration -> UCB1 exploration constant
+# After each decision, self.report holds the search statistics (including nodes/sec).
+
+# ================
+
+from agent import Agent as Base
+
+from json import loads
+from math import log, sqrt
+from multiprocessing import Pool
+from random import Random
+from time import perf_counter
+
+from datatypes import EventType, LogLevel, Status
+from state import Event, TURN
+
+PASS = (None, None)
+DEFAULT_BUDGET = 1.0    # Seconds per decision when neither iterations nor budget limits the search
+
+
+# Plays uniformly random legal selections (used for every member during the rollout phase)
+# Legal moves come from Simulation.legalMoves() (cached by the state between changes)
+class RolloutAgent(Base):
+    def select(self):
+        moves = self._sim.legalMoves(self.member)
+        return moves[self._sim.rng.randrange(len(moves))]
+
+
+# Stands in for the searching member inside a rollout: follows the tree, expands one node, then plays randomly
+class TreeAgent(Base):
+    def __init__(self, simulation, memberID, search):
+        super().__init__(simulation, memberID)
+        self._search = search
+
+    def select(self):
+        return self._search.step(self._sim, self.member)
+
+
+# Statistics for a sequence of the member's selections
+class Node:
+    def __init__(self):
+        self.visits = 0
+        self.value = 0.0
+        self.children = {}      # Dict of move -> Node
+        self.untried = None     # Moves not yet expanded (filled on first visit)
+
+
+# One search tree (one per worker with root parallelism)
+class Search:
+    def __init__(self, exploration, rng):
+        self.root = Node()
+        self.exploration = exploration
+        self.rng = rng
+        self.nodes = 0          # Simulated battle events (advance() calls)
+
+        self._node = None       # Current node of the rollout (None once the rollout leaves the tree)
+        self._path = None
+
+    # Choose the next selection of the searching member within a rollout
+    def step(self, sim, memberID):
+        node = self._node
+        if node is None:
+            moves = sim.legalMoves(memberID)
+            return moves[sim.rng.randrange(len(moves))]
+
+        if node.untried is None:
+            node.untried = list(sim.legalMoves(memberID))
+            self.rng.shuffle(node.untried)
+
+        # Expand one untried selection, then leave the tree
+        if len(node.untried) > 0:
+            move = node.untried.pop()
+            child = Node()
+            node.children[move] = child
+            self._path.append(child)
+            self._node = None
+            return move
+
+        # UCB1 over the expanded selections
+        logN = log(max(1, node.visits))
+        best, bestScore = None, None
+        for move, child in node.children.items():
+            score = child.value / child.visits + self.exploration * sqrt(logN / child.visits)
+            if bestScore is None or score > bestScore: best, bestScore = move, score
+
+        child = node.children[best]
+        self._path.append(child)
+        self._node = child
+        return best
+
+    # Play one rollout from a clone of sim and update the tree
+    # side -> 1 if the member fights for the friendly team, else -1
+    def iterate(self, sim, memberID, side, horizon):
+        rollout = sim.clone(self.rng.getrandbits(32))
+        for mID in sim.agents:
+            if mID == memberID: rollout.agents[mID] = TreeAgent(rollout, mID, self)
+            else: rollout.agents[mID] = RolloutAgent(rollout, mID)
+
+        # The member's PLAN event has already been taken from the state by advance(); put it back
+        state = rollout.state
+        pending = state.nextEvent()
+        if not (pending is not None and pending.member == memberID and pending.type == EventType.PLAN):
+            state.pushEvent(Event(memberID), TURN, state.position.index(memberID))
+
+        self._node = self.root
+        self._path = [self.root]
+
+        lastRound = state.round + horizon
+        status = Status.CONTINUE
+        while state.round <= lastRound:
+            status = rollout.advance()
+            self.nodes += 1
+            if status != Status.CONTINUE and status != Status.ROUND_END: break
+
+        match status:
+            case Status.A_VICTORY: value = 1.0
+            case Status.B_VICTORY: value = -1.0
+            case Status.STALEMATE: value = 0.0
+            case other: value = rollout.evalState()
+        value *= side
+
+        for node in self._path:
+            node.visits += 1
+            node.value += value
+
+    def run(self, sim, memberID, side, horizon, iterations, budget):
+        start = perf_counter()
+        count = 0
+        while True:
+            if iterations is not None and count >= iterations: break
+            if budget is not None and perf_counter() - start >= budget: break
+            self.iterate(sim, memberID, side, horizon)
+            count += 1
+
+        return count, perf_counter() - start
+
+
+# -- ROOT PARALLELISM --
+# Each worker keeps one simulation so member stats and spells are only loaded once per process
+_worker = None
+
+def _search(args):
+    global _worker
+    stateStr, agents, memberID, side, horizon, iterations, budget, exploration, randseed = args
+
+    from simulation import Simulation
+    if _worker is None: _worker = Simulation(verbosity = LogLevel.NONE)
+    _worker.loadState(loads(stateStr))
+    _worker.agents = {mID: None for mID in agents}
+
+    search = Search(exploration, Random(randseed))
+    count, elapsed = search.run(_worker, memberID, side, horizon, iterations, budget)
+    children = {move: (child.visits, child.value) for move, child in search.root.children.items()}
+    return children, count, search.nodes, elapsed
+
+
+class Agent(Base):
+    iterations = 200
+    budget = None
+    workers = 1
+    horizon = 10
+    exploration = 1.4
+
+    def __init__(self, simulation, memberID):
+        super().__init__(simulation, memberID)
+        self.report = None
+        self._pool = None
+
+    def __del__(self):
+        self.close()
+
+    # Shut down the worker pool (if one was started)
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def select(self):
+        sim = self._sim
+
+        # A member outside the circle has nothing to search (passing is its only legal move)
+        if self.member not in sim.state.position: return PASS
+        side = 1 if sim.state.position.index(self.member) < 4 else -1
+        seed = sim.rng.getrandbits(32)
+
+        # An unlimited search would never return
+        iterations, budget = self.iterations, self.budget
+        if iterations is None and budget is None: budget = DEFAULT_BUDGET
+
+        start = perf_counter()
+        if self.workers <= 1:
+            search = Search(self.exploration, Random(seed))
+            count, elapsed = search.run(sim, self.member, side, self.horizon, iterations, budget)
+            children = {move: (child.visits, child.value) for move, child in search.root.children.items()}
+            nodes = search.nodes
+
+        else:
+            if self._pool is None: self._pool = Pool(self.workers)
+            share = None if iterations is None else -(-iterations // self.workers)
+            args = (str(sim.state), list(sim.agents), self.member, side, self.horizon, share, budget, self.exploration)
+            results = self._pool.map(_search, [args + (seed + i,) for i in range(self.workers)])
+
+            # Sum the root statistics of every tree
+            children, count, nodes = {}, 0, 0
+            for result, rcount, rnodes, _ in results:
+                for move, (visits, value) in result.items():
+                    total = children.get(move, (0, 0.0))
+                    children[move] = (total[0] + visits, total[1] + value)
+                count += rcount
+                nodes += rnodes
+        elapsed = perf_counter() - start
+
+        # Most visited selection (ties broken by value)
+        move = PASS
+        if len(children) > 0:
+            move = max(children, key = lambda m: (children[m][0], children[m][1]))
+
+        self.report = {
+            "iterations": count,
+            "nodes": nodes,
+            "seconds": elapsed,
+            "nodesPerSec": nodes / elapsed if elapsed > 0 else 0,
+            "children": children,
+        }
+        return move
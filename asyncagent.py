@@ -0,0 +1,204 @@
+# asyncagent.py
+# Async batched agent decisions
+# Agent.select() is called synchronously from inside advance(), which rules out an external policy
+#   server; here a member is controlled from outside the simulation instead (see env.ControlledAgent)
+# Many battles run as coroutines in one event loop: each plays to its member's decision, then awaits
+#   an AsyncAgent; a DecisionBatcher gathers the pending decisions into one BatchPolicy.selectBatch()
+#   call so a policy (such as an inference process) sees whole batches
+# LocalPolicyServer is a stand-in inference process for measuring batch size against latency
+#   (see benchmarks/batching.py)
+
+from abc import ABC as Abstract
+from abc import abstractmethod
+from json import dumps, loads
+from multiprocessing import Pipe, Process
+from threading import Lock
+from time import perf_counter, sleep
+import asyncio
+
+import numpy as np
+
+from batch import BatchResult
+from datatypes import LogLevel, Status
+from encoding import StateEncoder, OCCUPIED, HEALTH
+from env import ControlledAgent, untilDecision
+from simulation import Simulation
+from util import loadJSON
+
+# -- PROTOCOLS --
+# Decides for one member at a time, asynchronously
+class AsyncAgent(Abstract):
+	# observation -> Encoded state row (see encoding.StateEncoder)
+	# Returns tuple of (spell index, target); a negative spell index passes
+	@abstractmethod
+	async def select(self, observation): raise NotImplementedError("AsyncAgent : select()")
+
+# Decides for many members at once
+class BatchPolicy(Abstract):
+	# observations -> (n, width) matrix of encoded states
+	# Returns (n, 2) int array of (spell index, target) rows; a negative spell index passes
+	# Called from a worker thread, so blocking I/O does not stall the battles
+	@abstractmethod
+	def selectBatch(self, observations): raise NotImplementedError("BatchPolicy : selectBatch()")
+
+
+# -- BATCHING --
+# AsyncAgent that forwards decisions to a BatchPolicy in batches
+# A batch is sent once maxBatch decisions are pending or maxWait seconds after the first of them
+class DecisionBatcher(AsyncAgent):
+	def __init__(self, policy, maxBatch = 64, maxWait = 0.001):
+		self.policy = policy
+		self.maxBatch = maxBatch
+		self.maxWait = maxWait
+
+		self.batches = {}			# Batch size histogram (key: decisions in the batch;  value: count)
+		self.latency = [0, 0]		# [total seconds from request to decision, decisions]
+		self.policySeconds = 0		# Time spent inside selectBatch()
+
+		self._pending = []			# List of (observation, future, request time)
+		self._timer = None
+		self._tasks = set()			# Dispatched batches (referenced until done so the loop cannot drop them)
+
+	async def select(self, observation):
+		loop = asyncio.get_running_loop()
+		future = loop.create_future()
+		self._pending.append((observation, future, perf_counter()))
+
+		if len(self._pending) >= self.maxBatch: self._dispatch()
+		elif self._timer is None: self._timer = loop.call_later(self.maxWait, self._dispatch)
+		return await future
+
+	def _dispatch(self):
+		if self._timer is not None: self._timer.cancel()
+		self._timer = None
+		if not self._pending: return
+
+		pending = self._pending
+		self._pending = []
+		self.batches[len(pending)] = self.batches.get(len(pending), 0) + 1
+		task = asyncio.get_running_loop().create_task(self._decide(pending))
+		self._tasks.add(task)
+		task.add_done_callback(self._tasks.discard)
+
+	# A policy error is raised in every select() of the batch
+	async def _decide(self, pending):
+		start = perf_counter()
+		try:
+			observations = np.stack([p[0] for p in pending])
+			actions = await asyncio.get_running_loop().run_in_executor(None, self.policy.selectBatch, observations)
+		except Exception as e:
+			for observation, future, requested in pending:
+				if not future.done(): future.set_exception(e)
+			return
+		now = perf_counter()
+		self.policySeconds += now - start
+
+		for (observation, future, requested), action in zip(pending, actions):
+			self.latency[0] += now - requested
+			self.latency[1] += 1
+			if not future.done(): future.set_result((int(action[0]), int(action[1])))
+
+	def meanBatch(self):
+		count = sum(self.batches.values())
+		return sum(size * n for size, n in self.batches.items()) / count if count > 0 else 0
+
+	def meanLatency(self):
+		return self.latency[0] / self.latency[1] if self.latency[1] > 0 else 0
+
+
+# -- BATTLES --
+# Play battles from the state file at path with one member controlled by an AsyncAgent
+# battles -> Total battles to play
+# concurrency -> Battles in flight at once
+# learner -> MemberID controlled by the agent (defaults to the first friendly member)
+# encoder -> StateEncoder for the observations (defaults to the vocabulary of the scenario)
+# Returns a batch.BatchResult
+async def playAsync(path, agent, battles, concurrency = 64, learner = None, encoder = None, randseed = 0, maxRounds = 100):
+	data = loadJSON(path)
+	stateStr = dumps(data["state"])
+	agents = data.get("agents", {})
+	if learner is None: learner = next(m for m in data["state"]["position"][:4] if m is not None)
+
+	result = BatchResult()
+	started = 0
+
+	async def play(sim):
+		nonlocal started
+		while started < battles:
+			sim.rng.seed(randseed + started)
+			started += 1
+
+			sim.loadState(loads(stateStr))
+			for memberID, name in agents.items():
+				sim.loadAgent(memberID, name)
+			control = ControlledAgent(sim, learner)
+			sim.agents[learner] = control
+
+			while True:
+				status = untilDecision(sim, learner, maxRounds)
+				if status != Status.CONTINUE: break
+
+				spellIdx, target = await agent.select(encoder.encode(sim.state, sim.stats))
+				control.selection = (None, None) if spellIdx < 0 else (spellIdx, target)
+				sim.advance()
+
+			result.record(sim, status)
+
+	sims = [Simulation(verbosity = LogLevel.NONE) for i in range(min(concurrency, battles))]
+	if encoder is None:
+		sims[0].loadState(loads(stateStr))
+		encoder = StateEncoder.fromSimulation(sims[0])
+	await asyncio.gather(*(play(sim) for sim in sims))
+	return result
+
+
+# -- STAND-IN SERVER --
+# Inference process that picks a random card from the member's hand and a random live opponent
+# Each batch costs overhead seconds plus perRow seconds per observation (mimicking a model call),
+#   so larger batches amortize the fixed cost at the price of waiting for them to fill
+class LocalPolicyServer(BatchPolicy):
+	# encoder -> StateEncoder that produced the observations
+	# slot -> Position slot of the controlled member
+	def __init__(self, encoder, slot, overhead = 0.002, perRow = 0.00002, randseed = 0):
+		self._conn, child = Pipe()
+		self._lock = Lock()
+		layout = (encoder.column(slot) + encoder.hand, [encoder.column(s) for s in range(8)], slot < 4)
+		self._proc = Process(target = _serve, args = (child, layout, overhead, perRow, randseed), daemon = True)
+		self._proc.start()
+
+	def selectBatch(self, observations):
+		with self._lock:
+			self._conn.send(observations)
+			return self._conn.recv()
+
+	def close(self):
+		if self._proc is None: return
+		self._conn.send(None)
+		self._proc.join()
+		self._proc = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+def _serve(conn, layout, overhead, perRow, randseed):
+	handColumn, slotColumns, friendly = layout
+	opponents = slotColumns[4:] if friendly else slotColumns[:4]
+	rng = np.random.default_rng(randseed)
+
+	while True:
+		observations = conn.recv()
+		if observations is None: break
+		sleep(overhead + perRow * len(observations))
+
+		actions = np.full((len(observations), 2), -1, dtype = np.int64)
+		for i, row in enumerate(observations):
+			cards = int(row[handColumn])
+			live = [s for s, col in enumerate(opponents) if row[col + OCCUPIED] > 0 and row[col + HEALTH] > 0]
+			if cards == 0 or not live: continue
+			actions[i, 0] = rng.integers(cards)
+			actions[i, 1] = live[rng.integers(len(live))] + (4 if friendly else 0)
+		conn.send(actions)
+	conn.close()
@@ -0,0 +1,159 @@
+# batch.py
+# Monte Carlo batch runner
+# Plays many battles from the same starting state across a process pool
+#   and merges the outcomes into a set of distributions
+
+from json import dumps, loads
+from multiprocessing import Pool, cpu_count
+from multiprocessing.util import Finalize
+from os import getpid
+from uuid import uuid4
+
+from simulation import Simulation, MAX_ROUNDS, STALL_ROUNDS
+from datatypes import Status, LogLevel
+from util import loadJSON
+from battletrace import TraceWriter, JSONL
+
+# -- RESULTS --
+# Merged outcome distributions of a batch (or part of a batch)
+# All fields are plain dicts so results can be pickled back from the workers
+class BatchResult:
+	def __init__(self):
+		self.battles = 0
+		self.outcomes = {}		# Dict of battle outcomes (key: datatypes.Status;  value: count)
+		self.rounds = {}		# Battle length histogram (key: final round;  value: count)
+		self.health = {}		# Final health distribution (key: member_id;  value: dict of health -> count)
+		self.damage = {}		# Total damage dealt across all battles (key: member_id;  value: int)
+
+	def __str__(self):
+		ret = f"Battles: {self.battles}"
+		for status in (Status.A_VICTORY, Status.B_VICTORY, Status.STALEMATE, Status.ERROR):
+			ret += f"\n{status.name}: {self.outcomes.get(status, 0)} ({self.rate(status) * 100:.2f}%)"
+
+		ret += f"\nMean rounds: {self.meanRounds():.2f}"
+		for memberID in self.health:
+			ret += f"\n{memberID}: mean health {self.meanHealth(memberID):.1f}, mean damage {self.damage.get(memberID, 0) / max(1, self.battles):.1f}"
+
+		return ret
+
+	# Add the final state of a single battle to the distributions
+	def record(self, sim, status):
+		self.battles += 1
+		self.outcomes[status] = self.outcomes.get(status, 0) + 1
+		self.rounds[sim.state.round] = self.rounds.get(sim.state.round, 0) + 1
+
+		for memberID, mstate in sim.state.members.items():
+			dist = self.health.setdefault(memberID, {})
+			dist[mstate.health] = dist.get(mstate.health, 0) + 1
+
+		for memberID, damage in sim.tally.items():
+			self.damage[memberID] = self.damage.get(memberID, 0) + damage
+
+	# Combine the distributions of another result into this one
+	def merge(self, other):
+		self.battles += other.battles
+		for status, count in other.outcomes.items():
+			self.outcomes[status] = self.outcomes.get(status, 0) + count
+		for rounds, count in other.rounds.items():
+			self.rounds[rounds] = self.rounds.get(rounds, 0) + count
+		for memberID, otherDist in other.health.items():
+			dist = self.health.setdefault(memberID, {})
+			for health, count in otherDist.items():
+				dist[health] = dist.get(health, 0) + count
+		for memberID, damage in other.damage.items():
+			self.damage[memberID] = self.damage.get(memberID, 0) + damage
+
+		return self
+
+	# Fraction of battles ending with the specified status
+	def rate(self, status = Status.A_VICTORY):
+		if self.battles == 0: return 0
+		return self.outcomes.get(status, 0) / self.battles
+
+	def meanRounds(self):
+		if self.battles == 0: return 0
+		return sum(r * c for r, c in self.rounds.items()) / self.battles
+
+	def meanHealth(self, memberID):
+		dist = self.health.get(memberID, {})
+		count = sum(dist.values())
+		if count == 0: return 0
+		return sum(h * c for h, c in dist.items()) / count
+
+
+# -- WORKER PROCESS --
+# Each worker loads the simulation data exactly once (stats, spells, and agent modules)
+#   and then replays the starting state for every battle assigned to it
+_sim = None
+_stateStr = None
+_agents = None
+_trace = None
+
+def _initWorker(path, maxRounds, stallRounds, trace, traceFormat, run):
+	global _sim, _stateStr, _agents, _trace
+
+	data = loadJSON(path)
+	_stateStr = dumps(data["state"])
+	_agents = data.get("agents", {})
+
+	# Warm the stats and spell dictionaries
+	# Battle output is of no use here (and formatting it would dominate the runtime)
+	_sim = Simulation(verbosity = LogLevel.NONE)
+	_sim.maxRounds = maxRounds
+	_sim.stallRounds = stallRounds
+	_sim.loadState(loads(_stateStr))
+
+	# Each worker writes its own shards (named by the run as well, as process IDs get reused)
+	# The last shard is closed when the worker exits (runBatch() lets the workers finish rather than terminating them)
+	if trace is not None:
+		_trace = TraceWriter(trace, traceFormat, prefix = f"trace-{run}-{getpid()}").attach(_sim)
+		Finalize(_trace, _trace.close, exitpriority = 10)
+
+# Play battles [start, start + count) where the battle index doubles as the seed offset
+def _runChunk(args):
+	start, count, randseed = args
+	result = BatchResult()
+
+	for i in range(start, start + count):
+		# Seeded before the state is built so shuffled decks are reproducible too
+		_sim.rng.seed(randseed + i)
+		if _trace is not None: _trace.battle = i
+		_sim.loadState(loads(_stateStr))
+		for memberID, agent in _agents.items():
+			_sim.loadAgent(memberID, agent)
+
+		status = _sim.run()
+		result.record(_sim, status)
+
+	# Every chunk leaves its records on disk, so a worker that dies loses at most its current chunk
+	if _trace is not None: _trace.flush()
+	return result
+
+
+# -- BATCH API --
+# Play a number of battles from the starting state at path
+# workers -> Size of the process pool (defaults to the number of cores)
+# randseed -> Base seed; battle i is played with seed (randseed + i)
+# chunksize -> Number of battles sent to a worker at once (defaults to a few chunks per worker)
+# maxRounds -> Round after which a battle is counted as a stalemate (None for no limit)
+# stallRounds -> Rounds without any change to the state after which a battle is counted as a stalemate (None to never check)
+# trace -> Directory to stream every battle record to (see battletrace.py; None for no trace)
+# traceFormat -> battletrace.JSONL or battletrace.BINARY
+# Returns a BatchResult with the merged distributions
+def runBatch(path, battles, workers = None, randseed = 0, chunksize = None, maxRounds = MAX_ROUNDS, stallRounds = STALL_ROUNDS, trace = None, traceFormat = JSONL):
+	if workers is None: workers = cpu_count()
+	if chunksize is None: chunksize = max(1, battles // (workers * 4))
+
+	chunks = []
+	for start in range(0, battles, chunksize):
+		chunks.append((start, min(chunksize, battles - start), randseed))
+
+	result = BatchResult()
+	run = uuid4().hex[:8]
+	with Pool(workers, initializer = _initWorker, initargs = (path, maxRounds, stallRounds, trace, traceFormat, run)) as pool:
+		for partial in pool.imap_unordered(_runChunk, chunks):
+			result.merge(partial)
+		pool.close()
+		pool.join()
+
+	return result
@@ -0,0 +1,216 @@
+# battletrace.py
+# Streaming battle traces for dataset building
+# A TraceWriter subscribes to a simulation's EventLog and streams every record (casts, rolls, damage,
+#   charm / ward changes, cards played and shuffled back, pips gained and paid, round ends) through a buffered
+#   file into rotating shards
+# Nothing is kept in memory beyond the write buffer, so any number of battles can be traced
+# readTrace() iterates the records of one shard or a whole directory of shards lazily
+#
+# Formats (one file per shard, named <prefix>-<shard index>.<format>):
+#   jsonl -> One JSON array per line: [battle, round, record type, member, data]
+#   bin   -> Each record is a little-endian uint32 payload length followed by the payload:
+#              uint32 battle, uint16 round, uint8 record type, then member and data as tagged values (see _pack())
+#            Strings are written once per shard and referenced by number afterwards, so a shard can only be
+#              read from its start
+
+from enum import IntEnum
+from json import dumps, loads
+from os import listdir, makedirs, path as ospath
+from struct import Struct
+
+from datatypes import LogLevel, RecordType
+
+JSONL = "jsonl"
+BINARY = "bin"
+
+_LENGTH = Struct("<I")
+_HEADER = Struct("<IHB")
+_INT = Struct("<q")
+_SHORT = Struct("<h")
+_FLOAT = Struct("<d")
+_COUNT = Struct("<H")
+
+# -- BINARY VALUES --
+# Tagged encoding of the values found in record data (None, bool, int, float, str, and sequences of them)
+# strings -> Dict of the shard's strings written so far -> their number
+def _pack(value, out, strings):
+	match value:
+		case None: out += b"N"
+		case bool(): out += b"T" if value else b"F"
+		case int():
+			if -32768 <= value < 32768:
+				out += b"h"
+				out += _SHORT.pack(value)
+			else:
+				out += b"i"
+				out += _INT.pack(value)
+		case float():
+			out += b"f"
+			out += _FLOAT.pack(value)
+		case str():
+			number = strings.get(value)
+			if number is not None:
+				out += b"r"
+				out += _COUNT.pack(number)
+				return
+
+			data = value.encode()
+			out += b"s"
+			out += _COUNT.pack(len(data))
+			out += data
+			if len(strings) < 65536: strings[value] = len(strings)
+		case _:
+			out += b"l"
+			out += _COUNT.pack(len(value))
+			for item in value: _pack(item, out, strings)
+
+# Returns tuple of (value, offset after the value)
+# strings -> List of the shard's strings read so far (in order of first appearance)
+# Sequences are decoded as lists (as they are in the JSONL format)
+def _unpack(buf, offset, strings):
+	tag = buf[offset]
+	offset += 1
+	match tag:
+		case 78: return None, offset		# N
+		case 84: return True, offset		# T
+		case 70: return False, offset		# F
+		case 104: return _SHORT.unpack_from(buf, offset)[0], offset + 2		# h
+		case 105: return _INT.unpack_from(buf, offset)[0], offset + 8		# i
+		case 102: return _FLOAT.unpack_from(buf, offset)[0], offset + 8		# f
+		case 114: return strings[_COUNT.unpack_from(buf, offset)[0]], offset + 2		# r
+		case 115:		# s
+			length = _COUNT.unpack_from(buf, offset)[0]
+			offset += 2
+			value = str(buf[offset:offset + length], "utf-8")
+			if len(strings) < 65536: strings.append(value)
+			return value, offset + length
+		case 108:		# l
+			count = _COUNT.unpack_from(buf, offset)[0]
+			offset += 2
+			ret = []
+			for i in range(count):
+				item, offset = _unpack(buf, offset, strings)
+				ret.append(item)
+			return ret, offset
+	raise ValueError(f"Corrupt trace record (unknown tag {tag})")
+
+# Enums are stored as their values
+def _plain(value):
+	match value:
+		case IntEnum(): return value.value
+		case tuple() | list(): return [_plain(x) for x in value]
+	return value
+
+
+# -- WRITER --
+# EventLog subscriber writing every record to rotating shard files
+# Set battle before each battle so the records can be told apart (the batch runner does this)
+class TraceWriter:
+	# directory -> Where the shards are written (created if needed)
+	# format -> JSONL or BINARY
+	# prefix -> Shard file name prefix (must be unique per writer sharing a directory)
+	# shardRecords -> Records per shard before moving on to the next file
+	# bufferSize -> Bytes buffered before each write to disk
+	def __init__(self, directory, format = JSONL, prefix = "trace", shardRecords = 1 << 20, bufferSize = 1 << 16):
+		if format not in (JSONL, BINARY): raise ValueError(f"Unknown trace format '{format}'")
+		makedirs(directory, exist_ok = True)
+
+		self.directory = directory
+		self.format = format
+		self.prefix = prefix
+		self.shardRecords = shardRecords
+		self.bufferSize = bufferSize
+
+		self.battle = 0			# Battle index written with each record
+		self.records = 0		# Records written in total
+		self.shards = []		# Paths of the shards written so far
+
+		self._file = None
+		self._count = 0			# Records in the current shard
+		self._strings = {}		# Strings written to the current shard (binary format)
+
+	# Trace every record of a simulation (DEBUG also includes the accuracy and pip rolls)
+	def attach(self, simulation, level = LogLevel.DEBUG):
+		simulation.log.subscribe(self, level)
+		return self
+
+	def detach(self, simulation):
+		simulation.log.unsubscribe(self)
+
+	def __call__(self, record):
+		if self._file is None or self._count >= self.shardRecords: self._rotate()
+
+		member = record.member
+		data = _plain(record.data)
+		if self.format == JSONL:
+			self._file.write(dumps((self.battle, record.round, int(record.type), member, data), separators = (",", ":")).encode() + b"\n")
+		else:
+			payload = bytearray(_HEADER.pack(self.battle, record.round, record.type))
+			_pack(member, payload, self._strings)
+			_pack(data, payload, self._strings)
+			self._file.write(_LENGTH.pack(len(payload)))
+			self._file.write(payload)
+
+		self._count += 1
+		self.records += 1
+
+	def _rotate(self):
+		if self._file is not None: self._file.close()
+		path = ospath.join(self.directory, f"{self.prefix}-{len(self.shards):05}.{self.format}")
+		self._file = open(path, "wb", buffering = self.bufferSize)
+		self.shards.append(path)
+		self._count = 0
+		self._strings = {}
+
+	# Push the buffered records to disk (the shard stays open)
+	def flush(self):
+		if self._file is not None: self._file.flush()
+
+	def close(self):
+		if self._file is not None: self._file.close()
+		self._file = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+# -- READER --
+# A record read back from a trace
+class TraceRecord:
+	__slots__ = ("battle", "round", "type", "member", "data")
+
+	def __init__(self, battle, round, rtype, member, data):
+		self.battle = battle
+		self.round = round
+		self.type = RecordType(rtype)
+		self.member = member
+		self.data = data
+
+	def __repr__(self):
+		return f"TraceRecord({self.battle}, {self.round}, {self.type.name}, {self.member}, {self.data})"
+
+# Iterate the records of a shard, or of every shard in a directory (in file name order)
+# Records are read one at a time, so traces of any size can be scanned
+def readTrace(path):
+	if ospath.isdir(path):
+		for filename in sorted(listdir(path)):
+			if ospath.splitext(filename)[1][1:] in (JSONL, BINARY): yield from readTrace(ospath.join(path, filename))
+		return
+
+	with open(path, "rb") as f:
+		if path.endswith("." + BINARY):
+			strings = []
+			while True:
+				head = f.read(_LENGTH.size)
+				if len(head) < _LENGTH.size: return
+				payload = f.read(_LENGTH.unpack(head)[0])
+				battle, round, rtype = _HEADER.unpack_from(payload)
+				member, offset = _unpack(payload, _HEADER.size, strings)
+				data, offset = _unpack(payload, offset, strings)
+				yield TraceRecord(battle, round, rtype, member, data)
+		else:
+			for line in f:
+				yield TraceRecord(*loads(line))
@@ -0,0 +1,45 @@
+# Benchmark: batched async decisions against a stand-in policy server
+# Plays the debug scenario with the first member controlled through a DecisionBatcher and
+#   LocalPolicyServer, sweeping the batch size to show the trade between decision latency and throughput
+# Usage: python benchmarks/batching.py [battles] [concurrency] [server overhead ms]
+
+from os import chdir, path as ospath
+from time import perf_counter
+import asyncio
+import sys
+
+# Data files are resolved relative to the repository root
+ROOT = ospath.dirname(ospath.dirname(ospath.abspath(__file__)))
+sys.path.insert(0, ROOT)
+chdir(ROOT)
+
+from asyncagent import DecisionBatcher, LocalPolicyServer, playAsync
+from datatypes import LogLevel
+from encoding import StateEncoder
+from simulation import Simulation
+
+PATH = "states/debugstate.dat"
+BATCHES = (1, 4, 16, 64)
+
+def main():
+	battles = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+	concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+	overhead = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.002
+
+	sim = Simulation(PATH, verbosity = LogLevel.NONE)
+	encoder = StateEncoder.fromSimulation(sim)
+	slot = next(i for i, m in enumerate(sim.state.position) if m is not None)
+
+	print(f"Battles: {battles}, concurrency: {concurrency}, server overhead: {overhead * 1000:.1f} ms")
+	print(f"{'max batch':>10} {'mean batch':>11} {'latency ms':>11} {'decisions/s':>12} {'battles/s':>10}")
+	with LocalPolicyServer(encoder, slot, overhead = overhead) as server:
+		for maxBatch in BATCHES:
+			if maxBatch > concurrency: continue
+			batcher = DecisionBatcher(server, maxBatch = maxBatch)
+			start = perf_counter()
+			asyncio.run(playAsync(PATH, batcher, battles, concurrency, encoder = encoder))
+			elapsed = perf_counter() - start
+			print(f"{maxBatch:10} {batcher.meanBatch():11.2f} {batcher.meanLatency() * 1000:11.3f} {batcher.latency[1] / elapsed:12.1f} {battles / elapsed:10.1f}")
+
+if __name__ == "__main__":
+	main()
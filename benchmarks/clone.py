@@ -0,0 +1,48 @@
+# Benchmark: State memory footprint and copy cost
+# Compares State.clone() against the JSON round trip used by Simulation.save()
+# Usage: python benchmarks/clone.py [state path] [copies]
+
+from json import loads
+from os import chdir, path as ospath
+from timeit import timeit
+import sys
+import tracemalloc
+
+# Data files are resolved relative to the repository root
+ROOT = ospath.dirname(ospath.dirname(ospath.abspath(__file__)))
+sys.path.insert(0, ROOT)
+chdir(ROOT)
+
+from simulation import Simulation
+from state import State
+from datatypes import LogLevel
+
+def main():
+	path = sys.argv[1] if len(sys.argv) > 1 else "states/debugstate.dat"
+	copies = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+	# Play into the battle a bit so charms, wards, and events are populated
+	sim = Simulation(path, randseed = 0, verbosity = LogLevel.NONE)
+	for x in range(12): sim.advance()
+	state = sim.state
+
+	# -- MEMORY --
+	tracemalloc.start()
+	base = tracemalloc.get_traced_memory()[0]
+	states = [state.clone() for x in range(copies)]
+	used = tracemalloc.get_traced_memory()[0] - base
+	tracemalloc.stop()
+	del states
+
+	# -- TIME --
+	number = max(1, copies // 10)
+	cloneTime = timeit(state.clone, number = number) / number
+	jsonTime = timeit(lambda: State(loads(str(state))), number = number) / number
+
+	print(f"State: {path} (round {state.round}, {len(state.members)} members)")
+	print(f"Memory per state:   {used / copies:10.0f} B")
+	print(f"State.clone():      {cloneTime * 1e6:10.2f} us")
+	print(f"JSON round trip:    {jsonTime * 1e6:10.2f} us  ({jsonTime / cloneTime:.1f}x slower)")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,201 @@
+# Benchmark: simulator hot paths
+# Times the operations every battle leans on and stores / compares the results as JSON baselines
+# Usage:
+#   python benchmarks/hotpaths.py                          Print the timings
+#   python benchmarks/hotpaths.py --save [path]            Also write them as the baseline
+#   python benchmarks/hotpaths.py --compare [path]         Exit with status 1 if any case is slower
+#                                  [--threshold 0.25]        than the baseline by more than the threshold
+#                                  [--noise 0]               (plus the baseline's spread, up to this much)
+# Every case is measured in --runs separate processes and the fastest is reported: timings move between
+#   processes far more than between repeats (a process tends to stay in a fast or a slow mode), and
+#   noise only ever slows a run down
+# The spread of the runs ((max - min) / median) is reported and saved with a baseline; it widens the
+#   threshold only when --noise allows it, and never by the spread of the current runs
+# Baselines are machine specific (default path: benchmarks/baseline.json)
+
+from argparse import ArgumentParser
+from json import dump, dumps, load, loads
+from os import chdir, path as ospath
+from platform import platform, python_version
+from random import Random
+from statistics import median
+from subprocess import run as runProcess
+from time import perf_counter
+import gc
+import sys
+
+# Data files are resolved relative to the repository root
+ROOT = ospath.dirname(ospath.dirname(ospath.abspath(__file__)))
+sys.path.insert(0, ROOT)
+chdir(ROOT)
+
+from agent import Agent
+from datatypes import LogLevel, Status
+from simulation import Simulation
+from state import State
+from util import encodeJSON
+
+PATH = "states/debugstate.dat"
+BASELINE = "benchmarks/baseline.json"
+CASTER = "player.debugboi"
+SEED = 0			# Every timed advance() starts from the same state and random generator state
+
+# Agent that always makes the same selection
+class Fixed(Agent):
+	selection = (None, None)
+	def select(self): return self.selection
+
+# Simulation at the caster's PLAN event with the caster held by a Fixed agent
+# accuracy -> Added to every school so the cast always succeeds (1) or always fizzles (-1)
+def planningSim(selection, accuracy = 0):
+	sim = Simulation(PATH, randseed = 0, verbosity = LogLevel.NONE)
+
+	# Step to the caster's turn in a round where they have the pips for anything
+	while True:
+		pending = sim.state.nextEvent()
+		if pending is not None and pending.member == CASTER and sum(sim.state.members[CASTER].pips) >= 4: break
+		if sim.advance() not in (Status.CONTINUE, Status.ROUND_END): raise AssertionError("Battle ended before the benchmark state")
+
+	sim.stats[CASTER].accuracy = [x + accuracy for x in sim.stats[CASTER].accuracy]
+	agent = Fixed(sim, CASTER)
+	agent.selection = selection
+	sim.agents[CASTER] = agent
+	return sim
+
+# Time fn(item) over prepared items (so setup is not measured)
+# The garbage collector is paused while timing (as timeit does)
+# Returns seconds per call (best of repeats)
+def timeItems(fn, make, number, repeats):
+	best = None
+	for x in range(repeats):
+		items = [make() for i in range(number)]
+		gc.disable()
+		start = perf_counter()
+		for item in items: fn(item)
+		elapsed = (perf_counter() - start) / number
+		gc.enable()
+		best = elapsed if best is None else min(best, elapsed)
+	return best
+
+# Time fn() (best of repeats)
+def timeCalls(fn, number, repeats):
+	return timeItems(lambda item: fn(), lambda: None, number, repeats)
+
+# Items are (state, random generator) pairs so every call takes the same path with the same rolls
+def advanceCase(selection, accuracy = 0):
+	sim = planningSim(selection, accuracy)
+	template = sim.state
+	def run(item):
+		sim.state, sim.rng = item
+		sim.advance()
+	return run, lambda: (template.clone(), Random(SEED))
+
+# Returns dict of case name -> seconds per call
+def runCases(number, repeats):
+	ret = {}
+
+	# -- advance() --
+	run, make = advanceCase((1, 4), accuracy = 1)
+	ret["advance.cast"] = timeItems(run, make, number, repeats)
+	run, make = advanceCase((1, 4), accuracy = -1)
+	ret["advance.fizzle"] = timeItems(run, make, number, repeats)
+	run, make = advanceCase((None, None))
+	ret["advance.pass"] = timeItems(run, make, number, repeats)
+
+	# -- updateRound() --
+	sim = planningSim((None, None))
+	template = sim.state.clone()
+	while template.getEvent() is not None: pass
+	def update(state):
+		sim.state = state
+		sim.updateRound()
+	ret["updateRound"] = timeItems(update, template.clone, number, repeats)
+
+	# -- State I/O --
+	stateStr = encodeJSON(template)
+	ret["State(dict)"] = timeItems(State, lambda: loads(stateStr), number, repeats)
+	ret["encodeJSON(state)"] = timeCalls(lambda: encodeJSON(template), number, repeats)
+
+	# -- Catalog loading (cold: a new simulation reads every file) --
+	loads_ = max(1, number // 20)
+	ret["Simulation.load"] = timeCalls(lambda: Simulation(PATH, verbosity = LogLevel.NONE), loads_, repeats)
+	def loadStats():
+		fresh = Simulation(verbosity = LogLevel.NONE)
+		fresh.loadStats(CASTER, State(loads(stateStr)).members[CASTER])
+	ret["Simulation.loadStats"] = timeCalls(loadStats, loads_, repeats)
+	fresh = Simulation(verbosity = LogLevel.NONE)
+	ret["Simulation.loadSpell"] = timeCalls(lambda: fresh.loadSpell("storm.thundersnake"), loads_, repeats)
+
+	# -- Pips --
+	member = template.members[CASTER]
+	cost = sim.programs[sim.state.members[CASTER].deck[2]].cost
+	ret["Member.consumePips"] = timeCalls(lambda: member.consumePips(cost, True), number * 10, repeats)
+	ret["Member.countPips"] = timeCalls(member.countPips, number * 10, repeats)
+
+	return ret
+
+# Run the cases in separate processes
+# Returns dict of case name -> list of seconds per call (one per run)
+def runProcesses(number, repeats, runs):
+	samples = {}
+	for x in range(runs):
+		command = [sys.executable, ospath.abspath(__file__), "--single", "--number", str(number), "--repeats", str(repeats)]
+		output = runProcess(command, capture_output = True, text = True, check = True).stdout
+		for name, seconds in loads(output).items(): samples.setdefault(name, []).append(seconds)
+	return samples
+
+# Relative spread of the runs of a case
+def spread(samples):
+	return (max(samples) - min(samples)) / median(samples)
+
+def main():
+	parser = ArgumentParser(description = "Simulator hot path benchmarks")
+	parser.add_argument("--save", nargs = "?", const = BASELINE, help = "write the results as a baseline")
+	parser.add_argument("--compare", nargs = "?", const = BASELINE, help = "compare against a baseline")
+	parser.add_argument("--threshold", type = float, default = 0.25, help = "allowed slowdown (fraction) in compare mode")
+	parser.add_argument("--noise", type = float, default = 0, help = "most of the baseline spread (fraction) added to the threshold")
+	parser.add_argument("--number", type = int, default = 500, help = "calls per repeat")
+	parser.add_argument("--repeats", type = int, default = 20, help = "the best repeat is kept")
+	parser.add_argument("--runs", type = int, default = 7, help = "separate processes (the fastest is kept)")
+	parser.add_argument("--single", action = "store_true", help = "run the cases once in this process and print them as JSON")
+	args = parser.parse_args()
+
+	if args.single:
+		print(dumps(runCases(args.number, args.repeats)))
+		return
+
+	samples = runProcesses(args.number, args.repeats, args.runs)
+	results = {name: min(runs) for name, runs in samples.items()}
+	spreads = {name: spread(runs) for name, runs in samples.items()}
+
+	baseline = None
+	if args.compare is not None:
+		with open(args.compare) as f: baseline = load(f)
+		baseSpreads = baseline.get("spread", {})
+		baseline = baseline["results"]
+
+	# A case regresses when it slows by more than the threshold (plus its capped baseline spread)
+	failed = []
+	print(f"{'case':24} {'us/call':>10} {'spread':>7}" + (f" {'baseline':>10} {'change':>8} {'allowed':>8}" if baseline else ""))
+	for name, seconds in results.items():
+		line = f"{name:24} {seconds * 1e6:10.3f} {spreads[name] * 100:6.1f}%"
+		if baseline is not None and name in baseline:
+			change = seconds / baseline[name] - 1
+			allowed = args.threshold + min(baseSpreads.get(name, 0), args.noise)
+			line += f" {baseline[name] * 1e6:10.3f} {change * 100:+7.1f}% {allowed * 100:7.1f}%"
+			if change > allowed:
+				line += "  REGRESSION"
+				failed.append(name)
+		print(line)
+
+	if args.save is not None:
+		with open(args.save, "w") as f:
+			dump({"python": python_version(), "platform": platform(), "results": results, "spread": spreads, "runs": samples}, f, indent = "\t")
+		print(f"Baseline written to {args.save}")
+
+	if failed:
+		print(f"{len(failed)} case(s) regressed by more than their allowed slowdown: {', '.join(failed)}")
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,86 @@
+# Benchmark: vectorized engine against the scalar batch runner
+# Runs the debug scenario in both engines and checks that the outcome statistics agree
+#   (two-sample z-tests on the win rate, mean rounds, and mean damage of each member)
+# Usage: python benchmarks/vectorized.py [scalar battles] [vectorized battles]
+
+from math import sqrt
+from os import chdir, path as ospath
+from time import perf_counter
+import sys
+
+# Data files are resolved relative to the repository root
+ROOT = ospath.dirname(ospath.dirname(ospath.abspath(__file__)))
+sys.path.insert(0, ROOT)
+chdir(ROOT)
+
+import numpy as np
+
+from batch import runBatch
+from datatypes import LogLevel, Status
+from simulation import Simulation
+from vectorized import VectorSimulation, WeightedPolicy
+
+PATH = "states/debugstate.dat"
+Z = 3.3			# Two-sided ~0.1% significance per statistic
+
+# Array versions of agents/Debug_Basic.py and agents/Debug_Basic2.py
+POLICIES = {
+	"player.debugboi": WeightedPolicy([0.2, 0.2, 0.3], [0, 4, 4]),
+	"player.debuggirl": WeightedPolicy([0.3, 0.2, 0.2], [4, 0, 0]),
+}
+
+# Mean and variance of a {value: count} distribution
+def moments(dist):
+	n = sum(dist.values())
+	mean = sum(k * c for k, c in dist.items()) / n
+	var = sum(c * (k - mean) ** 2 for k, c in dist.items()) / max(1, n - 1)
+	return mean, var, n
+
+def check(name, a, b):
+	(ma, va, na), (mb, vb, nb) = a, b
+	se = sqrt(va / na + vb / nb)
+	z = 0 if se == 0 else (ma - mb) / se
+	print(f"{name:28} {ma:10.3f} {mb:10.3f}   z = {z:6.2f}  {'PASS' if abs(z) < Z else 'FAIL'}")
+	return abs(z) < Z
+
+def main():
+	scalarCount = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+	vectorCount = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+	start = perf_counter()
+	scalar = runBatch(PATH, scalarCount, 1)
+	scalarTime = perf_counter() - start
+
+	start = perf_counter()
+	engine = VectorSimulation(Simulation(PATH, verbosity = LogLevel.NONE), vectorCount, randseed = 0)
+	for memberID, policy in POLICIES.items(): engine.setPolicy(memberID, policy)
+	engine.run()
+	vector = engine.result()
+	vectorTime = perf_counter() - start
+
+	# Win rate as a Bernoulli variable
+	def wins(result):
+		p = result.rate(Status.A_VICTORY)
+		return p, p * (1 - p), result.battles
+
+	# Per-battle damage (only the total is kept by BatchResult, so use the vectorized tally for the variance)
+	def damage(result, memberID, var):
+		return result.damage[memberID] / result.battles, var, result.battles
+
+	print(f"{'':28} {'scalar':>10} {'vectorized':>10}")
+	ok = check("A_VICTORY rate", wins(scalar), wins(vector))
+	ok &= check("Mean rounds", moments(scalar.rounds), moments(vector.rounds))
+	for p, memberID in enumerate(engine.members):
+		if memberID is None: continue
+		var = float(np.var(engine.tally[:, p], ddof = 1))
+		ok &= check(f"Damage {memberID}", damage(scalar, memberID, var), damage(vector, memberID, var))
+		ok &= check(f"Health {memberID}", moments(scalar.health[memberID]), moments(vector.health[memberID]))
+
+	print()
+	print(f"Scalar:     {scalarCount / scalarTime:10.0f} battles/s")
+	print(f"Vectorized: {vectorCount / vectorTime:10.0f} battles/s  ({(vectorCount / vectorTime) / (scalarCount / scalarTime):.1f}x)")
+	print("Statistics agree" if ok else "Statistics DISAGREE")
+	sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,54 @@
+# catalog.py
+# Process-wide intern tables for catalog identifiers
+# The live state stores spells as small integers and charms / wards as (spell, modifier) integer pairs;
+#   the dotted string IDs ("storm.stormblade", "storm.stormblade-charm0") only appear in files
+#   (State.__init__() interns them and export() / __str__ translate them back)
+# Numbers are assigned in order of first use, so they differ between processes: never store or send them
+
+# Bidirectional map of string ID <-> number
+class InternTable:
+	__slots__ = ("ids", "index")
+
+	def __init__(self):
+		self.ids = []		# String ID by number
+		self.index = {}		# Number by string ID
+
+	def __len__(self):
+		return len(self.ids)
+
+	# String ID of a number
+	def __getitem__(self, number):
+		return self.ids[number]
+
+	# Number of a string ID (assigned on first use)
+	def intern(self, ident):
+		number = self.index.get(ident)
+		if number is None:
+			number = len(self.ids)
+			self.ids.append(ident)
+			self.index[ident] = number
+		return number
+
+
+SPELLS = InternTable()
+MODIFIERS = []		# Modifier IDs of each spell (InternTable indexed by spell number)
+
+def internSpell(spellID):
+	spell = SPELLS.intern(spellID)
+	while len(MODIFIERS) <= spell: MODIFIERS.append(InternTable())
+	return spell
+
+# Modifier table of a spell (by spell number)
+def spellModifiers(spell):
+	while len(MODIFIERS) <= spell: MODIFIERS.append(InternTable())
+	return MODIFIERS[spell]
+
+# "spellID-modID" -> (spell, modifier)
+def internModifier(entry):
+	spellID, _, modID = entry.rpartition("-")
+	spell = internSpell(spellID)
+	return spell, MODIFIERS[spell].intern(modID)
+
+# (spell, modifier) -> "spellID-modID"
+def modifierEntry(pair):
+	return SPELLS.ids[pair[0]] + "-" + MODIFIERS[pair[0]].ids[pair[1]]
@@ -1,6 +1,11 @@
 # Miscellaneous types relevant to various portions of the simulation
 
 from enum import IntEnum
+from itertools import accumulate
+from math import floor
+
+from catalog import internSpell, spellModifiers
+from pips import splitTable
 # from util import encodeJSON
 
 # -- SIMULATION CORE --
@@ -14,6 +19,34 @@ class Status(IntEnum):
 	STALEMATE = -2		# Not a feature of Wizard101, but necessary for model training
 
 
+# Verbosity of the simulation event log (see eventlog.py)
+# A subscriber receives every record at or below its level
+class LogLevel(IntEnum):
+	NONE = 0			# Nothing is recorded
+	WARNING = 1			# Malformed data and unexpected simulation conditions
+	INFO = 2			# Battle flow (casts, passes, fizzles, damage, round and battle end)
+	DEBUG = 3			# Everything else (pip rolls, agent selections, data loading)
+
+
+# Structured record types emitted to the simulation event log
+class RecordType(IntEnum):
+	WARNING = 0			# data: message string
+	LOAD = 1			# data: (kind, identifier, name) where kind is "simulation", "stats", "spell", or "agent"
+	ROUND_END = 2		# data: state evaluation
+	END = 3				# data: final Status of the battle
+	PLAN = 4			# data: (spell index, target) as selected by the agent
+	INVALID = 5			# data: (spell index, spellID or None if the index was out of range)
+	PASS = 6			# data: reason string
+	CAST = 7			# data: (spellID, list of target positions)
+	FIZZLE = 8			# data: (spellID, dispelled, deck index the spell was shuffled back into or None if it was not)
+	DAMAGE = 9			# data: (targetID, damage, base damage, outgoing multiplier, incoming multiplier)
+	PIP = 10			# data: (Pip gained, power pip chance)
+	ACCURACY = 11		# data: (spellID, roll, chance to succeed)
+	EFFECT = 12			# data: (memberID, "charms" or "wards", modifier entry "spellID-modID", True if added / False if consumed)
+	PLAY = 13			# data: (deck index, spellID) of the spell taken out of the hand (the hand shrinks by one)
+	PAY = 14			# data: (spellID, basic pips, power pips) consumed by the cast
+
+
 # Battle sigil member position
 # Enum values are array indices
 class Position(IntEnum):
@@ -134,6 +167,7 @@ class DeltaType(IntEnum):
 	MIN = 5		# Apply a min(a, b) function to a numerical value
 	MAX = 6		# Apply a max(a, b) function to a numerical value
 	PIP = 7		# Apply a pip manipulation function
+	SET = 8		# Replace an attribute (or a list item) with a new value
 
 
 # -- SPELL REPRESENTATION --
@@ -367,6 +401,69 @@ class Spell:
 			self.actions.append(Action(actiontype, target, data, condition))
 
 
+# Ready-to-run form of a spell action (see Program)
+class Step:
+	__slots__ = ("type", "target", "modifier", "values", "weights", "cumWeights")
+
+	def __init__(self, spell, action):
+		self.type = action.type
+		self.target = action.target
+		self.modifier = None		# Charm / ward placed on the target, as stored in the state: (spell, modifier) numbers
+		self.values = None			# Damage rolls (already floored)
+		self.weights = None			# Roll probabilities (normalized to sum to 1; uniform if not given by the spell)
+		self.cumWeights = None		# Cumulative roll weights for Random.choices() (None for a uniform roll)
+
+		match action.type:
+			case ActionType.CHARM | ActionType.WARD: self.modifier = (spell, spellModifiers(spell).intern(action.data))
+			case ActionType.DAMAGE:
+				self.values = tuple(floor(x) for x in action.data["range"])
+				weights = action.data.get("distribution")
+				if weights:
+					total = sum(weights)
+					weights = [w / total for w in weights]
+					self.cumWeights = tuple(accumulate(weights))
+				else: weights = [1 / len(self.values) for x in self.values]
+				self.weights = tuple(weights)
+
+
+# Spell compiled for the simulation (built once by Simulation.loadSpell())
+# Everything a cast needs is resolved up front so advance() does no parsing:
+#   modifier pairs are prebuilt, damage rolls are floored, and the target positions are expanded
+class Program:
+	__slots__ = ("spellID", "number", "spell", "rate", "school", "cost", "scost", "steps", "modifiers", "targets", "area", "splits")
+
+	def __init__(self, spellID, spell):
+		self.spellID = spellID
+		self.number = internSpell(spellID)		# catalog.SPELLS number (as stored in decks)
+		self.spell = spell
+		self.rate = spell.rate
+		self.school = spell.school
+		self.cost = spell.cost
+		self.scost = spell.scost
+		self.steps = tuple(Step(self.number, action) for action in spell.actions)
+
+		# Modifiers of the spell indexed by modifier number (the second half of a charm / ward pair)
+		table = spellModifiers(self.number)
+		for modID in spell.modifiers: table.intern(modID)
+		self.modifiers = tuple(spell.modifiers.get(modID) for modID in table.ids)
+
+		# Positions the spell can be aimed at, indexed by the caster's side (0 friendly, 1 enemy)
+		# None for spells that can only target the caster
+		match spell.actions[0].target:
+			case Target.SELF: self.targets = None
+			case Target.TARGET_FRIEND | Target.ALL_FRIEND: self.targets = (tuple(range(0, 4)), tuple(range(4, 8)))
+			case other: self.targets = (tuple(range(4, 8)), tuple(range(0, 4)))
+		self.area = spell.actions[0].target in (Target.ALL_FRIEND, Target.ALL_ENEMY)		# Aimed at a whole side at once
+
+		# Pip split tables of the cost without and with mastery (indexed by pips.affordIndex())
+		self.splits = (splitTable(self.cost[0], False), splitTable(self.cost[0], True))
+
+	# Positions a caster at position pos can aim the spell at (occupied or not)
+	def aim(self, pos):
+		if self.targets is None: return (pos,)
+		return self.targets[0 if pos < 4 else 1]
+
+
 # Battle cheats type
 # Specifies a 'script' to define a cheat condition
 # Includes standard boss cheats, as well as pet maycasts
@@ -0,0 +1,173 @@
+# encoding.py
+# Fixed-width numeric encoding of the combat state vector for model training
+# A StateEncoder turns a State (with the member Stats) into one row of a float32 or int16 NumPy matrix
+#   and restores the encoded fields from a row
+# Spells and charms / wards are written as codes of the encoder's vocabulary (starting at FIRST_CODE),
+#   never as catalog numbers: those differ between processes (see catalog.py)
+# EMPTY marks an unused slot, UNKNOWN a spell or modifier outside the vocabulary (dropped by decode())
+#
+# Row layout:
+#   ROUND, FIRST, then the 8 Position slots (slotWidth columns each):
+#     OCCUPIED, HEALTH (fraction of the stats maximum), PIPS (count per datatypes.Pip), SHADS,
+#     STATUS (rounds per datatypes.StatusEffect), charm count + charm codes (in stack order),
+#     ward count + ward codes, hand count + hand codes
+# Stacks deeper than the encoder's stackSlots are truncated (the count column keeps the real depth)
+# Integer matrices store the health fraction scaled by FRACTION_SCALE
+
+from array import array
+
+import numpy as np
+
+from catalog import internSpell, internModifier, modifierEntry
+from datatypes import Pip, StatusEffect
+from state import State, Member
+
+SLOTS = 8
+HAND = 7
+PIPS = len(Pip.__members__)
+STATUS = len(StatusEffect.__members__)
+FRACTION_SCALE = 10000
+
+# Reserved codes
+EMPTY = 0
+UNKNOWN = 1
+FIRST_CODE = 2
+
+# Global columns
+ROUND = 0
+FIRST = 1
+GLOBALS = 2
+
+# Columns within a slot
+OCCUPIED = 0
+HEALTH = 1
+PIP = 2
+SHADS = PIP + PIPS
+EFFECTS = SHADS + 1
+CHARMS = EFFECTS + STATUS		# Count, followed by the codes
+
+class StateEncoder:
+	# spells -> Spell vocabulary (list of spellIDs)
+	# modifiers -> Charm / ward vocabulary (list of "spellID-modID" entries)
+	# stackSlots -> Charm and ward codes kept per member
+	# dtype -> np.float32 or np.int16
+	def __init__(self, spells, modifiers, stackSlots = 8, dtype = np.float32):
+		self.spells = list(spells)
+		self.modifiers = list(modifiers)
+		self.stackSlots = stackSlots
+		self.dtype = np.dtype(dtype)
+		self.scale = FRACTION_SCALE if self.dtype.kind == "i" else 1
+
+		# Codes by catalog number (resolved once, in this process)
+		self._spellCode = {internSpell(s): i + FIRST_CODE for i, s in enumerate(self.spells)}
+		self._modifierCode = {internModifier(m): i + FIRST_CODE for i, m in enumerate(self.modifiers)}
+
+		self.wards = CHARMS + 1 + stackSlots
+		self.hand = self.wards + 1 + stackSlots
+		self.slotWidth = self.hand + 1 + HAND
+		self.width = GLOBALS + SLOTS * self.slotWidth
+
+	# Encoder whose vocabulary is every spell (and its modifiers) loaded by a simulation
+	@classmethod
+	def fromSimulation(cls, sim, stackSlots = 8, dtype = np.float32):
+		spells, modifiers = [], []
+		for program in sim.programs:
+			if program is None: continue
+			spells.append(program.spellID)
+			for m in range(len(program.modifiers)): modifiers.append(modifierEntry((program.number, m)))
+		return cls(spells, modifiers, stackSlots, dtype)
+
+	# First column of a position slot
+	def column(self, slot):
+		return GLOBALS + slot * self.slotWidth
+
+	# Encode a single state
+	# stats -> Dict of member stats (Simulation.stats)
+	# out -> Row to write to (a new one is allocated if None)
+	def encode(self, state, stats, out = None):
+		if out is None: out = np.empty(self.width, dtype = self.dtype)
+		self._fill(state, stats, out)
+		return out
+
+	# Encode many states into the rows of one matrix
+	# out -> Preallocated (len(states), width) matrix (allocated if None)
+	def encodeBatch(self, states, stats, out = None):
+		if out is None: out = np.empty((len(states), self.width), dtype = self.dtype)
+		for i, state in enumerate(states): self._fill(state, stats, out[i])
+		return out
+
+	# Write the state into a row (a view of the output matrix, written in place)
+	def _fill(self, state, stats, row):
+		row[:] = EMPTY
+		row[ROUND] = state.round
+		row[FIRST] = state.first
+		spellCode = self._spellCode.get
+		modifierCode = self._modifierCode.get
+		stackSlots = self.stackSlots
+		scale = self.scale
+
+		col = GLOBALS
+		for memberID in state.position:
+			if memberID is not None:
+				member = state.members[memberID]
+				row[col + OCCUPIED] = 1
+				health = member.health * scale / stats[memberID].health
+				row[col + HEALTH] = health if scale == 1 else round(health)
+				if member.pips is not None: row[col + PIP:col + PIP + PIPS] = member.pips
+				row[col + SHADS] = member.shads
+				row[col + EFFECTS:col + EFFECTS + STATUS] = member.status
+
+				c = col + CHARMS
+				row[c] = len(member.charms)
+				for i, charm in enumerate(member.charms):
+					if i == stackSlots: break
+					row[c + 1 + i] = modifierCode(charm, UNKNOWN)
+
+				c = col + self.wards
+				row[c] = len(member.wards)
+				for i, ward in enumerate(member.wards):
+					if i == stackSlots: break
+					row[c + 1 + i] = modifierCode(ward, UNKNOWN)
+
+				c = col + self.hand
+				if member.deck is not None:
+					cards = min(member.hand, len(member.deck))
+					row[c] = cards
+					for i in range(cards): row[c + 1 + i] = spellCode(member.deck[i], UNKNOWN)
+
+			col += self.slotWidth
+
+	# Rebuild a state from a row
+	# Only the encoded fields are restored: decks hold just the hand, and events, tokens, auras,
+	#   and the draw pile are left empty
+	# position -> Member ID of each slot (as in State.position)
+	# stats -> Dict of member stats (for the maximum health)
+	def decode(self, row, position, stats):
+		state = State({"round": int(row[ROUND]), "first": int(row[FIRST]), "position": list(position)})
+
+		for slot, memberID in enumerate(position):
+			col = self.column(slot)
+			if memberID is None or not row[col + OCCUPIED]: continue
+
+			member = Member()
+			member.health = int(round(float(row[col + HEALTH]) / self.scale * stats[memberID].health))
+			member.pips = array("b", (int(x) for x in row[col + PIP:col + PIP + PIPS]))
+			member.shads = int(row[col + SHADS])
+			member.status = array("b", (int(x) for x in row[col + EFFECTS:col + EFFECTS + STATUS]))
+
+			c = col + CHARMS
+			member.charms.extend(self._modifiers(row[c + 1:c + 1 + min(int(row[c]), self.stackSlots)]))
+			c = col + self.wards
+			member.wards.extend(self._modifiers(row[c + 1:c + 1 + min(int(row[c]), self.stackSlots)]))
+
+			c = col + self.hand
+			member.deck = array("h", (internSpell(self.spells[int(x) - FIRST_CODE]) for x in row[c + 1:c + 1 + int(row[c])] if x >= FIRST_CODE))
+			member.hand = len(member.deck)
+
+			state.members[memberID] = member
+
+		return state
+
+	# Catalog numbers of the modifier codes (UNKNOWN codes are dropped)
+	def _modifiers(self, codes):
+		return (internModifier(self.modifiers[int(x) - FIRST_CODE]) for x in codes if x >= FIRST_CODE)
@@ -0,0 +1,197 @@
+# env.py
+# Gym-style vectorized training environment
+# A BattleEnv plays many copies of one scenario at once, with a learner controlling a single member
+#   (every other member keeps the agent from the scenario file)
+# reset(batch) starts the battles and step(actions) plays the learner's selection in every battle,
+#   advancing each one to the learner's next decision; finished battles are reset immediately, so the
+#   batch never waits on a slow battle
+# Battles can be spread across subprocess workers, each owning a contiguous block of them
+#
+# Observations -> float32 matrix of encoded states (see encoding.StateEncoder)
+# Rewards -> Change in Simulation.evalState() since the previous decision, from the learner's side
+#              (an episode sums to its final evaluation minus the starting one)
+# Dones -> True where the battle ended on that step (the observation is then of the fresh battle)
+# Statuses -> Final datatypes.Status of the battles that ended (Status.CONTINUE elsewhere)
+
+from json import dumps, loads
+from multiprocessing import Pipe, Process
+
+import numpy as np
+
+from agent import Agent
+from datatypes import EventType, LogLevel, Status
+from encoding import StateEncoder
+from simulation import Simulation
+from util import loadJSON
+
+# Agent for an externally controlled member: plays whatever selection was last set
+class ControlledAgent(Agent):
+	selection = (None, None)
+	def select(self): return self.selection
+
+# Advance a simulation until memberID has a selection to make
+# Returns Status.CONTINUE at the decision or the final status of the battle
+def untilDecision(sim, memberID, maxRounds):
+	while True:
+		state = sim.state
+		event = state.nextEvent()
+		if event is not None and event.member == memberID and event.type == EventType.PLAN and state.members[memberID].health > 0: return Status.CONTINUE
+
+		status = sim.advance()
+		if status == Status.ROUND_END:
+			if state.round > maxRounds: return Status.STALEMATE
+		elif status != Status.CONTINUE: return status
+
+
+# -- BATTLES --
+# A block of battles played in one process
+class _Battles:
+	def __init__(self, path, learner, count, randseed, maxRounds, vocabulary):
+		data = loadJSON(path)
+		self.stateStr = dumps(data["state"])
+		self.agents = data.get("agents", {})
+		self.learner = learner
+		self.maxRounds = maxRounds
+
+		self.sims = [Simulation(randseed = randseed + i, verbosity = LogLevel.NONE) for i in range(count)]
+		self.controls = [None for x in range(count)]
+		self.evaluation = np.zeros(count)
+		self.sign = 1 if data["state"]["position"].index(learner) < 4 else -1		# Evaluations are from the friendly side
+
+		spells, modifiers = vocabulary
+		self.encoder = StateEncoder(spells, modifiers)
+		self.obs = np.zeros((count, self.encoder.width), dtype = np.float32)
+
+	# Start battle i over and advance it to the learner's first decision
+	def _restart(self, i):
+		sim = self.sims[i]
+		sim.loadState(loads(self.stateStr))
+		for memberID, agent in self.agents.items():
+			sim.loadAgent(memberID, agent)
+		self.controls[i] = ControlledAgent(sim, self.learner)
+		sim.agents[self.learner] = self.controls[i]
+
+		untilDecision(sim, self.learner, self.maxRounds)
+		self.evaluation[i] = self.sign * sim.evalState()
+
+	def reset(self):
+		for i in range(len(self.sims)): self._restart(i)
+		return self.encoder.encodeBatch([sim.state for sim in self.sims], self.sims[0].stats, self.obs)
+
+	# actions -> (spell index, target) per battle (a negative index passes)
+	def step(self, actions):
+		count = len(self.sims)
+		rewards = np.zeros(count, dtype = np.float32)
+		dones = np.zeros(count, dtype = bool)
+		statuses = np.full(count, Status.CONTINUE.value, dtype = np.int8)
+
+		for i, sim in enumerate(self.sims):
+			spellIdx, target = int(actions[i][0]), int(actions[i][1])
+			self.controls[i].selection = (None, None) if spellIdx < 0 else (spellIdx, target)
+
+			sim.advance()
+			status = untilDecision(sim, self.learner, self.maxRounds)
+
+			evaluation = self.sign * sim.evalState()
+			rewards[i] = evaluation - self.evaluation[i]
+			self.evaluation[i] = evaluation
+
+			if status != Status.CONTINUE:
+				dones[i] = True
+				statuses[i] = status
+				self._restart(i)
+
+			self.encoder.encodeBatch((sim.state,), sim.stats, self.obs[i:i + 1])
+
+		return self.obs, rewards, dones, statuses
+
+
+# -- WORKER PROCESS --
+# Serves reset / step commands for one block of battles until told to close
+def _serve(conn, args):
+	battles = _Battles(*args)
+	while True:
+		command, actions = conn.recv()
+		match command:
+			case "reset": conn.send(battles.reset())
+			case "step": conn.send(battles.step(actions))
+			case "close": break
+	conn.close()
+
+
+# -- ENVIRONMENT API --
+class BattleEnv:
+	# path -> Scenario state file (its agents play every member but the learner)
+	# learner -> MemberID controlled through step() (defaults to the first friendly member)
+	# workers -> Subprocesses to spread the battles across (0 plays them in this process)
+	# randseed -> Battle i of the batch uses the random seed (randseed + i)
+	# maxRounds -> Round after which a battle ends as a stalemate
+	def __init__(self, path, learner = None, workers = 0, randseed = 0, maxRounds = 100):
+		self.path = path
+		self.workers = workers
+		self.randseed = randseed
+		self.maxRounds = maxRounds
+
+		# The parent process fixes the encoder vocabulary so every worker writes the same codes
+		sim = Simulation(path, verbosity = LogLevel.NONE)
+		if learner is None: learner = next(m for m in sim.state.position[:4] if m is not None)
+		self.learner = learner
+		self.encoder = StateEncoder.fromSimulation(sim)
+
+		self.batch = 0
+		self._local = None
+		self._procs = []		# List of (process, connection, first battle, battle count)
+
+	# Start (or restart) a batch of battles
+	# Returns the observations of every battle at the learner's first decision
+	def reset(self, batch):
+		if batch != self.batch: self._start(batch)
+
+		if self._local is not None: return self._local.reset().copy()
+		for proc, conn, start, count in self._procs: conn.send(("reset", None))
+		return np.concatenate([conn.recv() for proc, conn, start, count in self._procs])
+
+	# Play the learner's selection in every battle
+	# actions -> Sequence of (spell index, target) pairs or an (batch, 2) int array (negative index passes)
+	# Returns tuple of (observations, rewards, dones, statuses)
+	def step(self, actions):
+		actions = np.asarray(actions, dtype = np.int64).reshape(self.batch, 2)
+		if self._local is not None:
+			obs, rewards, dones, statuses = self._local.step(actions)
+			return obs.copy(), rewards, dones, statuses
+
+		for proc, conn, start, count in self._procs: conn.send(("step", actions[start:start + count]))
+		parts = [conn.recv() for proc, conn, start, count in self._procs]
+		return tuple(np.concatenate([part[x] for part in parts]) for x in range(4))
+
+	def _start(self, batch):
+		self.close()
+		self.batch = batch
+		vocabulary = (self.encoder.spells, self.encoder.modifiers)
+
+		if self.workers <= 0:
+			self._local = _Battles(self.path, self.learner, batch, self.randseed, self.maxRounds, vocabulary)
+			return
+
+		workers = min(self.workers, batch)
+		for w in range(workers):
+			start = batch * w // workers
+			count = batch * (w + 1) // workers - start
+			conn, child = Pipe()
+			proc = Process(target = _serve, args = (child, (self.path, self.learner, count, self.randseed + start, self.maxRounds, vocabulary)), daemon = True)
+			proc.start()
+			self._procs.append((proc, conn, start, count))
+
+	def close(self):
+		for proc, conn, start, count in self._procs:
+			conn.send(("close", None))
+			proc.join()
+		self._procs = []
+		self._local = None
+		self.batch = 0
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
@@ -0,0 +1,162 @@
+# eventlog.py
+# Leveled sink for structured simulation records
+# The simulation only builds a record if some subscriber wants its level, so a log
+#   without subscribers (the batch runner, search agents) costs one attribute check per event
+
+from datatypes import LogLevel, RecordType, Position, Status, Pip
+
+# Level at which each datatypes.RecordType is emitted (indexed by record type)
+RECORD_LEVEL = (
+	LogLevel.WARNING,	# WARNING
+	LogLevel.DEBUG,		# LOAD
+	LogLevel.INFO,		# ROUND_END
+	LogLevel.INFO,		# END
+	LogLevel.DEBUG,		# PLAN
+	LogLevel.DEBUG,		# INVALID
+	LogLevel.INFO,		# PASS
+	LogLevel.INFO,		# CAST
+	LogLevel.INFO,		# FIZZLE
+	LogLevel.INFO,		# DAMAGE
+	LogLevel.DEBUG,		# PIP
+	LogLevel.DEBUG,		# ACCURACY
+	LogLevel.INFO,		# EFFECT
+	LogLevel.INFO,		# PLAY
+	LogLevel.INFO,		# PAY
+)
+
+# A single log entry
+# Data is a tuple (or scalar) whose layout depends on the type (see datatypes.RecordType)
+class Record:
+	__slots__ = ("type", "round", "member", "data")
+
+	def __init__(self, rtype, round, member = None, data = None):
+		self.type = rtype
+		self.round = round
+		self.member = member
+		self.data = data
+
+
+# Simulation event log
+# Callers guard each emit behind the matching flag so disabled levels do no formatting or allocation:
+#   if log.info: log.emit(RecordType.CAST, ...)
+class EventLog:
+	def __init__(self):
+		self._subscribers = []		# List of (callback, LogLevel)
+
+		# Flags for the call sites (updated as subscribers come and go)
+		self.level = LogLevel.NONE
+		self.warning = False
+		self.info = False
+		self.debug = False
+
+	# Register a callable that receives every Record at or below level
+	# Subscribing an existing callback again only updates its level
+	def subscribe(self, callback, level = LogLevel.INFO):
+		self.unsubscribe(callback)
+		self._subscribers.append((callback, LogLevel(level)))
+		self._update()
+
+	def unsubscribe(self, callback):
+		self._subscribers = [sub for sub in self._subscribers if sub[0] != callback]
+		self._update()
+
+	def _update(self):
+		self.level = max((level for _, level in self._subscribers), default = LogLevel.NONE)
+		self.warning = self.level >= LogLevel.WARNING
+		self.info = self.level >= LogLevel.INFO
+		self.debug = self.level >= LogLevel.DEBUG
+
+	# Build a record and pass it to every interested subscriber
+	def emit(self, rtype, round, member = None, data = None):
+		record = Record(rtype, round, member, data)
+		level = RECORD_LEVEL[rtype]
+		for callback, maxLevel in self._subscribers:
+			if level <= maxLevel: callback(record)
+
+
+# Subscriber that renders records to the terminal (the original simulation output)
+# Needs the simulation for display names and the round summary
+class ConsoleRenderer:
+	def __init__(self, simulation):
+		self._sim = simulation
+
+	def __call__(self, record):
+		print(self.render(record))
+
+	def _name(self, memberID):
+		stats = self._sim.stats.get(memberID)
+		return memberID if stats is None else stats.name
+
+	def _caster(self, record):
+		return f"-- CASTING PHASE --\nCASTER: {self._name(record.member)} ({record.member})"
+
+	# Returns the display string for a record
+	def render(self, record):
+		data = record.data
+		match record.type:
+			case RecordType.WARNING: return f"WARNING: {data}"
+			case RecordType.LOAD:
+				kind, identifier, name = data
+				if name is None: return f"Failed to load {kind} '{identifier}'"
+				if kind == "simulation": return f"Loaded simulation from {identifier}"
+				if kind == "agent": return f"Successfully loaded agent '{name}' for member '{identifier}'"
+				return f"Successfully loaded {kind} '{identifier}' ({name})"
+
+			case RecordType.ROUND_END:
+				return f"-- END OF ROUND --\nROUND: {record.round}\nEVAL: {data}\n{self._sim.__repr__()}\n"
+
+			case RecordType.END:
+				match data:
+					case Status.A_VICTORY: ret = "Player victory!"
+					case Status.B_VICTORY: ret = "Enemy victory :("
+					case other: ret = f"Battle ended ({Status(data).name})"
+				return ret + "\n-- SIMULATION END --\n"
+
+			case RecordType.PLAN:
+				spellIdx, target = data
+				return f"-- PLANNING PHASE --\nSelection: {spellIdx}, {target}"
+
+			case RecordType.INVALID:
+				spellIdx, spellID = data
+				if spellID is None: return f"{self._name(record.member)} attempted to selected a spell index out of range ({spellIdx})"
+				return f"{self._name(record.member)} does not have enough pips to cast {self._sim.spells[spellID].spell}"
+
+			case RecordType.PASS: return self._caster(record) + f"\nSPELL: < {data} >"
+
+			case RecordType.CAST:
+				spellID, targets = data
+				ret = self._caster(record) + f"\nSPELL: {self._sim.spells[spellID].spell}"
+				if targets is not None: ret += f"\nTARGET: {[Position(x).name for x in targets]}"
+				return ret
+
+			case RecordType.FIZZLE:
+				spellID, dispelled, insertIdx = data
+				ret = f"Fizzle{' (dispel)' if dispelled else ''}"
+				if insertIdx is not None: ret += f"\nShuffled back into the deck at {insertIdx}"
+				return ret
+
+			case RecordType.DAMAGE:
+				targetID, damage, base, outgoingMod, incomingMod = data
+				return f"{damage} damage dealt to {self._name(targetID)}\nDEBUG: {base} * {outgoingMod} * {incomingMod}"
+
+			case RecordType.PIP:
+				pip, chance = data
+				return f"Generating pip for member {record.member} with chance {chance}: {Pip(pip).name}"
+
+			case RecordType.ACCURACY:
+				spellID, roll, chance = data
+				return f"Accuracy roll for {spellID}: {roll:.3f} against {chance:.3f}"
+
+			case RecordType.EFFECT:
+				memberID, attr, entry, added = data
+				return f"{self._name(memberID)} {'gained' if added else 'used'} {attr[:-1]} {entry}"
+
+			case RecordType.PLAY:
+				spellIdx, spellID = data
+				return f"{self._name(record.member)} played {self._sim.spells[spellID].spell} from hand slot {spellIdx}"
+
+			case RecordType.PAY:
+				spellID, basic, power = data
+				return f"Paid {basic} basic and {power} power pips for {self._sim.spells[spellID].spell}"
+
+		return f"{RecordType(record.type).name}: {data}"
@@ -14,6 +14,52 @@ if __name__ == "__main__":
 		editor.startEditor()
 		exit()
 
+	# Monte Carlo batch mode
+	# main.py batch <state path> <battle count> [workers]
+	if sys.argv[1] == "batch":
+		from batch import runBatch
+		path = sys.argv[2]
+		battles = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+		workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+		print(runBatch(path, battles, workers))
+		exit()
+
+	# Monte Carlo batch mode streaming every battle record to shard files (format: jsonl or bin)
+	# main.py trace <state path> <output directory> [battle count] [format] [workers]
+	if sys.argv[1] == "trace":
+		from batch import runBatch
+		path = sys.argv[2]
+		directory = sys.argv[3]
+		battles = int(sys.argv[4]) if len(sys.argv) > 4 else 1000
+		traceFormat = sys.argv[5] if len(sys.argv) > 5 else "jsonl"
+		workers = int(sys.argv[6]) if len(sys.argv) > 6 else None
+		print(runBatch(path, battles, workers, trace = directory, traceFormat = traceFormat))
+		exit()
+
+	# Round-robin tournament between every agent in agents/
+	# main.py tournament <state path>[,<state path>...] [battles per pairing and side] [workers] [search seconds per decision]
+	if sys.argv[1] == "tournament":
+		from tournament import runTournament, SEARCH_BUDGET
+		scenarios = sys.argv[2].split(",")
+		battles = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+		workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+		searchBudget = float(sys.argv[5]) if len(sys.argv) > 5 else SEARCH_BUDGET
+		print(runTournament(scenarios, battles, workers = workers, searchBudget = searchBudget))
+		exit()
+
+	# Phase timing and cProfile statistics for battles from a state file
+	# main.py profile <state path> [battle count] [pstats output path]
+	if sys.argv[1] == "profile":
+		from profiler import profileScenario
+		path = sys.argv[2]
+		battles = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+		output = sys.argv[4] if len(sys.argv) > 4 else None
+		profile, stats = profileScenario(path, battles, output)
+		print(profile.summary() + "\n")
+		stats.stream = sys.stdout
+		stats.sort_stats("tottime").print_stats(15)
+		exit()
+
 	# -- INIT SIMULATION --
 	# Generate participants
 
@@ -0,0 +1,54 @@
+# pips.py
+# Packed pip counts and the precomputed pip affordability tables
+# A member's pips (counts indexed by datatypes.Pip) pack into one integer with PIP_BITS per pip type
+# Paying a cost only depends on the basic and power counts (the low byte of a packed vector), so the
+#   split of every (pips, cost, mastery) combination is tabled once per cost when spells are compiled
+#   (see datatypes.Program) and a payment becomes one tuple lookup
+
+PIP_BITS = 4
+PIP_LIMIT = 1 << PIP_BITS			# Counts must stay below this to be packed
+PIP_MASK = PIP_LIMIT - 1
+AFFORD_MASK = (1 << (2 * PIP_BITS)) - 1		# Basic and power fields of a packed vector (BASIC = 0, POWER = 1)
+
+# Pack a count array (every count must be below PIP_LIMIT)
+def packPips(pips):
+	packed = 0
+	for i, count in enumerate(pips): packed |= count << (PIP_BITS * i)
+	return packed
+
+def unpackPips(packed, length = 10):
+	return [(packed >> (PIP_BITS * i)) & PIP_MASK for i in range(length)]
+
+# Table index of a basic / power pair (None if a count is too large to be tabled)
+def affordIndex(basic, power):
+	if basic >= PIP_LIMIT or power >= PIP_LIMIT: return None
+	return basic | (power << PIP_BITS)
+
+
+# How a cost would be paid with basic and power pips (a power pip pays two with mastery)
+# Returns tuple of (basic pips, power pips) or None if the cost cannot be paid
+def paySplit(basic, power, cost, mastery = True):
+	# TODO: Anything with archmastery pips or X casting cost
+	# TODO: Shadow pip consumption
+	usePower = min(power, int(cost / 2)) if mastery else 0
+	useBasic = cost - (2 * usePower)
+
+	# Start by consuming basic pips, using powers as overflow
+	if useBasic > basic:
+		usePower += useBasic - basic
+		useBasic = basic
+
+	if usePower > power: return None
+	return useBasic, usePower
+
+
+# Split tables by (cost, mastery): tuples of paySplit() results indexed by affordIndex()
+_TABLES = {}
+
+def splitTable(cost, mastery):
+	key = (cost, bool(mastery))
+	table = _TABLES.get(key)
+	if table is None:
+		table = tuple(paySplit(i & PIP_MASK, i >> PIP_BITS, cost, mastery) for i in range(AFFORD_MASK + 1))
+		_TABLES[key] = table
+	return table
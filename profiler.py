@@ -0,0 +1,100 @@
+# profiler.py
+# Optional timing instrumentation for the simulation
+# Attach a PhaseProfile as Simulation.profile to record wall time and call counts for each
+#   datatypes.Phase of advance() / updateRound(), agent select() calls, and catalog loading
+# Without a profile attached, the cost is one attribute check per phase
+
+from cProfile import Profile
+from io import StringIO
+from json import dumps, loads
+from pstats import Stats as ProfileStats
+from time import perf_counter
+
+from datatypes import LogLevel, Phase
+from util import loadJSON
+
+# Keys recorded besides the phases
+SELECT = "select"				# Agent select() calls (also a part of PLANNING)
+LOAD_STATS = "loadStats"		# Reading member stats files (including their spells)
+LOAD_SPELL = "loadSpell"		# Reading and compiling spell files
+
+class PhaseProfile:
+	def __init__(self):
+		self.times = {}		# Dict of key (datatypes.Phase or one of the names above) -> [seconds, calls]
+
+	# Record the time since start against key
+	# Returns the current time (so consecutive phases can be chained)
+	def lap(self, key, start):
+		now = perf_counter()
+		entry = self.times.get(key)
+		if entry is None: self.times[key] = [now - start, 1]
+		else:
+			entry[0] += now - start
+			entry[1] += 1
+		return now
+
+	# Record seconds against key directly
+	def add(self, key, seconds, calls = 1):
+		entry = self.times.get(key)
+		if entry is None: self.times[key] = [seconds, calls]
+		else:
+			entry[0] += seconds
+			entry[1] += calls
+
+	def reset(self):
+		self.times.clear()
+
+	def merge(self, other):
+		for key, (seconds, calls) in other.times.items():
+			entry = self.times.setdefault(key, [0, 0])
+			entry[0] += seconds
+			entry[1] += calls
+		return self
+
+	def __str__(self):
+		return self.summary()
+
+	# Table of every key with total time, calls, and mean time per call
+	# Phases are listed in battle order, followed by the other keys
+	def summary(self):
+		phases = [p for p in Phase if p in self.times]
+		phases.sort(key = lambda p: (p == Phase.ROUND, p))
+		others = [k for k in self.times if not isinstance(k, Phase)]
+		total = sum(self.times[p][0] for p in phases)
+
+		ret = f"{'phase':12} {'seconds':>10} {'share':>7} {'calls':>10} {'us/call':>10}"
+		for key in phases + others:
+			seconds, calls = self.times[key]
+			name = key.name if isinstance(key, Phase) else key
+			share = f"{seconds / total * 100:6.1f}%" if isinstance(key, Phase) and total > 0 else ""
+			ret += f"\n{name:12} {seconds:10.4f} {share:>7} {calls:10} {seconds / calls * 1e6:10.2f}"
+
+		return ret
+
+
+# Play battles from a state file with phase timing and cProfile both enabled
+# output -> Path for the pstats dump (None to skip)
+# Returns tuple of (PhaseProfile, pstats.Stats)
+def profileScenario(path, battles = 100, output = None, randseed = 0, maxRounds = 1000):
+	from simulation import Simulation
+
+	data = loadJSON(path)
+	stateStr = dumps(data["state"])
+	agents = data.get("agents", {})
+
+	profile = PhaseProfile()
+	sim = Simulation(verbosity = LogLevel.NONE)
+	sim.profile = profile
+
+	cprofile = Profile()
+	cprofile.enable()
+	for i in range(battles):
+		sim.rng.seed(randseed + i)
+		sim.loadState(loads(stateStr))
+		for memberID, agent in agents.items():
+			sim.loadAgent(memberID, agent)
+		sim.run(maxRounds)
+	cprofile.disable()
+
+	if output is not None: cprofile.dump_stats(output)
+	return profile, ProfileStats(cprofile, stream = StringIO())
@@ -8,14 +8,28 @@ from json import load, loads, dump
 from json.decoder import JSONDecodeError as JSONError
 from os import path as ospath
 from math import floor
-from random import seed, random, uniform, choice, randrange	# TODO REMOVE CHOICE AND USE WEIGHTED METHOD OF SELECTION
+from array import array
+from random import Random
+from time import perf_counter
+from types import MappingProxyType
 
-from state import State, Member, Event
+from state import State, Member, Event, Schedule, spellArray, TURN, BEFORE_TURN, AFTER_TURN, FRIENDLY_HEALTH, ENEMY_HEALTH
 from datatypes import * # ActionType, Position, Phase, Spell, Stats, Pip, EventType, Status, StatusEffect
 from util import loadJSON, shuffle
+from eventlog import EventLog, ConsoleRenderer
+from catalog import SPELLS, modifierEntry
+from zobrist import TranspositionTable
+from profiler import SELECT, LOAD_STATS, LOAD_SPELL
+
+PASS_MOVE = (None, None)		# Agent selection that passes the turn
+DECKS = ("deck", "side")		# Member attributes holding cards (their counts follow every change; see Member.countCard())
+MAX_ROUNDS = 1000				# Default limits of Simulation.run() and batch.runBatch()
+STALL_ROUNDS = 20
 
 class Simulation:
-	def __init__(self, path = None):
+	# randseed -> Seed for the simulation's random generator (None seeds from system entropy)
+	# verbosity -> datatypes.LogLevel of the console renderer (LogLevel.NONE for no terminal output)
+	def __init__(self, path = None, randseed = None, verbosity = LogLevel.WARNING):
 		# Simulation parameters
 		self.pvpDamage = False		# TODO: Alternative damage calculations for pvp
 		self.pvpPlanning = True		# TODO: If False, all members plan their attacks at once (use event system to handle this)
@@ -23,8 +37,34 @@ class Simulation:
 		# Data references
 		self.stats = {}		# Dict of member stats (key: member_id;  value: <types.Stats>)
 		self.spells = {}	# Dict of spells loaded to memory (key: spell_id;  value: <types.Spell)
+		self.programs = []	# Compiled spells used by the casts, indexed by spell number (catalog.SPELLS; None if not loaded)
 		self.agents = {}	# Dict of memberID and agent instance
 
+		# Random generator owned by this simulation (shuffles, fizzles, damage rolls, and pip rolls)
+		# Never use the global random module here: simulations sharing a process would step on each other
+		self.rng = Random(randseed)
+
+		# Default limits of run() (None disables a limit, so a battle between passing agents never ends)
+		self.maxRounds = MAX_ROUNDS			# Round after which a battle is a stalemate
+		self.stallRounds = STALL_ROUNDS		# Rounds without any progress after which a battle is a stalemate
+
+		# Structured event log (more subscribers can be attached through self.log.subscribe())
+		self.log = EventLog()
+		if verbosity > LogLevel.NONE: self.log.subscribe(ConsoleRenderer(self), verbosity)
+
+		# Transposition table shared by process() and search agents (zobrist.TranspositionTable or None)
+		self.table = None
+
+		# Results of castDistribution() keyed by the caster, spell, target, and their modifier stacks
+		# Stats never change, so the cache is shared with clones
+		self.casts = TranspositionTable(1 << 12)
+
+		# Phase timing instrumentation (profiler.PhaseProfile or None)
+		self.profile = None
+
+		# Battle records (not a part of the state)
+		self.tally = {}		# Damage dealt by each member since the state was loaded (key: member_id;  value: int)
+
 		# -- NOT IMPLEMENTED UNTIL MUCH LATER --
 		# self.cheats = {}	# TODO: Dict of <types.cheat>
 
@@ -37,10 +77,8 @@ class Simulation:
 
 		# Get the casting player
 		casterID = ""
-		try: casterID = self.state.events[self.state.eventidx].member
-		except IndexError as _: 
-			# casterID = self.state.position[self.state.first]
-			pass
+		event = self.state.nextEvent()
+		if event is not None: casterID = event.member
 
 		# Print round information
 		ret += f"Round: {self.state.round}"
@@ -88,36 +126,66 @@ class Simulation:
 		
 		return ret
 
+	# Copy of the simulation for lookahead (such as agent rollouts)
+	# Stats and spells are shared (they are never modified), the state is cloned, and the copy
+	#   gets its own random generator and a silent log
+	# Agents are not copied as they are bound to their simulation; load or assign new ones
+	def clone(self, randseed = None):
+		ret = Simulation(randseed = randseed, verbosity = LogLevel.NONE)
+		ret.pvpDamage = self.pvpDamage
+		ret.pvpPlanning = self.pvpPlanning
+		ret.stats = self.stats
+		ret.spells = self.spells
+		ret.programs = self.programs
+		ret.casts = self.casts
+		ret.state = self.state.clone()
+		return ret
+
 	# Load the simulation data from a file
 	# TODO CREATE DIRECTORY AND FILETYPE ASSUMPTION
 	def load(self, path):
 		data = None
-		print("path:", path)
 		try: data = loadJSON(path)
 		except ValueError:
-			print("WARNING: Simulation data could not be parsed from json string or path")
+			if self.log.warning: self.log.emit(RecordType.WARNING, 0, None, "Simulation data could not be parsed from json string or path")
 			return
+		if self.log.debug: self.log.emit(RecordType.LOAD, 0, None, ("simulation", path, path))
+
+		# Restore the random generator (if saved) so the battle continues exactly as it would have
+		rngState = data.get("rng")
+		if rngState is not None:
+			version, internal, gauss = rngState
+			self.rng.setstate((version, tuple(internal), gauss))
 
 		# Initialize the state
+		self.loadState(data["state"])
+		
+
+		# Initialize cast selection agents
+		agents = data.get("agents", {})
+		for mID, agent in agents.items():
+			self.loadAgent(mID, agent)
+
+	# Initialize the state from a (parsed) state dict
+	# Member stats and spells that are already loaded are reused, so this is cheap to call
+	#   repeatedly (such as when playing many battles from the same starting state)
+	# NOTE: The state takes ownership of the lists within data (pass a copy if data is reused)
+	def loadState(self, data):
 		# NOTE: Ideal simulation files will have entries for all members here, even if their state is unmodified
-		self.state = State(data["state"])
+		self.state = State(data)
+		self.tally = {}
 		for mID, mState in self.state.members.items():
 			self.loadStats(mID, mState)
 
 		# Check that all member specified in the battle position are loaded
 		for mID in self.state.position:
-			if mID is None or mID in self.stats: continue
-			print("WARNING: Member found in battle with no state! (Statefile may be corrupt)")
+			if mID is None or mID in self.state.members: continue
+			if self.log.warning: self.log.emit(RecordType.WARNING, self.state.round, mID, "Member found in battle with no state! (Statefile may be corrupt)")
 
 			# Same logic as Simulation.addMember() but saving the warning and position logic
 			mState = Member()
 			self.state.members[mID] = mState
 			self.loadStats(mID, mState)
-		
-		# Initialize cast selection agents
-		agents = data.get("agents", {})
-		for mID, agent in agents.items():
-			self.loadAgent(mID, agent)
 	
 	# Saves state data alongside other important data, like the member list and cheats
 	# Members and cheats can be loaded individually (useful with GUI mode) or all at once
@@ -134,82 +202,97 @@ class Simulation:
 			agentsDict[mID] = str(agent)
 
 		# Define the output file structure
+		version, internal, gauss = self.rng.getstate()
 		data = {
 			"state": stateDict,
-			"agents": agentsDict
+			"agents": agentsDict,
+			"rng": [version, list(internal), gauss]
 		}
 
 		with open(path, "w") as f: dump(data, f)
 	
 	# Load the stats associated with a state member
+	# Stats are only read from file once; later calls reuse the entry in self.stats
 	# Returns reference to data stored in self.stats dict
 	# TODO: Add support for multiple copies of the same member ID
 	def loadStats(self, memberID, memberState):
-		# Parse memberID into path
-		# TODO: Make sure this works on windows
-		partialPath = memberID.replace(".", "/") + ".stats"
-		path = ospath.join(".", "members", partialPath)
-		print("Loading member stats from", path)
-
-		# Create the stats object
-		data = None
-		try: 
-			with open(path) as f: data = load(f)
-		except (FileNotFoundError, JSONError):
-			print(f"WARNING: Stats data {path} could not be parsed")
-
-		stats = Stats(data)
-		self.stats[memberID] = stats
-
-		# Load the spell files for all the spells in the member's decks
-		for spellID in (stats.deck + stats.side):
-			if spellID in self.spells: continue
-			self.loadSpell(spellID)
+		stats = self.stats.get(memberID)
+		if stats is None:
+			if self.profile is not None: lap = perf_counter()
+			# Parse memberID into path
+			# TODO: Make sure this works on windows
+			partialPath = memberID.replace(".", "/") + ".stats"
+			path = ospath.join(".", "members", partialPath)
+
+			# Create the stats object
+			data = None
+			try: 
+				with open(path) as f: data = load(f)
+			except (FileNotFoundError, JSONError):
+				if self.log.warning: self.log.emit(RecordType.WARNING, 0, memberID, f"Stats data {path} could not be parsed")
+
+			stats = Stats(data)
+			self.stats[memberID] = stats
+			if self.log.debug: self.log.emit(RecordType.LOAD, 0, memberID, ("stats", memberID, stats.name))
+
+			# Load the spell files for all the spells in the member's decks
+			for spellID in (stats.deck + stats.side):
+				if spellID in self.spells: continue
+				self.loadSpell(spellID)
+			if self.profile is not None: self.profile.lap(LOAD_STATS, lap)
 
 		# Populates unset values with respect to stats in the state (not likely to be called if coming from loadData)
 		if memberState.health < 0: memberState.health = stats.health
 		# if memberState.mana < 0: memberState.mana = stats.mana
 		if memberState.amschool == Pip.NONE: memberState.amschool = stats.amschool
 		if memberState.deck is None: 
-			deck = stats.deck.copy()
-			if stats.player: shuffle(deck)
+			deck = spellArray(stats.deck)
+			if stats.player: shuffle(deck, self.rng)
 			memberState.deck = deck
 		if memberState.side is None:
-			side = stats.side.copy()
-			if stats.player: shuffle(side)
+			side = spellArray(stats.side)
+			if stats.player: shuffle(side, self.rng)
 			memberState.side = side
 		if memberState.pips is None:
 			# memberState.pips = [Pip.NONE for x in range(7)]
-			memberState.pips = [0 for x in range(len(Pip.__members__))]
+			memberState.pips = array("b", [0 for x in range(len(Pip.__members__))])
 			memberState.gainPips(stats.startpips)
 
 		# Load the cheats associated with the stats object
 		# print("TODO: [simulation.py] loadStats(): generate cheat types and save them to sim data")
-		print(f"Successfully loaded member '{memberID}' ({stats.name})")
 
 		return stats
 
 	# Load a spell file (spells will be loaded as needed, not at initialization)
 	# Returns reference to loaded spell
 	def loadSpell(self, spellID):
+		if self.profile is not None: lap = perf_counter()
 		partialPath = spellID.replace(".", "/") + ".spell"
 		path = ospath.join(".", "spells", partialPath)
-		print("Loading spell from", path)
 
 		# Create the spell object
 		data = None
 		try: 
 			with open(path) as f: data = load(f)
 		except (FileNotFoundError, JSONError):
-			print(f"WARNING: Spell data {path} could not be parsed")
+			if self.log.warning: self.log.emit(RecordType.WARNING, 0, None, f"Spell data {path} could not be parsed")
 			return
 		
 		spell = Spell(data)
 		if not spell.valid: spell = None
 		self.spells[spellID] = spell	# Put the empty spell in the dictionary anyway so we don't keep trying to load it
 
-		if spell is None: print(f"Failed to load spell '{spellID}'")
-		else: print(f"Successfully loaded spell '{spellID}' ({spell.spell})")
+		# Compile the spell for advance()
+		if spell is not None:
+			program = Program(spellID, spell)
+			while len(self.programs) <= program.number: self.programs.append(None)
+			self.programs[program.number] = program
+
+		if spell is None:
+			if self.log.warning: self.log.emit(RecordType.WARNING, 0, None, f"Failed to load spell '{spellID}'")
+		elif self.log.debug: self.log.emit(RecordType.LOAD, 0, None, ("spell", spellID, spell.spell))
+
+		if self.profile is not None: self.profile.lap(LOAD_SPELL, lap)
 
 		return spell
 
@@ -220,14 +303,14 @@ class Simulation:
 	def loadAgent(self, member, agent):
 		# Make sure that the member exists
 		if not member in self.stats:
-			print(f"WARNING: Initializing agent '{agent}' for nonexistent member '{member}' -- SKIPPING!")
+			if self.log.warning: self.log.emit(RecordType.WARNING, 0, member, f"Initializing agent '{agent}' for nonexistent member '{member}' -- SKIPPING!")
 			return None
 
 		agentClass = __import__(f"agents.{agent}", fromlist = [None])
 		agentInst = agentClass.Agent(self, member)
 		self.agents[member] = agentInst
 
-		print(f"Successfully loaded agent '{agent}' for member '{member}'")
+		if self.log.debug: self.log.emit(RecordType.LOAD, 0, member, ("agent", member, agent))
 
 		return agentInst
 
@@ -241,13 +324,16 @@ class Simulation:
 		newMember = Member()
 		self.state.members[memberID] = newMember
 		self.loadStats(memberID, newMember)
+		self.state.touch(None, "members")
 
 		# Drop the new member into the battle
 		if pos <= 0: 
-			print("WARNING: New member created without position in battle!")
+			if self.log.warning: self.log.emit(RecordType.WARNING, self.state.round, memberID, "New member created without position in battle!")
 			return		
 		assert self.state.position[pos] == None
+		self.state.touch(None, "position")
 		self.state.position[pos] = memberID
+		self.state.touch(None, "position")
 
 	# If a member dies, their state resets
 	# Use health = -1 to ressurect to "full"
@@ -261,49 +347,122 @@ class Simulation:
 		# Important overrides
 		mstateNew.health = health
 		# mstateNew.pips = [Pip.NONE for x in range(7)]
-		mstateNew.pips = [0 for x in range(len(Pip.__members__))]
+		mstateNew.pips = array("b", [0 for x in range(len(Pip.__members__))])
 
 		# Copy over values that do not reset
 		mstateNew.amschool = mstateOld.amschool
 		mstateNew.deck = mstateOld.deck
 		mstateNew.side = mstateOld.side
+		if health < 0: mstateNew.health = self.stats[memberID].health
+
+		self.state.members[memberID] = mstateNew
+		self.state.touch(None, "members")
 		
 
 	# --- CORE SIMULATION OPERATION ---
 
 	# Primary simulation operation
 	# Takes the current state and calculates a distribution of all possible child states
-	# ^^Iteration size is *one* member turn
-	def process(self):
-		# output = DeltaTree(self.state)
-		raise NotImplementedError("Delta tree processing")
+	# ^^Iteration size is *one* member turn (or the round update if no events remain)
+	# The state is not modified; every stochastic element of advance() becomes a branch of the tree
+	# selection -> (spellIdx, target) to plan with; required if the upcoming event is a PLAN event (asking
+	#   the member's agent here could consume the random generator or run a whole search)
+	# Returns a DeltaTree rooted at the current state (sampled with the simulation's random generator)
+	def process(self, selection = None):
+		tree = DeltaTree(self.state, self.rng)
+
+		# Member turns with a known selection only depend on the position, so equal positions share a tree
+		key = None
+		if self.table is not None and selection is not None:
+			key = (self.state.hash(), selection)
+			cached = self.table.get(key)
+			if cached is not None:
+				tree.root = cached
+				return tree
+
+		# Locate the upcoming event (same rules as State.getEvent(), which drops invalid events ahead of it)
+		dropped, event = self.state.events.front(self.state.position)
+		if event is None:
+			self._processRound(tree.root)
+			return tree
+
+		deltas = [Delta(DeltaType.REMOVE, None, "events", (0, e)) for e in dropped]
+		deltas.append(Delta(DeltaType.REMOVE, None, "events", (0, event)))
+
+		casterID = event.member
+		cstate = self.state.members[casterID]
+		cstats = self.stats[casterID]
+
+		# Make sure the member can cast at all (they might be out of health)
+		if cstate.health <= 0:
+			tree.root.newChild(deltas, 1.0, Phase.PLANNING)
+			return tree
+
+		# -- PLANNING PHASE --
+		# Mirrors advance(), but the event itself is left untouched (it is consumed by this turn anyway)
+		eventType, spell, target = event.type, event.spell, event.target
+		deckLen = len(cstate.deck)
+		if eventType == EventType.CAST:
+			if cstate.status[StatusEffect.STUNNED] > 0: eventType = EventType.PASS
+
+		elif eventType == EventType.PLAN:
+			if selection is None: raise ValueError(f"process() needs a selection for the PLAN event of '{casterID}'")
+			spellIdx, target = selection
+
+			if cstate.status[StatusEffect.STUNNED] > 0: eventType = EventType.PASS
+			elif spellIdx is None: eventType = EventType.PASS
+			elif self.validateSpell(casterID, target, spellIdx):
+				eventType = EventType.CAST
+				spell = cstate.deck[spellIdx]
+
+				if cstats.player:
+					deltas.append(Delta(DeltaType.REMOVE, casterID, "deck", (spellIdx, spell)))
+					deltas.append(Delta(DeltaType.ADD, casterID, "hand", -1))
+					deckLen -= 1
+
+			else: eventType = EventType.PASS
+
+		match eventType:
+			case EventType.PLAN: raise AssertionError("Event type was never updated")
+			case EventType.PASS:
+				tree.root.newChild(deltas, 1.0, Phase.PLANNING)
+				return tree
+			case EventType.PET: raise NotImplementedError("Pet maycasts ( simulation.py:process() )")
+			case EventType.INTERRUPT: raise NotImplementedError("Battle cheats ( simulation.py:process() )")
+			case EventType.EFFECT: raise NotImplementedError("Advanced spell effects ( simulation.py:process() )")
+			case EventType.CAST: pass
+
+		self._processCast(tree.root, deltas, casterID, spell, target, deckLen)
+		if key is not None: self.table.put(key, tree.root)
+		return tree
 
 	# Simulate one battle event, or generate events if none (start of round event)
+	# randseed -> Reseed the simulation's random generator before the event
 	# Returns datatypes.Status regarding simulation state
 	def advance(self, randseed = None):
-		if isinstance(randseed, int): seed(randseed)
+		if isinstance(randseed, int): self.rng.seed(randseed)
+		profile = self.profile
+		if profile is not None: lap = perf_counter()
 
 		# -- Update round components --
 		event = self.state.getEvent()
 		evaluation = self.evalState()
 
 		if event is None:
-			print("-- END OF ROUND --")
+			if profile is not None: profile.add(Phase.ROUND, perf_counter() - lap, 0)		# Counted by updateRound()
 			self.updateRound()
 
 			# Only check for victory at the start of a round
 			# Possible for a player to be beguiled and cast rebirth, healing enemy team
-			if evaluation >= 1:
-				print("Player victory!")
-				return Status.A_VICTORY
-			if evaluation <= -1:
-				print("Enemy victory :(")
-				return Status.B_VICTORY
+			status = Status.ROUND_END
+			if evaluation >= 1: status = Status.A_VICTORY
+			elif evaluation <= -1: status = Status.B_VICTORY
 			
 			# Round information
-			print(f"ROUND: {self.state.round}")	# TODO: Add caster index to output
-			print("EVAL:", evaluation)
-			return Status.ROUND_END
+			if self.log.info:
+				if status == Status.ROUND_END: self.log.emit(RecordType.ROUND_END, self.state.round, None, evaluation)	# TODO: Add caster index to output
+				else: self.log.emit(RecordType.END, self.state.round, None, status)
+			return status
 
 			# - Use this block if round update and first event should be simulated immediately (old implementation)
 			# event = self.state.getEvent()
@@ -321,7 +480,8 @@ class Simulation:
 
 		# Make sure the member can cast at all (they might be out of health)
 		if cstate.health <= 0:
-			print(f"{cstats.name} has no health, passing!")
+			if self.log.info: self.log.emit(RecordType.PASS, self.state.round, casterID, "No health")
+			if profile is not None: profile.lap(Phase.PLANNING, lap)
 			return Status.CONTINUE
 
 		# -- PLANNING PHASE --
@@ -340,11 +500,11 @@ class Simulation:
 			# TODO: If confused and passing, randomize spell selection (LATER)
 
 		elif event.type == EventType.PLAN:
-			print("-- PLANNING PHASE --")
-
 			# Call upon the cast agent to determine the spell selection
+			if profile is not None: selectStart = perf_counter()
 			spellIdx, target = cagent.select()		# DEBUG: Allow agent to modify hand and get index
-			print(f"Selection: {spellIdx}, {target}")
+			if profile is not None: profile.lap(SELECT, selectStart)
+			if self.log.debug: self.log.emit(RecordType.PLAN, self.state.round, casterID, (spellIdx, target))
 
 			# This happens after selection as the deck can be manipulated while stunned)
 			if cstate.status[StatusEffect.STUNNED] > 0:
@@ -369,17 +529,22 @@ class Simulation:
 
 				# TODO: Consider moving this to member function?
 				if cstats.player:
+					self.state.touch(casterID, "deck")
+					self.state.touch(casterID, "hand")
 					cstate.deck.pop(spellIdx)
 					cstate.hand -= 1
+					cstate.countCard(event.spell, -1)
+					self.state.touch(casterID, "deck")
+					self.state.touch(casterID, "hand")
+					if self.log.info: self.log.emit(RecordType.PLAY, self.state.round, casterID, (spellIdx, self.programs[event.spell].spellID))
 			
 			else: 
 				event.type = EventType.PASS
 				passDesc = "Invalid"
 
-		# -- CAST PHASE --
-		print("-- CASTING PHASE --")
-		print(f"CASTER: {cstats.name} ({casterID})")
+		if profile is not None: lap = profile.lap(Phase.PLANNING, lap)
 
+		# -- CAST PHASE --
 		# TODO: Tokens
 
 		# Parse the event
@@ -387,40 +552,51 @@ class Simulation:
 		match event.type:
 			case EventType.PLAN: raise AssertionError("Event type was never updated")
 			case EventType.PASS:
-				print(f"SPELL: < {passDesc} >")
+				if self.log.info: self.log.emit(RecordType.PASS, self.state.round, casterID, passDesc)
 				return Status.CONTINUE
 			case EventType.PET: raise NotImplementedError("Pet maycasts ( simulation.py:advance() )")
 			case EventType.INTERRUPT: raise NotImplementedError("Battle cheats ( simulation.py:advance() )")
 			case EventType.EFFECT: raise NotImplementedError("Advanced spell effects ( simulation.py:advance() )")
 			case EventType.CAST: pass
 		
-		# spell = self.spells["ice.frostbeetle"]	# DEBUGGING
-		spellID = event.spell
-		selection = self.spells[spellID]
-		spell, enchant = selection if isinstance(selection, tuple) else (selection, None)
-		print(f"SPELL: {spell.spell}")
+		spell = event.spell
+		program = self.programs[spell]
 
-		targets = event.target if (event.target is None or isinstance(event.target, list)) else [event.target]	# Obtain state and stats within loop
-		if targets is not None: print(f"TARGET: {[Position(x).name for x in targets]}")
+		targets = event.target if (event.target is None or isinstance(event.target, (list, tuple))) else [event.target]	# Obtain state and stats within loop
+		if self.log.info: self.log.emit(RecordType.CAST, self.state.round, casterID, (program.spellID, targets))
 
 		# TODO: Verify / update targets (checks for confused / beguiled)
 
 		# Handle fizzle event (shuffle back into deck if player)
 		# TODO: Handle dispels and accuracy charms / enchants
 		dispel = False		# TODO: Ensure a dispel reshuffles the spell back into the deck
-		fizzle = not ((spell.rate + cstats.accuracy[spell.school]) > random())
-		if dispel: cstate.consumePips(spell.cost, cstats.mastery[spell.school], spell.scost, True)
+		chance = program.rate + cstats.accuracy[program.school]
+		roll = self.rng.random()
+		if self.log.debug: self.log.emit(RecordType.ACCURACY, self.state.round, casterID, (program.spellID, roll, chance))
+		fizzle = not (chance > roll)
+		mastery = cstats.mastery[program.school]
+		if dispel:
+			if self.log.info: self.log.emit(RecordType.PAY, self.state.round, casterID, (program.spellID, *cstate.splitPips(program.cost, mastery)))
+			cstate.consumePips(program.cost, mastery, program.scost, True)
 		if dispel or fizzle:
-			print(f"Fizzle{' (dispel)' if dispel else ''}")
+			insertIdx = None
+			if cstats.player:
+				insertIdx = self.rng.randrange(0, len(cstate.deck) + 1)
+				self.state.touch(casterID, "deck")
+				cstate.deck.insert(insertIdx, spell)
+				cstate.countCard(spell, 1)
+				self.state.touch(casterID, "deck")
 
-			if not cstats.player: return Status.CONTINUE
+			if self.log.info: self.log.emit(RecordType.FIZZLE, self.state.round, casterID, (program.spellID, dispel, insertIdx))
 
-			insertIdx = randrange(0, len(cstate.deck) + 1)
-			cstate.deck.insert(insertIdx, spellID)
+			if profile is not None: profile.lap(Phase.CAST, lap)
 			return Status.CONTINUE
 
 		# Cast was successful, consume pip cost
-		cstate.consumePips(spell.cost, cstats.mastery[spell.school], spell.scost, True)
+		if self.log.info: self.log.emit(RecordType.PAY, self.state.round, casterID, (program.spellID, *cstate.splitPips(program.cost, mastery)))
+		self.state.touch(casterID, "pips")
+		cstate.consumePips(program.cost, mastery, program.scost, True)
+		self.state.touch(casterID, "pips")
 
 		# TODO: Perform critical check
 
@@ -430,7 +606,7 @@ class Simulation:
 		# Something like minotaur will see a benefit in both hits from a single myth blade
 		# Yet, a hydra will only see a benefit to the storm hit with a storm blade, yet every hit with a balance blade
 		# NOTE: Current implementation is very very basic and mostly wrong but just for demonstration
-		outgoingMod = 1 + cstats.damage[spell.school][0]	# NOTE: This is technically wrong but close enough for now
+		outgoingMod = 1 + cstats.damage[program.school][0]	# NOTE: This is technically wrong but close enough for now
 		incomingMod = 1
 		# pierce = 0
 
@@ -441,31 +617,33 @@ class Simulation:
 			tstate = self.state.members[targetID]
 			tstats = self.stats[targetID]
 		else: return Status.ERROR
+		if profile is not None: lap = profile.lap(Phase.CAST, lap)
 
-		for action in spell.actions:
-			match action.type:
+		for step in program.steps:
+			match step.type:
 				case ActionType.CHARM:
-					tstate.charms.insert(0, spellID + "-" + action.data)
+					self.state.touch(targetID, "charms")
+					tstate.charms.insert(0, step.modifier)
+					self.state.touch(targetID, "charms")
+					if self.log.info: self.log.emit(RecordType.EFFECT, self.state.round, casterID, (targetID, "charms", modifierEntry(step.modifier), True))
+					if profile is not None: lap = profile.lap(Phase.EFFECT, lap)
 
 				case ActionType.WARD:
-					tstate.wards.insert(0, spellID + "-" + action.data)
+					self.state.touch(targetID, "wards")
+					tstate.wards.insert(0, step.modifier)
+					self.state.touch(targetID, "wards")
+					if self.log.info: self.log.emit(RecordType.EFFECT, self.state.round, casterID, (targetID, "wards", modifierEntry(step.modifier), True))
+					if profile is not None: lap = profile.lap(Phase.EFFECT, lap)
 
 				case ActionType.DAMAGE:
-					base = floor(choice(action.data["range"]))
-
-					# -- Actual damage to pull from current spell API --
-					# (1 + cstats.damage[action.data["school"]][0]))
-					# except KeyError:
-					# 	print(f"WARNING: Action data for '{spellID}' ({spell.spell}) is invalid!")
-					# 	return Status.ERROR
+					if step.cumWeights: base = self.rng.choices(step.values, cum_weights = step.cumWeights)[0]
+					else: base = self.rng.choice(step.values)
+					if profile is not None: lap = profile.lap(Phase.ACTION, lap)
 
 					# Calculate outoing damage
 					charmUsed = False
 					for charm in cstate.charms:
-						if isinstance(charm, list): raise NotImplementedError("Modifier types with multiple effects")
-						name = charm.split("-")
-						charmSID, charmID = name[0], name[1]
-						modifier = self.spells[charmSID].modifiers[charmID]
+						modifier = self.programs[charm[0]].modifiers[charm[1]]
 
 						if modifier.type == ModifierType.DAMAGE_MULT:
 							outgoingMod *= 1 + modifier.value
@@ -474,15 +652,17 @@ class Simulation:
 							charmUsed = True
 							break
 
-					if charmUsed: cstate.charms.pop()
+					if charmUsed:
+						self.state.touch(casterID, "charms")
+						charm = cstate.charms.pop()
+						self.state.touch(casterID, "charms")
+						if self.log.info: self.log.emit(RecordType.EFFECT, self.state.round, casterID, (casterID, "charms", modifierEntry(charm), False))
+					if profile is not None: lap = profile.lap(Phase.OUTGOING, lap)
 		
 					# Calculate incoming damage
 					wardUsed = False
 					for ward in tstate.wards:
-						if isinstance(ward, list): raise NotImplementedError("Modifier types with multiple effects")
-						name = ward.split("-")
-						wardSID, wardID = name[0], name[1]
-						modifier = self.spells[wardSID].modifiers[wardID]
+						modifier = self.programs[ward[0]].modifiers[ward[1]]
 
 						if modifier.type == ModifierType.DAMAGE_MULT:
 							incomingMod *= 1 - modifier.value
@@ -491,15 +671,23 @@ class Simulation:
 							wardUsed = True
 							break
 					
-					if wardUsed: tstate.wards.pop()
+					if wardUsed:
+						self.state.touch(targetID, "wards")
+						ward = tstate.wards.pop()
+						self.state.touch(targetID, "wards")
+						if self.log.info: self.log.emit(RecordType.EFFECT, self.state.round, casterID, (targetID, "wards", modifierEntry(ward), False))
 
 					# NOTE: Also wrong but alas
-					incomingMod *= 1 - tstats.resist[spell.school][0]
+					incomingMod *= 1 - tstats.resist[program.school][0]
 					damage = round(base * outgoingMod * incomingMod)
+					if profile is not None: lap = profile.lap(Phase.INCOMING, lap)
 
+					self.state.touch(targetID, "health")
 					tstate.health = max(0, tstate.health - (damage))
-					print(f"{damage} damage dealt to {tstats.name}")
-					print(f"DEBUG: {base} * {outgoingMod} * {incomingMod}")
+					self.state.touch(targetID, "health")
+					self.tally[casterID] = self.tally.get(casterID, 0) + damage
+					if self.log.info: self.log.emit(RecordType.DAMAGE, self.state.round, casterID, (targetID, damage, base, outgoingMod, incomingMod))
+					if profile is not None: lap = profile.lap(Phase.EFFECT, lap)
 		# ----------------------------
 
 		# TODO: Consume pips if dispel or success
@@ -507,18 +695,32 @@ class Simulation:
 		return Status.CONTINUE
 	
 	# Run the simulation (via advance() until completion)
-	def run(self):
+	# maxRounds -> Round after which the battle is called a stalemate
+	# stallRounds -> Consecutive rounds without any progress (see State.progressKey())
+	#                after which the battle is called a stalemate
+	# Either limit falls back to the simulation's own when None (MAX_ROUNDS / STALL_ROUNDS unless changed;
+	#   None there disables it)
+	# Returns the final datatypes.Status of the battle
+	def run(self, maxRounds = None, stallRounds = None):
+		if maxRounds is None: maxRounds = self.maxRounds
+		if stallRounds is None: stallRounds = self.stallRounds
+
+		progress = None
+		stalled = 0
 		while True:
 			result = self.advance()
-			match result:
-				case Status.CONTINUE: pass
-				case Status.ROUND_END: 
-					print(self.__repr__())
-					print()
-				case _:
-					print("-- SIMULATION END --\n")
-					# print(str(self.state))
-					return
+			if result == Status.ROUND_END:
+				if maxRounds is not None and self.state.round > maxRounds: return Status.STALEMATE
+				if stallRounds is None: continue
+
+				key = self.state.progressKey()
+				if key == progress:
+					stalled += 1
+					if stalled >= stallRounds: return Status.STALEMATE
+				else:
+					progress = key
+					stalled = 0
+			elif result != Status.CONTINUE: return result
 
 	# -- SIMULATION OPERATION --
 
@@ -527,38 +729,14 @@ class Simulation:
 	# Else the evaluation will be between -1 and 1
 	# NOTE: Simulation member function because future implimentations require a reference to member stats
 	def evalState(self):
-		friendlyHealth = 0
-		enemyHealth = 0
-
-		# These will be 4 in 99.9% of cases
-		# TODO: Hall of heros :)
-		numFriendly = 4
-		numEnemy = 4
+		# Side totals are maintained incrementally by the state (see State.totals())
+		totals = self.state.totals()
+		friendlyHealth = totals[FRIENDLY_HEALTH]
+		enemyHealth = totals[ENEMY_HEALTH]
 
 		# TODO: Add "potential damage" multiplier
+		# TODO: Hall of heros :)
 
-		index = 0
-
-		# Determine strength of friendlies
-		for x in range(numFriendly):
-			member = self.state.position[index]
-			index += 1
-			if member is None: continue
-			
-			health = self.state.members[member].health
-			assert health >= 0
-			friendlyHealth += health
-
-		# Determine strength of enemies
-		for x in range(numEnemy):
-			member = self.state.position[index]
-			index += 1
-			if member is None: continue
-			
-			health = self.state.members[member].health
-			assert health >= 0
-			enemyHealth += health
-		
 		# It is possible that both sides die in the same round
 		# The game considers this as an enemy victory
 		total = friendlyHealth + enemyHealth
@@ -571,38 +749,32 @@ class Simulation:
 	# Generates predetermined cheat interrupts
 	# Updates battle components such as primary pip gain
 	def updateRound(self):
+		profile = self.profile
+		if profile is not None: lap = perf_counter()
+
+		self.state.touch(None, "round")
 		self.state.round += 1
+		self.state.touch(None, "round")
 
 		# Kill dead members and generate primary events
-		eventsNew = []
-		posLen = len(self.state.position)
-		base = self.state.first
-		for x in range(posLen):
-			idx = (base + x) % posLen
-
-			memberID = self.state.position[idx]
-			if memberID is None: continue
-
+		removed, schedule, members = self.planRound()
+		self.state.touch(None, "position")
+		for idx in removed: self.state.position[idx] = None
+		self.state.touch(None, "position")
+		if profile is not None:
+			pipStart = perf_counter()
+			roundTime = pipStart - lap
+
+		for memberID in members:
 			mstate = self.state.members[memberID]
 			mstats = self.stats[memberID]
 
-			# Remove the NPC if 'defeated'
-			if mstate.health <= 0:
-				# Human players remain in the battle (but not minions)
-				if not mstats.player:
-					self.state.position[idx] = None
-				# TODO: else reset state
-				continue
-
 			# Update member status effects
 			for effect in mstate.status:
 				if effect > 0: effect -= 1
 			
 			# TODO: Update other timers, such as auras, shadow spells?? (maybe in events), and token duration (also maybe)
 
-			# Add the planning phase
-			eventsNew.append(Event(memberID))
-
 			# -- PIPS --
 			# TODO: Swap to mstate.generatePip() function
 
@@ -611,54 +783,220 @@ class Simulation:
 
 			# Generate pip based off of powerpip stat
 			# TODO: Determine method for bosses like hades who conditionally gain an extra with consideration for his pp chance
-			print(f"Generating pip for member {memberID} with chance {mstats.powerpip}", end = ": ")
-			if mstats.powerpip > random():
-				piparr.append(Pip.POWER)
-				print("POWER")
-			else:
-				piparr.append(Pip.BASIC)
-				print("BASIC")
+			if mstats.powerpip > self.rng.random(): piparr.append(Pip.POWER)
+			else: piparr.append(Pip.BASIC)
+			if self.log.debug: self.log.emit(RecordType.PIP, self.state.round, memberID, (piparr[-1], mstats.powerpip))
 
 			# TODO: Check for pip maximum
 
+			self.state.touch(memberID, "pips")
 			mstate.gainPips(piparr)
+			self.state.touch(memberID, "pips")
 
 			# TODO: Convert to powpip to ampip if conditions are met (else update progression)
 			# TODO: Generate shadow pip if conditions are met (else update progression)
 
 			# -- DECK --
 			if mstats.player:
+				self.state.touch(memberID, "hand")
 				mstate.hand = 7
+				self.state.touch(memberID, "hand")
 
-		# Update round-transient events
-		# This is the implementation that I hate, but in reality, it's akin to insertion sort
-		for event in self.state.events:
-			if event.delay > 0:
-				event.delay -= 1
-
-				if not event.local:
-					# Event happens at the start or end of round
-					if event.before: eventsNew.insert(0, event)
-					else: eventsNew.append(event)
-					continue
-
-				# Find the index in which to insert the event
-				insertIdx = -1
-				for idx, e in enumerate(eventsNew):
-					if not (e.type == EventType.PLAN or e.type == EventType.PASS or e.type == EventType.CAST): continue
-					if e.member == event.member:
-						# Adjust index if effect cast is before or after turn
-						# TODO: This will currently reverse the order of multiple "after casts"
-						insertIdx = idx + (0 if e.before else 1)
-						break
-				
-				# If this fails, then the member was not in the fight and the interrupt is invalidated
-				if insertIdx >= 0: eventsNew.insert(insertIdx, event)
+		if profile is not None: lap = profile.lap(Phase.PIPS, pipStart)
 
 		# TODO: Handle cheats (ex: belloq's start of round cheat)
 
-		self.state.events = eventsNew
-		self.state.eventidx = 0
+		self.state.touch(None, "events")
+		self.state.events = schedule
+		self.state.touch(None, "events")
+		if profile is not None: profile.add(Phase.ROUND, roundTime + perf_counter() - lap)
+
+	# Deterministic portion of the round update (shared by updateRound() and process())
+	# Does not modify the state: carried events are copied with their delay decremented
+	# Returns tuple of (positions of defeated NPCs, Schedule of the round, memberIDs that act this round)
+	def planRound(self):
+		removed = []
+		members = []
+		turns = {}			# Position index of every member with a turn this round
+		position = self.state.position.copy()
+		posLen = len(position)
+		schedule = Schedule(self.state.first, posLen)
+		base = self.state.first
+		for x in range(posLen):
+			idx = (base + x) % posLen
+
+			memberID = position[idx]
+			if memberID is None: continue
+
+			# Remove the NPC if 'defeated'
+			if self.state.members[memberID].health <= 0:
+				# Human players remain in the battle (but not minions)
+				if not self.stats[memberID].player:
+					removed.append(idx)
+					position[idx] = None
+				# TODO: else reset state
+				continue
+
+			# Add the planning phase
+			schedule.push(Event(memberID), TURN, idx)
+			members.append(memberID)
+			turns[memberID] = idx
+
+		# Update round-transient events (events still delayed wait in the schedule for a later round)
+		for event in self.state.events.delayed:
+			event = event.clone()
+			event.delay -= 1
+			priority = BEFORE_TURN if event.before else AFTER_TURN
+
+			# Event happens at the start or end of round
+			if not event.local: schedule.push(event, priority)
+
+			# Event happens around the member's turn
+			# If the member has no turn this round, the interrupt is invalidated
+			elif event.member in turns: schedule.push(event, priority, turns[event.member])
+
+		return removed, schedule, members
+
+	# Branches of a CAST event for process()
+	# deltas -> Deltas of the turn so far (shared by every outcome)
+	# deckLen -> Length of the caster's deck once the spell has left the hand
+	def _processCast(self, root, deltas, casterID, spell, target, deckLen):
+		cstate = self.state.members[casterID]
+		cstats = self.stats[casterID]
+
+		program = self.programs[spell]
+		targets = target if (target is None or isinstance(target, (list, tuple))) else [target]
+
+		# -- CAST --
+		# advance() succeeds when (rate + accuracy) > random() with random() in [0, 1)
+		chance = min(1, max(0, program.rate + cstats.accuracy[program.school]))
+
+		# Fizzle (players shuffle the spell back into any position of the deck)
+		if chance < 1:
+			fizzle = Node(list(deltas), Phase.CAST)
+			if cstats.player:
+				for i in range(deckLen + 1):
+					fizzle.newChild([Delta(DeltaType.ADD, casterID, "deck", (i, spell))], 1 / (deckLen + 1), Phase.CAST)
+			root.addChild(fizzle, 1 - chance)
+		if chance <= 0: return
+
+		# Success consumes the pip cost
+		success = Node(list(deltas), Phase.CAST)
+		split = cstate.splitPips(program.cost, cstats.mastery[program.school])
+		if split is not None:
+			basic, power = split
+			if basic > 0: success.deltas.append(Delta(DeltaType.PIP, casterID, "pips", (Pip.BASIC, -basic)))
+			if power > 0: success.deltas.append(Delta(DeltaType.PIP, casterID, "pips", (Pip.POWER, -power)))
+		root.addChild(success, chance)
+
+		targetID = None if targets is None else self.state.position[targets[0]]
+		if targetID is None:
+			success.status = Status.ERROR
+			return
+
+		# Working copies of everything the actions read, so later actions see the effects of earlier ones
+		tstate = self.state.members[targetID]
+		charms = {casterID: list(cstate.charms), targetID: list(tstate.charms)}
+		wards = {targetID: list(tstate.wards)}
+		outgoingMod = 1 + cstats.damage[program.school][0]
+		self._processActions(success, program, casterID, targetID, 0, tstate.health, outgoingMod, 1, charms, wards)
+
+	# Walks the spell actions from index start, branching on every damage roll
+	# Follows the (simplified) damage calculation of advance() exactly
+	def _processActions(self, node, program, casterID, targetID, start, health, outgoingMod, incomingMod, charms, wards):
+		tstats = self.stats[targetID]
+
+		for i in range(start, len(program.steps)):
+			step = program.steps[i]
+			match step.type:
+				case ActionType.CHARM:
+					node.deltas.append(Delta(DeltaType.ADD, targetID, "charms", (0, step.modifier)))
+					charms[targetID].insert(0, step.modifier)
+
+				case ActionType.WARD:
+					node.deltas.append(Delta(DeltaType.ADD, targetID, "wards", (0, step.modifier)))
+					wards[targetID].insert(0, step.modifier)
+
+				case ActionType.DAMAGE:
+					# Outgoing (the first damage charm applies, but advance() consumes the oldest)
+					ccharms = charms[casterID]
+					for charm in ccharms:
+						modifier = self.programs[charm[0]].modifiers[charm[1]]
+						if modifier.type == ModifierType.DAMAGE_MULT:
+							outgoingMod *= 1 + modifier.value
+							node.deltas.append(Delta(DeltaType.REMOVE, casterID, "charms", (len(ccharms) - 1, ccharms[-1])))
+							ccharms.pop()
+							break
+
+					# Incoming
+					twards = wards[targetID]
+					for ward in twards:
+						modifier = self.programs[ward[0]].modifiers[ward[1]]
+						if modifier.type == ModifierType.DAMAGE_MULT:
+							incomingMod *= 1 - modifier.value
+							node.deltas.append(Delta(DeltaType.REMOVE, targetID, "wards", (len(twards) - 1, twards[-1])))
+							twards.pop()
+							break
+
+					incomingMod *= 1 - tstats.resist[program.school][0]
+
+					# Distribution of damage dealt (different rolls may round to the same value)
+					outcomes = {}
+					for value, weight in zip(step.values, step.weights):
+						damage = round(value * outgoingMod * incomingMod)
+						outcomes[damage] = outcomes.get(damage, 0) + weight
+
+					for damage, weight in outcomes.items():
+						dealt = health - max(0, health - damage)
+						child = Node([Delta(DeltaType.ADD, targetID, "health", -dealt)], Phase.ACTION)
+						node.addChild(child, weight)
+
+						# Every roll continues the spell independently
+						self._processActions(child, program, casterID, targetID, i + 1, health - dealt, outgoingMod, incomingMod,
+							{k: list(v) for k, v in charms.items()}, {k: list(v) for k, v in wards.items()})
+					return
+
+	# Branches of the round update for process()
+	# One deterministic ROUND node followed by a chain of pip rolls (one level per member)
+	# Pip levels are independent, so every node of a level shares the same children
+	def _processRound(self, root):
+		# Victory is checked against the state before the update (as in advance())
+		evaluation = self.evalState()
+		status = Status.ROUND_END
+		if evaluation >= 1: status = Status.A_VICTORY
+		elif evaluation <= -1: status = Status.B_VICTORY
+
+		removed, schedule, members = self.planRound()
+		deltas = [Delta(DeltaType.ADD, None, "round", 1)]
+		for idx in removed: deltas.append(Delta(DeltaType.SET, None, "position", (idx, self.state.position[idx], None)))
+		deltas.append(Delta(DeltaType.SET, None, "events", (None, self.state.events, schedule)))
+		for memberID in members:
+			mstate = self.state.members[memberID]
+			if self.stats[memberID].player and mstate.hand != 7:
+				deltas.append(Delta(DeltaType.SET, memberID, "hand", (None, mstate.hand, 7)))
+
+		node = Node(deltas, Phase.ROUND, status)
+		root.addChild(node, 1.0)
+
+		# Build the pip levels bottom up
+		levels = []
+		for memberID in members:
+			# Member.gainPips() only grants a pip below the maximum of 7
+			if sum(self.state.members[memberID].pips) >= 7: continue
+			chance = min(1, max(0, self.stats[memberID].powerpip))
+			levels.append((memberID, chance))
+
+		children = None
+		for memberID, chance in reversed(levels):
+			level = []
+			for pip, weight in ((Pip.POWER, chance), (Pip.BASIC, 1 - chance)):
+				if weight <= 0: continue
+				child = Node([Delta(DeltaType.PIP, memberID, "pips", (pip, 1))], Phase.PIPS, status)
+				child.children = children
+				level.append((child, weight))
+			children = level
+
+		node.children = children
 
 	# -- SIMULATION UTLIITY --
 	# Functions here can be reused by things such as the selection agent
@@ -674,19 +1012,127 @@ class Simulation:
 
 		# TODO: Condition for making sure a player doesn't cast > idx 6
 		if spellIdx >= len(cstate.deck):
-			print(f"{cstats.name} attempted to selected a spell index out of range ({spellIdx})")
+			if self.log.debug: self.log.emit(RecordType.INVALID, self.state.round, casterID, (spellIdx, None))
 			return False
 
-		spellID = cstate.deck[spellIdx]
-		spell = self.spells[spellID]
-		spellCost = spell.cost
-		mastery = cstats.mastery[spell.school]
-		power = cstate.consumePips(spellCost, mastery)
-		if power < 0:
-			print(f"{cstats.name} does not have enough pips to cast {spell.spell}")
+		program = self.programs[cstate.deck[spellIdx]]
+		if cstate.splitPips(program.cost, cstats.mastery[program.school]) is None:
+			if self.log.debug: self.log.emit(RecordType.INVALID, self.state.round, casterID, (spellIdx, program.spellID))
 			return False
 		return True
 
+	# Every selection a member could make right now: PASS_MOVE first, then (hand index, target) pairs
+	# A card is listed if it is loaded and its cost can be paid with the member's pips and mastery
+	#   (Member.castableSlots(), which is kept until the pips change)
+	# Targets follow the spell's datatypes.Target: the caster's own position for SELF, each live
+	#   member of the aimed side for single targets, and a tuple of every live member of it for ALL_*
+	#   (advance() and process() still resolve only the first entry of a tuple, so such a move currently
+	#   hits a single member)
+	# Cached by the state until the member's hand or pips, a member's life, or the battle circle change
+	# Returns a tuple of moves (do not modify it)
+	def legalMoves(self, memberID):
+		moves = self.state.cachedMoves(memberID)
+		if moves is not None: return moves
+
+		state = self.state
+		cstate = state.members[memberID]
+		cstats = self.stats[memberID]
+		position = state.position
+		members = state.members
+		if memberID not in position: return (PASS_MOVE,)		# Out of the battle circle
+		mpos = position.index(memberID)
+
+		moves = [PASS_MOVE]
+		castable = cstate.castableSlots(self.programs, cstats.mastery, cstats.player)
+		hand = min(cstate.hand, len(cstate.deck)) if cstats.player else len(cstate.deck)
+		for spellIdx in range(hand):
+			if not (castable >> spellIdx) & 1: continue
+			program = self.programs[cstate.deck[spellIdx]]
+
+			if program.targets is None:
+				moves.append((spellIdx, mpos))
+				continue
+
+			live = tuple(t for t in program.aim(mpos) if position[t] is not None and members[position[t]].health > 0)
+			if program.area:
+				if live: moves.append((spellIdx, live))
+			else:
+				for target in live: moves.append((spellIdx, target))
+
+		moves = tuple(moves)
+		state.cacheMoves(memberID, moves)
+		return moves
+
+	# Exact distribution of the damage one cast would deal to its target (the state is not modified)
+	# Follows advance(): fizzle chance, damage rolls, the first damage charm of the caster and ward of
+	#   the target (consuming the oldest entries between hits), and the damage / resist stats
+	# spell -> spellID or spell number (catalog.SPELLS)
+	# target -> Position of the target (must be occupied)
+	# Returns read-only mapping of damage -> probability (a fizzle deals 0; damage is not capped by the
+	#   target's health), shared by every identical query
+	def castDistribution(self, casterID, spell, target):
+		if isinstance(spell, str): spell = SPELLS.index[spell]
+		targetID = self.state.position[target]
+		assert targetID is not None
+
+		cstate = self.state.members[casterID]
+		tstate = self.state.members[targetID]
+		key = (casterID, spell, targetID, tuple(cstate.charms), tuple(tstate.charms), tuple(tstate.wards))
+		dist = self.casts.get(key)
+		if dist is not None: return dist
+
+		cstats = self.stats[casterID]
+		tstats = self.stats[targetID]
+		program = self.programs[spell]
+		chance = min(1, max(0, program.rate + cstats.accuracy[program.school]))
+
+		# Charms and wards only change between hits (never with the roll), so each hit is an independent
+		#   distribution and the total is their convolution
+		charms = {casterID: list(cstate.charms), targetID: list(tstate.charms)}
+		wards = list(tstate.wards)
+		outgoingMod = 1 + cstats.damage[program.school][0]
+		incomingMod = 1
+		dist = {0: 1.0}
+		for step in program.steps:
+			match step.type:
+				case ActionType.CHARM: charms[targetID].insert(0, step.modifier)
+				case ActionType.WARD: wards.insert(0, step.modifier)
+				case ActionType.DAMAGE:
+					ccharms = charms[casterID]
+					for charm in ccharms:
+						modifier = self.programs[charm[0]].modifiers[charm[1]]
+						if modifier.type == ModifierType.DAMAGE_MULT:
+							outgoingMod *= 1 + modifier.value
+							ccharms.pop()
+							break
+
+					for ward in wards:
+						modifier = self.programs[ward[0]].modifiers[ward[1]]
+						if modifier.type == ModifierType.DAMAGE_MULT:
+							incomingMod *= 1 - modifier.value
+							wards.pop()
+							break
+
+					incomingMod *= 1 - tstats.resist[program.school][0]
+
+					hit = {}
+					for value, weight in zip(step.values, step.weights):
+						damage = round(value * outgoingMod * incomingMod)
+						hit[damage] = hit.get(damage, 0) + weight
+
+					combined = {}
+					for before, p in dist.items():
+						for damage, q in hit.items(): combined[before + damage] = combined.get(before + damage, 0) + p * q
+					dist = combined
+
+		# Scale by the cast chance and add the fizzle
+		dist = {damage: p * chance for damage, p in dist.items()}
+		if chance < 1: dist[0] = dist.get(0, 0) + (1 - chance)
+		dist = MappingProxyType(dict(sorted(dist.items())))
+
+		self.casts.put(key, dist)
+		return dist
+
 	# TODO: Ensure that the caster's selected targets can be applied to their selected spell
 	def validateTargets(self):
 		return True
@@ -706,17 +1152,20 @@ class Simulation:
 
 # Helper class for the DeltaTree
 # Implements core tree structure
+# Children are tuples of (node, chance); a node may be shared by several parents
 class Node:
 	# def __init__(self, parent, data):
-	def __init__(self, deltas, phase = -1):
+	# status -> The datatypes.Status advance() would return once this node is reached
+	def __init__(self, deltas, phase = -1, status = Status.CONTINUE):
 		# assert (parent is None) or isinstance(parent, Node)
 		# parent.addChild(self)
 		self.deltas = deltas
 		self.children = None
 		self.phase = phase
+		self.status = status
 
 	def __iter__(self):
-		if self.children is None: raise StopIteration
+		if self.children is None: return
 		for tup in self.children:
 			yield tup
 
@@ -732,19 +1181,83 @@ class Node:
 
 
 # Class that represents a change to a state
+# Deltas are applied in place and carry enough information to be reverted exactly,
+#   so walking a DeltaTree costs O(deltas) per step and never copies a State
 # type -> datatypes.DeltaType representing the modification to the attribute
+# member -> MemberID of the modified member state (None for the State itself)
 # attr -> Attribute to be modified
 # data -> The value relevant to the specified change
-# class Delta:
-# 	def __init__(self, type, attr, data): pass
+#    ADD: amount for numbers, (index, item) to insert for lists
+#    REMOVE: (index, item) removed from a list
+#    PIP: (pip, count) where count may be negative
+#    SET / RESET: (index or None, previous value, new value)
+#    MULT / MIN / MAX: (operand, previous value)
+class Delta:
+	__slots__ = ("type", "member", "attr", "data")
+
+	def __init__(self, type, member, attr, data):
+		self.type = type
+		self.member = member
+		self.attr = attr
+		self.data = data
+
+	def __repr__(self):
+		return f"Delta({DeltaType(self.type).name}, {self.member}, {self.attr}, {self.data})"
+
+	# Modify the state
+	def apply(self, state):
+		obj = state if self.member is None else state.members[self.member]
+		data = self.data
+		state.touch(self.member, self.attr)
+		match self.type:
+			case DeltaType.ADD:
+				if isinstance(data, tuple):
+					getattr(obj, self.attr).insert(data[0], data[1])
+					if self.attr in DECKS: obj.countCard(data[1], 1, self.attr == "side")
+				else: setattr(obj, self.attr, getattr(obj, self.attr) + data)
+			case DeltaType.REMOVE:
+				container = getattr(obj, self.attr)
+				assert container[data[0]] == data[1]
+				del container[data[0]]
+				if self.attr in DECKS: obj.countCard(data[1], -1, self.attr == "side")
+			case DeltaType.PIP: getattr(obj, self.attr)[data[0]] += data[1]
+			case DeltaType.SET | DeltaType.RESET:
+				if data[0] is None: setattr(obj, self.attr, data[2])
+				else: getattr(obj, self.attr)[data[0]] = data[2]
+			case DeltaType.MULT: setattr(obj, self.attr, data[1] * data[0])
+			case DeltaType.MIN: setattr(obj, self.attr, min(data[1], data[0]))
+			case DeltaType.MAX: setattr(obj, self.attr, max(data[1], data[0]))
+			case DeltaType.NONE: pass
+		state.touch(self.member, self.attr)
+
+	# Undo apply() (only valid if every later delta has already been reverted)
+	def revert(self, state):
+		obj = state if self.member is None else state.members[self.member]
+		data = self.data
+		state.touch(self.member, self.attr)
+		match self.type:
+			case DeltaType.ADD:
+				if isinstance(data, tuple):
+					del getattr(obj, self.attr)[data[0]]
+					if self.attr in DECKS: obj.countCard(data[1], -1, self.attr == "side")
+				else: setattr(obj, self.attr, getattr(obj, self.attr) - data)
+			case DeltaType.REMOVE:
+				getattr(obj, self.attr).insert(data[0], data[1])
+				if self.attr in DECKS: obj.countCard(data[1], 1, self.attr == "side")
+			case DeltaType.PIP: getattr(obj, self.attr)[data[0]] -= data[1]
+			case DeltaType.SET | DeltaType.RESET:
+				if data[0] is None: setattr(obj, self.attr, data[1])
+				else: getattr(obj, self.attr)[data[0]] = data[1]
+			case DeltaType.MULT | DeltaType.MIN | DeltaType.MAX: setattr(obj, self.attr, data[1])
+			case DeltaType.NONE: pass
+		state.touch(self.member, self.attr)
 
 # Class to represent a 'state delta tree'
 # This is the return type of a state progression evaluation
-# Contains a copy of the original state before the conversion
+# Holds a reference to the state it was generated from
 #   and a tree of delta lists, split for each stochastic element
-# Delta list is [(value, delta)]
-# ^^For static elements such as charms, use a value of -1 to indicate 
-#   that the charm has been removed (0 for no change; 1 for added)
+# apply() walks down the tree by modifying that state in place and revert() walks back up,
+#   so the state always matches the current root
 # This type should not be necessary to import in other files
 
 # NOTE: Deltas should generally be represented before calculation
@@ -752,14 +1265,39 @@ class Node:
 # For damage, the multiplier can be calculated but the change should be left 'raw' ??
 # Majority of the calculation in Simulation.process() should be chance distributions
 class DeltaTree:
-	def __init__(self, state):
+	# rng -> random.Random used when selecting children without a variate (a new unseeded one if None)
+	def __init__(self, state, rng = None):
 		assert isinstance(state, State)
-		self.state = state		# TODO needs deepcopy or helper function (leaning to copying upon apply())
+		self.state = state
+		self.rng = Random() if rng is None else rng
 		self.root = Node(None)
+		self._history = []		# Stack of nodes above the root (in order of application)
+
+	# Status of the simulation at the current root
+	@property
+	def status(self):
+		return self.root.status
+
+	# Number of nodes applied beneath the original root
+	@property
+	def depth(self):
+		return len(self._history)
+
+	# Enumerate every complete outcome below the root
+	# Yields tuples of (list of deltas along the path, probability, final datatypes.Status)
+	def outcomes(self):
+		stack = [(self.root, [], 1.0)]
+		while len(stack) > 0:
+			node, deltas, chance = stack.pop()
+			if node.deltas is not None: deltas = deltas + node.deltas
+			if node.children is None:
+				yield deltas, chance, node.status
+				continue
+			for child, weight in node.children:
+				stack.append((child, deltas, chance * weight))
 	
 	def select(self, gen = None):
-		if gen is None: 
-			gen = uniform(0, 1)		# TODO should be uniform random variate 0 <= x <= 1 ??
+		if gen is None: gen = self.rng.random()
 			
 		total = 0
 		for i, child in enumerate(self.root):
@@ -769,10 +1307,31 @@ class DeltaTree:
 		print(f"WARNING: Delta list weights add up to less than 1 (Phase: {self.root.phase})")
 		return 0
 
-	# TODO
 	# Selection is index of child to apply
 	# All delta list items are parsed and modified in the state
 	# self.root becomes the new child (after the effects have been applied)
-	#    (we only apply the effects of the child so root could be None but doesn't actually need to be updated)
 	def apply(self, selection):
-		raise NotImplementedError("DeltaTree.apply()")
\ No newline at end of file
+		node = self.root.children[selection][0]
+		for delta in node.deltas: delta.apply(self.state)
+
+		self._history.append(self.root)
+		self.root = node
+		return node
+
+	# Undo the most recent apply() (the parent node becomes the root again)
+	def revert(self):
+		for delta in reversed(self.root.deltas): delta.revert(self.state)
+		self.root = self._history.pop()
+		return self.root
+
+	# Apply randomly selected children until a leaf is reached
+	# rng -> random.Random used for the selections (the tree's own if None)
+	# Returns the status of the leaf
+	def sample(self, rng = None):
+		while self.root.children is not None:
+			self.apply(self.select(None if rng is None else rng.random()))
+		return self.root.status
+
+	# Revert every applied node
+	def rewind(self):
+		while len(self._history) > 0: self.revert()
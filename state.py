@@ -3,10 +3,15 @@
 # Supports JSON-encoded I/O
 # Members can be initalized from file
 
+from array import array
 from collections import deque
-from random import random
+from heapq import heappush, heappop
+from math import exp, lgamma
 
 from util import encodeJSON, loadJSON
+from zobrist import zkey
+from catalog import SPELLS, MODIFIERS, internSpell, internModifier, modifierEntry
+from pips import packPips, affordIndex, paySplit, splitTable
 from datatypes import Pip, StatusEffect, EventType
 
 # NOTE: For awhile I had been really committed to this idea of having defaults that wouldn't be stored
@@ -19,8 +24,44 @@ from datatypes import Pip, StatusEffect, EventType
 #		At this point, the benefit to what remains of this system is backwards compatibility, so that
 #		old state files can be loaded into a version of this sim with new battle components.
 
+# NOTE: State, Member, and Event are slotted (no per-instance __dict__) to keep the many copies
+#		made by search and batch play small. Fixed-size numeric fields (pips, status) are stored
+#		in typed arrays. Use clone() to copy; it copies only the mutable containers.
+
+# NOTE: Spells are stored as numbers from catalog.SPELLS (decks are typed arrays) and charms / wards
+#		as (spell, modifier) pairs. The constructors intern the string IDs of the file format and
+#		export() translates them back, so files and str() are unchanged.
+
+# Deck buffer of spell numbers from a list of spellIDs
+def spellArray(spellIDs):
+	return array("h", [internSpell(x) for x in spellIDs])
+
+
+# Natural log of n! (tabled for the deck sizes seen so far)
+_LOG_FACTORIAL = [0.0]
+def logFactorial(n):
+	while len(_LOG_FACTORIAL) <= n: _LOG_FACTORIAL.append(lgamma(len(_LOG_FACTORIAL) + 1))
+	return _LOG_FACTORIAL[n]
+
+
+# Indices of State.totals()
+FRIENDLY_HEALTH = 0
+ENEMY_HEALTH = 1
+FRIENDLY_ALIVE = 2
+ENEMY_ALIVE = 3
+
+# Event orders and priorities of Schedule (see Schedule)
+BEFORE_ROUND = -1
+AFTER_ROUND = 8
+BEFORE_TURN = -1
+TURN = 0
+AFTER_TURN = 1
+
+
 # -- CORE STATE OBJECT --
 class State:
+	__slots__ = ("round", "first", "events", "position", "bubble", "members", "_zhash", "_totals", "_slots", "_open", "_moves")
+
 	# Argument: 'data' can be...
 	#   None for new state (with defaults)
 	#   JSON-encoded string with partial (or full) data
@@ -39,15 +80,15 @@ class State:
 		self.round = data.get("round", 0)		# NOTE: Pips should be acquired at the start of the player turn, if applicable
 		self.first = data.get("first", 0)		# Should be either 0 or 4 (players or npcs first)
 
-		# TODO: Handle pet maycasts (from member stats)
-		self.eventidx = data.get("eventidx", 0)
-		self.events = []					# List of pending "cast events" for the round
-		for event in data.get("events", []):
-			self.events.append(Event(event))
-
 		# NOTE: Each member must have a unique member ID
 		self.position = data.get("position")	# Array of member IDs to define cast order
 		if self.position is None: self.position = [None for x in range(8)]
+
+		# TODO: Handle pet maycasts (from member stats)
+		# Older files kept the events already taken in the list (skipped via "eventidx")
+		self.events = Schedule(self.first, len(self.position))		# Pending "cast events" (see Schedule)
+		for event in data.get("events", [])[data.get("eventidx", 0):]:
+			self.events.restore(Event(data = event), self.position)
 		# self.interrupts = data.get("interrupts", [])	# List of 
 		
 		# Init state objects
@@ -55,22 +96,197 @@ class State:
 		self.members = {}		# Dict of (member_id, member_data) : Allows >8 member states for battles that require it
 		for memberid, memberdata in data.get("members", {}).items():
 			self.members[memberid] = Member(memberdata)
+
+		# Zobrist hash of the state (None until requested via hash(), then kept up to date by touch())
+		self._zhash = None
+
+		# Side aggregates (None until requested via totals(), then kept up to date by touch())
+		self._totals = None
+		self._slots = None		# Position index of each member in the battle circle
+		self._open = False		# Whether a health touch() is waiting for its closing call
+
+		# Legal selections by member (see Simulation.legalMoves()), dropped by touch() when they could change
+		self._moves = {}
 	
 	def __str__(self):
 		return encodeJSON(self)
 
+	# Copy of the state that shares no mutable data with this one
+	def clone(self):
+		ret = State.__new__(State)
+		ret.round = self.round
+		ret.first = self.first
+		ret.events = self.events.clone()
+		ret.position = self.position.copy()
+		ret.bubble = self.bubble
+		ret.members = {memberID: member.clone() for memberID, member in self.members.items()}
+		ret._zhash = self._zhash
+		ret._totals = None if self._totals is None else self._totals.copy()
+		ret._slots = self._slots		# Replaced (never modified) when the position changes
+		ret._open = False
+		ret._moves = self._moves.copy()		# Entries are immutable tuples
+		return ret
+
+	# -- HASHING --
+	# The hash covers the round, positions, pending events, and every member attribute
+	# Once hash() has been called, anything that modifies the state must call touch() with the same
+	#   arguments immediately before and after the modification (XORing the old features out and the new in)
+	# If the member dict itself changes, touch(None, "members") instead
+
+	# Returns the 64-bit hash of the state (enables incremental tracking on first use)
+	def hash(self):
+		if self._zhash is None: return self.rehash()
+		return self._zhash
+
+
+	# Compute the hash from scratch
+	def rehash(self):
+		zhash = 0
+		for attr in ("round", "first", "events", "position", "bubble"):
+			zhash ^= self._component(None, attr)
+		for memberID in self.members:
+			for attr in MEMBER_FIELDS:
+				zhash ^= self._component(memberID, attr)
+
+		self._zhash = zhash
+		return zhash
+
+	# Toggle the contribution of one attribute (member = None for State attributes)
+	# Touching the member dict drops the hash (it is recomputed by the next hash() call)
+	def touch(self, member, attr):
+		if (attr == "pips" or attr == "deck" or attr == "hand") and member is not None: self.members[member]._castable = None
+
+		if self._moves:
+			if member is None:
+				if attr == "position" or attr == "members": self._moves.clear()
+			elif attr == "pips" or attr == "deck" or attr == "hand": self._moves.pop(member, None)
+			# A health at zero on either side of the change means a member may have died (or been revived)
+			elif attr == "health" and self.members[member].health <= 0: self._moves.clear()
+
+		if self._totals is not None:
+			if attr == "health": self._countHealth(member)
+			elif attr == "position" or attr == "members": self._totals = None
+
+		if self._zhash is None: return
+		if attr == "members": self._zhash = None
+		else: self._zhash ^= self._component(member, attr)
+
+	# Hash contribution of one attribute
+	def _component(self, member, attr):
+		if member is None:
+			# Pending events are hashed by their place in the schedule (not its heap layout)
+			if attr == "events":
+				zhash = 0
+				for i, e in enumerate(self.events):
+					target = tuple(e.target) if isinstance(e.target, list) else e.target
+					spell = None if e.spell is None else SPELLS.ids[e.spell]
+					zhash ^= zkey("event", i, e.type, e.delay, e.member, spell, target, e.local, e.before, e.order, e.priority)
+				return zhash
+			value = getattr(self, attr)
+		else: value = getattr(self.members[member], attr)
+
+		# Interned numbers depend on the process, so spells and modifiers are keyed by their string IDs
+		if attr == "deck" or attr == "side":
+			zhash = 0
+			if value is not None:
+				for i, item in enumerate(value): zhash ^= zkey(member, attr, i, SPELLS.ids[item])
+			return zhash
+		if attr == "charms" or attr == "wards":
+			zhash = 0
+			for i, item in enumerate(value): zhash ^= zkey(member, attr, i, SPELLS.ids[item[0]], MODIFIERS[item[0]].ids[item[1]])
+			return zhash
+
+		if isinstance(value, (list, deque, array)):
+			zhash = 0
+			for i, item in enumerate(value):
+				if isinstance(item, list): item = tuple(item)
+				zhash ^= zkey(member, attr, i, item)
+			return zhash
+		return zkey(member, attr, value)
+
+	# -- PROGRESS --
+	# Cheap fingerprint of what changes when a battle makes progress: the position and each member's
+	#   health, pips, and charm / ward / deck / hand sizes (not the round counter)
+	# Equal between rounds when the battle has made no progress
+	# Built from scratch, so (unlike hash()) it leaves no tracking behind for touch() to maintain
+	def progressKey(self):
+		members = self.members
+		key = [tuple(self.position)]
+		for memberID in self.position:
+			if memberID is None: continue
+			m = members[memberID]
+			key.append((m.health, None if m.pips is None else bytes(m.pips), len(m.charms), len(m.wards), 0 if m.deck is None else len(m.deck), m.hand))
+		return tuple(key)
+
+	# -- SIDE AGGREGATES --
+	# Health totals and alive counts of each side of the battle circle, maintained through touch()
+	#   like the hash (so anything that changes a health or the position must already be touching)
+	# Indexed by FRIENDLY_HEALTH, ENEMY_HEALTH, FRIENDLY_ALIVE, ENEMY_ALIVE
+
+	# Returns the aggregate list (do not modify it)
+	def totals(self):
+		if self._totals is None: return self.retotal()
+		return self._totals
+
+	# Compute the aggregates from scratch
+	def retotal(self):
+		totals = [0, 0, 0, 0]
+		slots = {}
+		for idx, memberID in enumerate(self.position):
+			if memberID is None: continue
+			slots[memberID] = idx
+			health = self.members[memberID].health
+			side = 0 if idx < 4 else 1
+			totals[side] += health
+			totals[side + 2] += health > 0
+
+		self._totals = totals
+		self._slots = slots
+		self._open = False
+		return totals
+
+	# The first touch() of a pair removes the member's contribution and the second adds the new one
+	def _countHealth(self, member):
+		idx = self._slots.get(member)
+		if idx is None: return
+
+		health = self.members[member].health
+		side = 0 if idx < 4 else 1
+		sign = 1 if self._open else -1
+		self._open = not self._open
+		self._totals[side] += sign * health
+		self._totals[side + 2] += sign * (health > 0)
+
+	# -- LEGAL MOVES --
+	# Cache for Simulation.legalMoves(), kept valid through touch()
+
+	# Returns the cached selections of a member (None if they need to be generated)
+	def cachedMoves(self, memberID):
+		return self._moves.get(memberID)
+
+	def cacheMoves(self, memberID, moves):
+		self._moves[memberID] = moves
+
+	# -- EVENTS --
 	# Gets the next event from the state (updates relevant fields)
 	# Returns None if end of round
 	def getEvent(self):
-		# Always points to the "upcoming event"
-		# AKA we insert interrupt events at this index and do not change the index
-		if self.eventidx == len(self.events): return None
-		event = self.events[self.eventidx]
-		self.eventidx += 1
+		self.touch(None, "events")
+		event = self.events.pop(self.position)
+		self.touch(None, "events")
+		return event
+
+	# The event getEvent() would return (the state is not modified)
+	def nextEvent(self):
+		return self.events.front(self.position)[1]
 
-		# Skip events meant for following rounds
-		if event.delay == 0: return event
-		return self.getEvent()
+	# Schedule an event during the round (interrupts, before / after cast effects, or delayed events)
+	# priority -> BEFORE_TURN, TURN, or AFTER_TURN
+	# idx -> Position index of the member whose turn the event belongs to (None for a round event)
+	def pushEvent(self, event, priority = TURN, idx = None):
+		self.touch(None, "events")
+		self.events.push(event, priority, idx)
+		self.touch(None, "events")
 
 
 # -- CORE MEMBER OBJECT --
@@ -81,6 +297,9 @@ class Member:
 	#    Everything else we can init to 'zero'
 	# TODO: Missing shadow spell components including transformations, dark nova, and backlash
 	# TODO: Track spells such that a TC cannot be discarded the same round it is drawn
+	__slots__ = ("health", "pips", "shads", "shadprog", "status", "aura", "charms", "wards", "tokens",
+		"deck", "side", "hand", "amschool", "amprog", "threat", "ressurection", "_counts", "_castable")
+
 	def __init__(self, data = None):
 		if data is None: data = {}
 		assert isinstance(data, dict)
@@ -97,18 +316,20 @@ class Member:
 		# 	self.gainPips(pipsarr)
 		# else: self.pips = None
 
-		self.pips = data.get("pips", None)
+		# Pip counts indexed by datatypes.Pip (None until populated from the member stats)
+		pips = data.get("pips", None)
+		self.pips = None if pips is None else array("b", pips)
 
 		self.shads = data.get("shads", 0)
 		self.shadprog = data.get("shadprog", 0)		# Current progress towards the next shadow pip (float 0 <= prog < 1)
 
 		# Status is addressed by datatypes.StatusEffect
-		self.status = data.get("status", [0, 0, 0])
+		self.status = array("b", data.get("status", [0, 0, 0]))
 
-		# Reference to Modifier types within spell_id
+		# Reference to Modifier types within spell_id (stored as (spell, modifier) pairs)
 		self.aura = data.get("aura")
-		self.charms = deque(data.get("charms", []))
-		self.wards = deque(data.get("wards", []))
+		self.charms = deque(internModifier(x) for x in data.get("charms", []))
+		self.wards = deque(internModifier(x) for x in data.get("wards", []))
 		
 		self.tokens = deque()
 		tokens = data.get("tokens")
@@ -116,10 +337,12 @@ class Member:
 		if isinstance(tokens, list):							# TODO: Determine what stats should be tracked (such as pierce??)
 			for t in tokens: self.tokens.append((t[0], t[1]))	# Tokens are tuple of (Rounds remaining, damage)
 
-		# Deck is array of spell_ids, in the shuffled order
+		# Deck is array of spell numbers (catalog.SPELLS), in the shuffled order
 		# The first seven cards are the client's hand, the latter are available to draw
-		self.deck = data.get("deck")		# If None, parse from member stats during initState()
-		self.side = data.get("side")		# If None, parse from member stats during initState()
+		deck = data.get("deck")				# If None, parse from member stats during initState()
+		self.deck = None if deck is None else spellArray(deck)
+		side = data.get("side")				# If None, parse from member stats during initState()
+		self.side = None if side is None else spellArray(side)
 		self.hand = data.get("hand", 7)		# Scalar to specify the number of cards in the player's hand (all deck manipulations happen via this class)
 
 		# Archmastery components
@@ -138,8 +361,48 @@ class Member:
 		# Should the target be ressurected (base spell is 20%, so this would be 0.2)
 		self.ressurection = data.get("ressurection", 0)
 
+		# Spell counts of the deck and side deck (dicts of spell number -> count; None until first requested)
+		# Kept up to date through countCard() by everything that adds or removes a card
+		self._counts = None
+
+		# Bitmask of the hand slots whose cost the pips can pay (None until requested via castableSlots())
+		# Dropped by State.touch() whenever the pips, deck, or hand change
+		self._castable = None
+
 	def __str__(self):
 		return encodeJSON(self)
+
+	# Attributes for serialization (with string IDs)
+	def export(self):
+		ret = {name: getattr(self, name) for name in MEMBER_FIELDS}
+		ret["charms"] = [modifierEntry(x) for x in self.charms]
+		ret["wards"] = [modifierEntry(x) for x in self.wards]
+		ret["deck"] = None if self.deck is None else [SPELLS.ids[x] for x in self.deck]
+		ret["side"] = None if self.side is None else [SPELLS.ids[x] for x in self.side]
+		return ret
+
+	# Copy of the member state that shares no mutable data with this one
+	def clone(self):
+		ret = Member.__new__(Member)
+		ret.health = self.health
+		ret.pips = None if self.pips is None else self.pips[:]
+		ret.shads = self.shads
+		ret.shadprog = self.shadprog
+		ret.status = self.status[:]
+		ret.aura = self.aura
+		ret.charms = deque(self.charms)
+		ret.wards = deque(self.wards)
+		ret.tokens = deque(self.tokens)		# Token tuples are immutable
+		ret.deck = None if self.deck is None else self.deck[:]
+		ret.side = None if self.side is None else self.side[:]
+		ret.hand = self.hand
+		ret.amschool = self.amschool
+		ret.amprog = self.amprog
+		ret.threat = self.threat
+		ret.ressurection = self.ressurection
+		ret._counts = None if self._counts is None else (self._counts[0].copy(), self._counts[1].copy())
+		ret._castable = self._castable
+		return ret
 	
 	# Give the member new pips from a list
 	# Assume input list specifies precedence
@@ -189,22 +452,11 @@ class Member:
 	# Will consume pips up to a spell cost (even if spell cost exceeds possessed pips)
 	# Returns scalar value of pips consumed (basically only relevant for X-cost spells)
 	def consumePips(self, cost, mastery = True, scost = 0, apply = False):
-		# TODO: Anything with archmastery pips or X casting cost
-		# TODO: Shadow pip consumption
-
-		total = cost[0]
-		power = 0
-		if mastery: power = min(self.pips[1], int(total / 2))
-		basic = total - (2 * power)
-
-		# Start by consuming basic pips, using powers as overflow
-		if basic > self.pips[0]:
-			power += basic - self.pips[0]
-			basic = self.pips[0]
-
-		if power > self.pips[1]:
+		split = self.splitPips(cost, mastery)
+		if split is None:
 			return -1
-		
+
+		basic, power = split
 		if apply:
 			self.pips[0] -= basic
 			self.pips[1] -= power
@@ -212,6 +464,40 @@ class Member:
 		return basic + (power * (2 if mastery else 1))
 
 
+	# Determines how a spell cost would be paid without consuming anything
+	# Returns tuple of (basic pips, power pips) or None if the member cannot afford the cost
+	# Looked up in the precomputed split tables (see pips.py)
+	def splitPips(self, cost, mastery = True):
+		index = affordIndex(self.pips[0], self.pips[1])
+		if index is None: return paySplit(self.pips[0], self.pips[1], cost[0], mastery)
+		return splitTable(cost[0], mastery)[index]
+
+	# The pips as one integer (see pips.packPips())
+	def packedPips(self):
+		return packPips(self.pips)
+
+	# Bitmask of the hand slots (bit i for deck index i) that the current pips can pay for
+	# Computed once and reused until State.touch() reports a change to the pips, deck, or hand
+	# programs -> Simulation.programs (compiled spells by spell number)
+	# mastery -> Stats.mastery of the member
+	# player -> Whether only the hand can be cast from (NPCs can cast from their whole deck)
+	def castableSlots(self, programs, mastery, player = True):
+		if self._castable is not None: return self._castable
+
+		deck = self.deck
+		hand = min(self.hand, len(deck)) if player else len(deck)
+		index = affordIndex(self.pips[0], self.pips[1])
+		castable = 0
+		for i in range(hand):
+			program = programs[deck[i]]
+			if program is None: continue
+			if index is None: split = paySplit(self.pips[0], self.pips[1], program.cost[0], mastery[program.school])
+			else: split = program.splits[1 if mastery[program.school] else 0][index]
+			if split is not None: castable |= 1 << i
+
+		self._castable = castable
+		return castable
+
 	# Counting sort for player pips (makes consumption logic trivial)
 	def sortPips(self, length = 7):
 		assert len(self.pips) == length
@@ -230,22 +516,11 @@ class Member:
 	
 	# Utility function for "counting" pips
 	# Returns casting potential (with mastery, without mastery)
+	# Basic pips are worth one either way; every other pip is worth two with mastery
 	def countPips(self):
-		mastery = 0
-		nonmastery = 0
-
-		for p in self.pips:
-			match p:
-				case 9: break 
-				case 0: 
-					mastery += 1
-					nonmastery += 1
-				case other: 
-					# total += (2 if mastery else 1)
-					mastery += 2
-					nonmastery += 1
-
-		return (mastery, nonmastery)
+		pips = self.pips
+		total = sum(pips) - pips[Pip.NONE]
+		return (2 * total - pips[Pip.BASIC], total)
 
 	# Returns index of spell in hand matching a certain id (array if multiple or None if nothing)
 	# enchants -> Whether to include enchanted versions (-1 no enchants, 0 both, 1 only enchants)
@@ -276,33 +551,70 @@ class Member:
 	def enchantSpell(self, idxBase, idxEnch, spellData):
 		pass
 
-	# Get the distribution of spells still in the deck
+	# -- DECK COMPOSITION --
+	# Get the distribution of spells still in the deck (hand included)
 	# Use this to predict what is more or less likely to be drawn (probably for AI agent)
 	# side -> Whether to use main deck or TCs
+	# Returns dict of spell number -> count (maintained incrementally; do not modify it)
 	def calcSpellDist(self, side = False):
-		dist = {}
-
-		deck = self.side if side else self.deck
-		for spell in deck:
-			count = dist.get(spell, 0)
-			dist[spell] = count + 1
-
-		# TODO: Consider alteration of the return type as necessary
-		return dist
+		if self._counts is None:
+			self._counts = ({}, {})
+			for counts, deck in zip(self._counts, (self.deck, self.side)):
+				for spell in deck or ():
+					counts[spell] = counts.get(spell, 0) + 1
+		return self._counts[1 if side else 0]
+
+	# Record a card added to (change = 1) or removed from (change = -1) the deck or side deck
+	# Must follow every such modification (casts, fizzle reinserts, discards, and deltas)
+	def countCard(self, spell, change, side = False):
+		if self._counts is None: return
+		counts = self._counts[1 if side else 0]
+		count = counts.get(spell, 0) + change
+		if count: counts[spell] = count
+		else: del counts[spell]
+
+	# Probability of holding spell within the next draws cards (cards are drawn in an unknown order)
+	# A spell already in hand is held with certainty; otherwise the draws follow the hypergeometric
+	#   distribution over the rest of the deck
+	# side -> Draws from the side deck (treasure cards) instead, which has no hand
+	def drawChance(self, spell, draws, side = False):
+		if side:
+			deck = self.side
+			hand = 0
+		else:
+			deck = self.deck
+			hand = min(self.hand, len(deck))
+			for i in range(hand):
+				if deck[i] == spell: return 1.0
+
+		# P(none drawn) = C(rest - copies, draws) / C(rest, draws)
+		rest = len(deck) - hand
+		copies = self.calcSpellDist(side).get(spell, 0)
+		draws = min(draws, rest)
+		if copies == 0 or draws <= 0: return 0.0
+		if draws > rest - copies: return 1.0
+		return 1.0 - exp(logFactorial(rest - copies) - logFactorial(rest - copies - draws) + logFactorial(rest - draws) - logFactorial(rest))
+
+
+# Serialized / hashed member attributes (underscored slots are runtime caches)
+MEMBER_FIELDS = tuple(name for name in Member.__slots__ if name[0] != "_")
 
 
 # -- CAST EVENT OBJECT --
 # TODO: Adjust for new structure
 class Event:
+	__slots__ = ("type", "delay", "member", "spell", "target", "local", "before", "order", "priority")
+
 	# Structure to manage cast events
 	# Contents of data override other params
 	def __init__(self, member = None, data = None):
 		if data is None: data = {}
 
-		self.type = data.get("type", EventType.PLAN)
+		self.type = EventType(data.get("type", EventType.PLAN))
 		self.delay = data.get("delay", 0)
 		self.member = data.get("member", member)
-		self.spell = data.get("spell", None)
+		spell = data.get("spell", None)
+		self.spell = None if spell is None else internSpell(spell)		# Spell number (catalog.SPELLS)
 		self.target = data.get("target", None)
 
 		# How the event should be ordered if carried across rounds
@@ -310,10 +622,10 @@ class Event:
 		# Extra event order possibilities: Start/end of round, start/end of turn, or interrupt
 		self.local = data.get("local", True)		# Event happens before / after cast (alternatively the entire round)
 		self.before = data.get("before", True)		# Event happens before local / global
-		# self.order  <--  Primary ordering scalar
-		# self.priority  <--  Secondary ordering scalar
+		self.order = data.get("order")				# Primary ordering scalar (set by the Schedule; None until scheduled)
+		self.priority = data.get("priority")		# Secondary ordering scalar
 
-		# NOTE: Event ordering refactor (for some point in the future)
+		# NOTE: Event ordering (implemented by Schedule)
 
 		# I should be able to construct the event queue and then sort the events
 		# So, each event needs some sort of value upon which to sort...
@@ -335,4 +647,138 @@ class Event:
 		# 2, then we verify state.position[2] == self.member) else we throw out the event
 	
 	def __str__(self):
-		return encodeJSON(self)
\ No newline at end of file
+		return encodeJSON(self)
+
+	# Events compare by value (so deltas can be checked against a clone of the state)
+	def __eq__(self, other):
+		if not isinstance(other, Event): return NotImplemented
+		return all(getattr(self, name) == getattr(other, name) for name in Event.__slots__)
+
+	# Attributes for serialization (with string IDs)
+	def export(self):
+		ret = {name: getattr(self, name) for name in Event.__slots__}
+		if self.spell is not None: ret["spell"] = SPELLS.ids[self.spell]
+		return ret
+
+	def clone(self):
+		ret = Event.__new__(Event)
+		ret.type = self.type
+		ret.delay = self.delay
+		ret.member = self.member
+		ret.spell = self.spell
+		ret.target = self.target.copy() if isinstance(self.target, list) else self.target
+		ret.local = self.local
+		ret.before = self.before
+		ret.order = self.order
+		ret.priority = self.priority
+		return ret
+
+
+# -- ROUND SCHEDULER --
+# The live event queue of a state (State.events), ordered by the key (order, priority):
+#   order -> Turn of the member in the round (0 for state.first, counting around the circle),
+#            BEFORE_ROUND for events ahead of every member, or AFTER_ROUND for events after all of them
+#   priority -> BEFORE_TURN, TURN (the PLAN / CAST / PASS event), or AFTER_TURN
+# Events with equal keys keep the order in which they were scheduled
+# Events are validated when they are popped: a member event is dropped if its member no longer
+#   holds the position it was scheduled for
+# Events with a delay wait outside the round (Simulation.planRound() carries them to the next one)
+class Schedule:
+	__slots__ = ("first", "size", "delayed", "_heap", "_count")
+
+	# first -> Position that takes the first turn of the round
+	# size -> Number of positions in the battle circle
+	def __init__(self, first = 0, size = 8):
+		self.first = first
+		self.size = size
+		self.delayed = []		# Events for later rounds (delay > 0) in the order they were scheduled
+		self._heap = []			# Heap of (order, priority, sequence, event) for the events of the round
+		self._count = 0
+
+	# Events left in the round
+	def __len__(self):
+		return len(self._heap)
+
+	# Every pending event in the order it will be taken (the round, then the delayed events)
+	def __iter__(self):
+		for entry in sorted(self._heap): yield entry[3]
+		yield from self.delayed
+
+	# Schedule an event around the turn of the member at position index idx (None for a round event)
+	def push(self, event, priority = TURN, idx = None):
+		if idx is None: event.order = BEFORE_ROUND if priority <= BEFORE_TURN else AFTER_ROUND
+		else: event.order = (idx - self.first) % self.size
+		event.priority = priority
+		self._add(event)
+
+	# Schedule an event that already has a key (loaded from a file or carried over)
+	# Events saved without one are keyed from the position of their member
+	def restore(self, event, position):
+		if event.order is not None: return self._add(event)
+
+		priority = TURN
+		if event.type not in (EventType.PLAN, EventType.PASS, EventType.CAST): priority = BEFORE_TURN if event.before else AFTER_TURN
+		idx = position.index(event.member) if event.local and event.member in position else None
+		self.push(event, priority, idx)
+
+	def _add(self, event):
+		if event.delay > 0:
+			self.delayed.append(event)
+			return
+		heappush(self._heap, (event.order, event.priority, self._count, event))
+		self._count += 1
+
+	# Whether the event still belongs to the battle circle
+	def _holds(self, event, position):
+		order = event.order
+		return order < 0 or order >= self.size or position[(self.first + order) % self.size] == event.member
+
+	# Returns the next event of the round (None once empty)
+	# position -> Battle circle the event is validated against
+	def pop(self, position):
+		heap = self._heap
+		while heap:
+			event = heappop(heap)[3]
+			if self._holds(event, position): return event
+		return None
+
+	# What pop() would do (without modifying the schedule)
+	# Returns tuple of (list of events it would drop, event it would return or None)
+	def front(self, position):
+		if not self._heap: return [], None
+		if self._holds(self._heap[0][3], position): return [], self._heap[0][3]
+
+		dropped = []
+		for entry in sorted(self._heap):
+			if self._holds(entry[3], position): return dropped, entry[3]
+			dropped.append(entry[3])
+		return dropped, None
+
+	# List-style access to the front of the round, for deltas (see Simulation.process())
+	# Only index 0 is supported: REMOVE (0, event) pops the front and its revert puts the event back
+	def __getitem__(self, idx):
+		assert idx == 0
+		return self._heap[0][3]
+
+	def __delitem__(self, idx):
+		assert idx == 0
+		heappop(self._heap)
+
+	# The event's key must not sort after the current front (it goes ahead of any equal key)
+	def insert(self, idx, event):
+		assert idx == 0
+		sequence = self._heap[0][2] - 1 if self._heap else self._count
+		heappush(self._heap, (event.order, event.priority, sequence, event.clone()))
+
+	# Pending events for serialization
+	def export(self):
+		return list(self)
+
+	def clone(self):
+		ret = Schedule.__new__(Schedule)
+		ret.first = self.first
+		ret.size = self.size
+		ret.delayed = [event.clone() for event in self.delayed]
+		ret._heap = [(order, priority, sequence, event.clone()) for order, priority, sequence, event in self._heap]
+		ret._count = self._count
+		return ret
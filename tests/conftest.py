@@ -0,0 +1,10 @@
+# conftest.py
+# The tests run against the data files of the repository (states/, members/, spells/, and agents/),
+#   which are resolved relative to the repository root
+
+from os import chdir, path as ospath
+import sys
+
+ROOT = ospath.dirname(ospath.dirname(ospath.abspath(__file__)))
+sys.path.insert(0, ROOT)
+chdir(ROOT)
@@ -0,0 +1,17 @@
+# test_asyncagent.py
+# A failing policy must fail the battles waiting on it instead of leaving them waiting forever
+
+import asyncio
+
+import pytest
+
+from asyncagent import BatchPolicy, DecisionBatcher, playAsync
+
+class FailingPolicy(BatchPolicy):
+	def selectBatch(self, observations): raise RuntimeError("policy failed")
+
+def test_policy_error_reaches_battles():
+	batcher = DecisionBatcher(FailingPolicy())
+	with pytest.raises(RuntimeError, match = "policy failed"):
+		asyncio.run(asyncio.wait_for(playAsync("states/debugstate.dat", batcher, 8, concurrency = 4), 10))
+	assert not batcher._tasks
@@ -0,0 +1,49 @@
+# test_castdistribution.py
+# Simulation.castDistribution() must agree with the search tree and stay intact across cached queries
+
+import pytest
+
+from catalog import SPELLS, internModifier
+from datatypes import LogLevel
+from simulation import Simulation
+
+PATH = "states/debugstate.dat"
+CASTER = "player.debugboi"
+TARGET = "player.debuggirl"
+
+# Caster with the pips for thundersnake, two damage charms, and a ward on the target
+def _simulation():
+	sim = Simulation(PATH, randseed = 1, verbosity = LogLevel.NONE)
+	sim.advance()		# Round update (pips)
+	state = sim.state
+	changed = ((CASTER, "pips"), (CASTER, "charms"), (TARGET, "wards"))
+	for memberID, attr in changed: state.touch(memberID, attr)
+	state.members[CASTER].pips[1] = 3
+	state.members[CASTER].charms.extend([internModifier("storm.stormblade-charm0")] * 2)
+	state.members[TARGET].wards.append(internModifier("ice.towershield-ward0"))
+	for memberID, attr in changed: state.touch(memberID, attr)
+	return sim
+
+# The damage distribution of one cast is the damage marginal of the tree that process() builds for it
+def test_matches_process():
+	sim = _simulation()
+	spell = SPELLS.index["storm.thundersnake"]
+	expected = sim.castDistribution(CASTER, spell, 4)
+
+	marginal = {}
+	for deltas, p, _ in sim.process((list(sim.state.members[CASTER].deck).index(spell), 4)).outcomes():
+		damage = -sum(delta.data for delta in deltas if delta.attr == "health")
+		marginal[damage] = marginal.get(damage, 0) + p
+
+	assert len(expected) > 2
+	assert sorted(marginal) == sorted(expected)
+	for damage, p in expected.items(): assert marginal[damage] == pytest.approx(p)
+
+# Cached results are shared, so callers cannot modify them
+def test_cached_result_is_read_only():
+	sim = _simulation()
+	dist = sim.castDistribution(CASTER, "storm.thundersnake", 4)
+	with pytest.raises(AttributeError): dist.clear()
+	with pytest.raises(TypeError): dist[0] = 1.0
+	assert sim.castDistribution(CASTER, "storm.thundersnake", 4) == dist
+	assert sum(dist.values()) == pytest.approx(1)
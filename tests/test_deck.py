@@ -0,0 +1,62 @@
+# test_deck.py
+# Deck counts kept through Member.countCard() must equal a recount of the deck, and draw chances
+#   must agree with plain combinatorics
+
+from array import array
+from collections import Counter
+from math import comb
+from random import Random
+
+import pytest
+
+from datatypes import EventType, LogLevel, Status
+from simulation import Simulation
+
+PATH = "states/debugstate.dat"
+
+def _simulation(seed = 1):
+	sim = Simulation(PATH, randseed = seed, verbosity = LogLevel.NONE)
+	for stats in sim.stats.values(): stats.player = True
+	return sim
+
+# Tree of the upcoming turn, planned with a random legal move
+def _turn(sim, rng):
+	event = sim.state.nextEvent()
+	if event is None or event.type != EventType.PLAN: return sim.process()
+	moves = sim.legalMoves(event.member)
+	return sim.process(moves[rng.randrange(len(moves))])
+
+def _checkCounts(state):
+	for memberID in state.position:
+		if memberID is None: continue
+		member = state.members[memberID]
+		assert member.calcSpellDist() == dict(Counter(member.deck))
+
+# Deck counts follow casts and fizzle reinserts in advance() and in the deltas of the search tree
+def test_deck_counts_match_recount():
+	for seed in range(4):
+		sim = _simulation(seed)
+		rng = Random(seed)
+		_checkCounts(sim.state)
+		while sim.state.round < 40:
+			tree = _turn(sim, rng)
+			tree.sample(rng)
+			_checkCounts(sim.state)
+			tree.rewind()
+			_checkCounts(sim.state)
+
+			if sim.advance() not in (Status.CONTINUE, Status.ROUND_END): break
+			_checkCounts(sim.state)
+
+def test_draw_chance_is_hypergeometric():
+	member = _simulation().state.members["player.debugboi"]
+	member.deck = array("h", [1, 2, 3, 4, 5, 6, 7] + [9] * 3 + [8] * 20)
+	member.hand = 7
+	member._counts = None
+
+	rest, copies = 23, 3
+	for draws in (0, 1, 5, 20, 23, 30):
+		k = min(draws, rest)
+		assert member.drawChance(9, draws) == pytest.approx(1 - comb(rest - copies, k) / comb(rest, k))
+	assert member.drawChance(3, 0) == 1.0		# In hand
+	assert member.drawChance(42, 5) == 0.0		# Not in the deck
@@ -0,0 +1,46 @@
+# test_hashing.py
+# The incrementally maintained Zobrist hash must always equal a recomputation from scratch
+
+from random import Random
+
+import pytest
+
+from datatypes import EventType, LogLevel, Status
+from simulation import Simulation
+
+PATH = "states/debugstate.dat"
+
+def _simulation(players, seed = 1):
+	sim = Simulation(PATH, randseed = seed, verbosity = LogLevel.NONE)
+	for stats in sim.stats.values(): stats.player = players
+	return sim
+
+# Tree of the upcoming turn, planned with a random legal move
+def _turn(sim, rng):
+	event = sim.state.nextEvent()
+	if event is None or event.type != EventType.PLAN: return sim.process()
+	moves = sim.legalMoves(event.member)
+	return sim.process(moves[rng.randrange(len(moves))])
+
+# The hash survives applying and reverting every kind of delta (players also touch their decks)
+@pytest.mark.parametrize("players", (False, True))
+def test_hash_after_apply_revert(players):
+	sim = _simulation(players)
+	state = sim.state
+	rng = Random(0)
+	for turn in range(300):
+		before = str(state)
+		hashed = state.hash()
+		assert hashed == state.rehash()
+
+		tree = _turn(sim, rng)
+		assert abs(sum(p for _, p, _ in tree.outcomes()) - 1) < 1e-9
+		for _ in range(3):
+			tree.sample(rng)
+			assert state.hash() == state.rehash()
+			tree.rewind()
+			assert str(state) == before
+			assert state.hash() == hashed
+
+		if tree.sample(rng) not in (Status.CONTINUE, Status.ROUND_END): break
+	assert turn > 10
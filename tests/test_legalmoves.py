@@ -0,0 +1,24 @@
+# test_legalmoves.py
+# Every move from Simulation.legalMoves() must be playable by both advance() and process()
+
+from datatypes import EventType, LogLevel, Status
+from simulation import Simulation
+
+PATH = "states/debugstate.dat"
+
+def _deltaKeys(tree):
+	return sorted((round(p, 12), [(d.type, d.member, d.attr, repr(d.data)) for d in deltas]) for deltas, p, _ in tree.outcomes())
+
+# Area moves carry a tuple of targets, which must plan the same as the bare position
+def test_tuple_targets():
+	sim = Simulation(PATH, randseed = 0, verbosity = LogLevel.NONE)
+	checked = 0
+	while checked < 10:
+		event = sim.state.nextEvent()
+		if event is not None and event.type == EventType.PLAN:
+			for move in sim.legalMoves(event.member)[1:]:
+				spellIdx, target = move
+				if isinstance(target, tuple): continue
+				assert _deltaKeys(sim.process((spellIdx, (target,)))) == _deltaKeys(sim.process(move))
+				checked += 1
+		assert sim.advance() in (Status.CONTINUE, Status.ROUND_END)
@@ -0,0 +1,40 @@
+# test_process.py
+# Simulation.process() must leave the simulation as it found it (state and random generator), and
+#   sampling its tree must be reproducible from the simulation's seed
+
+import pytest
+
+from datatypes import EventType, LogLevel, Status
+from simulation import Simulation
+
+PATH = "states/debugstate.dat"
+
+# Simulation at the first PLAN event
+def _planning(seed):
+	sim = Simulation(PATH, randseed = seed, verbosity = LogLevel.NONE)
+	while True:
+		event = sim.state.nextEvent()
+		if event is not None and event.type == EventType.PLAN: return sim, event
+		assert sim.advance() in (Status.CONTINUE, Status.ROUND_END)
+
+def test_plan_needs_selection():
+	sim, event = _planning(0)
+	with pytest.raises(ValueError): sim.process()
+
+# process() followed by advance() plays the same as advance() alone
+def test_random_generator_untouched():
+	sim, event = _planning(0)
+	rngState = sim.rng.getstate()
+	before = str(sim.state)
+	sim.process(sim.legalMoves(event.member)[-1])
+	assert sim.rng.getstate() == rngState
+	assert str(sim.state) == before
+
+def test_sample_follows_seed():
+	leaves = []
+	for x in range(2):
+		sim, event = _planning(3)
+		tree = sim.process(sim.legalMoves(event.member)[-1])
+		tree.sample()
+		leaves.append(str(sim.state))
+	assert leaves[0] == leaves[1]
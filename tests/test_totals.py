@@ -0,0 +1,40 @@
+# test_totals.py
+# The side totals kept through State.touch() must equal a recount, through advance() and through the
+#   deltas of the search tree
+
+from random import Random
+
+import pytest
+
+from datatypes import EventType, LogLevel, Status
+from simulation import Simulation
+
+PATH = "states/debugstate.dat"
+
+# Tree of the upcoming turn, planned with a random legal move
+def _turn(sim, rng):
+	event = sim.state.nextEvent()
+	if event is None or event.type != EventType.PLAN: return sim.process()
+	moves = sim.legalMoves(event.member)
+	return sim.process(moves[rng.randrange(len(moves))])
+
+@pytest.mark.parametrize("seed", range(3))
+def test_totals_match_recount(seed):
+	sim = Simulation(PATH, randseed = seed, verbosity = LogLevel.NONE)
+	state = sim.state
+	rng = Random(seed)
+	state.totals()
+	while True:
+		totals = list(state.totals())
+		assert totals == state.retotal()
+
+		tree = _turn(sim, rng)
+		for _ in range(3):
+			tree.sample(rng)
+			assert list(state.totals()) == state.retotal()
+			tree.rewind()
+			assert list(state.totals()) == totals
+
+		if sim.advance() not in (Status.CONTINUE, Status.ROUND_END): break
+	assert list(state.totals()) == state.retotal()
+	assert state.round > 1
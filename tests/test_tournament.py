@@ -0,0 +1,43 @@
+# test_tournament.py
+# Sanity checks for the tournament harness: every pairing is played from both sides, so agents
+#   must target relative to their own side for the results to mean anything
+
+import tournament
+from tournament import TournamentResult, runTournament
+
+PATH = "states/debugstate.dat"
+
+# An agent that casts must beat one that always passes
+def test_agent_beats_pass():
+	result = runTournament([PATH], 20, agents = ["Debug_Basic", "Debug_Pass"], workers = 2)
+	assert result.battles == 40
+
+	score, low, high = result.score("Debug_Basic", "Debug_Pass")
+	assert low > 0.5
+	assert result.elo()["Debug_Basic"] > result.elo()["Debug_Pass"]
+
+# ... whichever side it plays (the first agent of a match takes the friendly side)
+def test_agent_beats_pass_as_enemy():
+	tournament._initWorker()
+	for agent in ("Debug_Basic", "Debug_Basic2"):
+		result = tournament._runMatch((PATH, "Debug_Pass", agent, 0, 20, 0, 100, 20, tournament.SEARCH_BUDGET))
+		wins, losses, draws = result.games[(agent, "Debug_Pass")]
+		assert wins == 20
+
+# Search agents are held to the tournament's time budget instead of their own iteration count
+def test_search_budget():
+	tournament._initWorker()
+	result = tournament._runMatch((PATH, "MCTS", "Debug_Pass", 0, 1, 0, 100, 20, 0.005))
+	assert result.latency["MCTS"][1] > 0
+	assert result.meanLatency("MCTS") < 0.1
+
+# Errors are reported apart from the scores
+def test_errors_are_not_draws():
+	result = TournamentResult()
+	result.record("a", "b", 0)
+	result.recordError("a")
+	merged = TournamentResult().merge(result).merge(result)
+	assert merged.battles == 4
+	assert merged.errors == {"a": 2}
+	assert merged.games[("a", "b")] == [0, 0, 2]
+	assert "Errors" in str(merged)
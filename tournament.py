@@ -0,0 +1,248 @@
+# tournament.py
+# Round-robin agent tournament
+# Every pair of agents in agents/ plays a set of scenario files (each agent taking each side in turn)
+#   across a process pool; results are merged into win matrices, Elo ratings, decision latency,
+#   and battle throughput
+# Agents must pick targets relative to their own side (see Agent.slot() and Agent.opponents())
+# Search agents (those with iterations / budget settings, such as MCTS) are held to a time budget per
+#   decision so they play at a comparable cost; battles that end in an error are counted apart from
+#   the scores and charged to the agent whose selection failed
+
+from inspect import isabstract
+from json import dumps, loads
+from math import log10, sqrt
+from multiprocessing import Pool, cpu_count
+from os import listdir, path as ospath
+from time import perf_counter
+
+from simulation import Simulation
+from datatypes import Status, LogLevel
+from util import loadJSON
+
+Z = 1.96			# 95% confidence intervals
+ELO_BASE = 1500
+SEARCH_BUDGET = 0.01	# Seconds per decision of search agents
+
+# -- AGENT DISCOVERY --
+# Names of the agent modules that can be instantiated (abstract or broken modules are skipped)
+def listAgents(directory = "agents"):
+	ret = []
+	for filename in sorted(listdir(directory)):
+		name, ext = ospath.splitext(filename)
+		if ext != ".py" or name.startswith("_"): continue
+
+		try: module = __import__(f"agents.{name}", fromlist = [None])
+		except Exception: continue
+		agentClass = getattr(module, "Agent", None)
+		if agentClass is None or isabstract(agentClass): continue
+		ret.append(name)
+
+	return ret
+
+
+# -- RESULTS --
+# Merged results of a tournament (or part of one)
+# All fields are plain dicts so results can be pickled back from the workers
+class TournamentResult:
+	def __init__(self):
+		self.battles = 0
+		self.games = {}			# Results of each pairing (key: (agent, opponent);  value: [wins, losses, draws])
+		self.errors = {}		# Battles that ended in Status.ERROR (key: agent that made the failing selection;  value: count)
+		self.latency = {}		# Decision timing (key: agent;  value: [total seconds, decisions])
+		self.simSeconds = 0		# Time spent playing battles (summed across workers)
+		self.elapsed = 0		# Wall-clock time of the whole tournament
+
+	def agents(self):
+		return sorted({a for pair in self.games for a in pair} | set(self.latency) | set(self.errors))
+
+	# Record a single battle from the perspective of agent (who beat, lost to, or drew with opponent)
+	def record(self, agent, opponent, score):
+		self.battles += 1
+		for a, b, s in ((agent, opponent, score), (opponent, agent, -score)):
+			games = self.games.setdefault((a, b), [0, 0, 0])
+			games[0 if s > 0 else (1 if s < 0 else 2)] += 1
+
+	# Record a battle that ended in an error (it does not count towards the scores)
+	def recordError(self, agent):
+		self.battles += 1
+		self.errors[agent] = self.errors.get(agent, 0) + 1
+
+	def merge(self, other):
+		self.battles += other.battles
+		for pair, (wins, losses, draws) in other.games.items():
+			games = self.games.setdefault(pair, [0, 0, 0])
+			games[0] += wins
+			games[1] += losses
+			games[2] += draws
+		for agent, count in other.errors.items():
+			self.errors[agent] = self.errors.get(agent, 0) + count
+		for agent, (seconds, decisions) in other.latency.items():
+			latency = self.latency.setdefault(agent, [0, 0])
+			latency[0] += seconds
+			latency[1] += decisions
+		self.simSeconds += other.simSeconds
+		return self
+
+	# Score of agent against opponent (draws count half) with its Wilson confidence interval
+	# Returns tuple of (score, low, high) or None if they never met
+	def score(self, agent, opponent):
+		wins, losses, draws = self.games.get((agent, opponent), (0, 0, 0))
+		n = wins + losses + draws
+		if n == 0: return None
+
+		p = (wins + draws / 2) / n
+		center = (p + Z * Z / (2 * n)) / (1 + Z * Z / n)
+		spread = Z * sqrt(p * (1 - p) / n + Z * Z / (4 * n * n)) / (1 + Z * Z / n)
+		return p, max(0, center - spread), min(1, center + spread)
+
+	# Mean seconds per select() call
+	def meanLatency(self, agent):
+		seconds, decisions = self.latency.get(agent, (0, 0))
+		return seconds / decisions if decisions > 0 else 0
+
+	# Elo ratings from a Bradley-Terry fit of every result (draws count half a win for each side)
+	# Each pairing gets one virtual draw so unbeaten agents still have a finite rating
+	# Returns dict of agent -> rating (mean ELO_BASE)
+	def elo(self, iterations = 200):
+		agents = self.agents()
+		strength = {a: 1.0 for a in agents}
+		for x in range(iterations):
+			updated = {}
+			for a in agents:
+				won, expected = 0, 0
+				for b in agents:
+					if a == b: continue
+					wins, losses, draws = self.games.get((a, b), (0, 0, 0))
+					if wins + losses + draws == 0: continue
+					won += wins + (draws + 1) / 2
+					expected += (wins + losses + draws + 1) / (strength[a] + strength[b])
+				updated[a] = won / expected if expected > 0 else strength[a]
+			strength = updated
+
+		ratings = {a: 400 * log10(s) for a, s in strength.items()}
+		shift = ELO_BASE - sum(ratings.values()) / max(1, len(ratings))
+		return {a: r + shift for a, r in ratings.items()}
+
+	def __str__(self):
+		agents = self.agents()
+		width = max([len(a) for a in agents] + [8])
+
+		ret = f"Battles: {self.battles} in {self.elapsed:.1f}s ({self.battles / self.elapsed if self.elapsed > 0 else 0:.1f} battles/s, "
+		ret += f"{self.battles / self.simSeconds if self.simSeconds > 0 else 0:.1f} battles/s per worker)"
+
+		# Score of the row agent against the column agent
+		ret += "\n\nScore (row vs column, 95% CI)\n" + " " * width
+		for b in agents: ret += f"  {b:>{max(len(b), 17)}}"
+		for a in agents:
+			ret += f"\n{a:<{width}}"
+			for b in agents:
+				score = self.score(a, b)
+				cell = "-" if score is None else f"{score[0]:.3f} [{score[1]:.2f},{score[2]:.2f}]"
+				ret += f"  {cell:>{max(len(b), 17)}}"
+
+		ret += "\n\nAgent" + " " * (width - 5) + "       Elo   Latency (ms)   Decisions   Errors"
+		ratings = self.elo()
+		for a in sorted(agents, key = lambda a: -ratings[a]):
+			ret += f"\n{a:<{width}}  {ratings[a]:8.1f}  {self.meanLatency(a) * 1000:13.3f}  {self.latency.get(a, (0, 0))[1]:10}  {self.errors.get(a, 0):7}"
+
+		return ret
+
+
+# -- WORKER PROCESS --
+# Each worker keeps one simulation (stats and spells are loaded once) and the parsed scenarios
+_sim = None
+_scenarios = {}
+
+def _initWorker():
+	global _sim
+	_sim = Simulation(verbosity = LogLevel.NONE)
+
+# Wrap an agent's select() to accumulate its decision time into clock ([seconds, decisions])
+# last -> One item list set to name on every decision (the agent a failing cast is charged to)
+def _timeAgent(agent, clock, name, last):
+	select = agent.select
+	def timed():
+		start = perf_counter()
+		ret = select()
+		clock[0] += perf_counter() - start
+		clock[1] += 1
+		last[0] = name
+		return ret
+	agent.select = timed
+
+# Play battles [start, start + count) of one pairing on one scenario
+# The first agent controls the friendly side (positions 0-3) and the second the enemy side
+def _runMatch(args):
+	path, friendly, enemy, start, count, randseed, maxRounds, stallRounds, searchBudget = args
+	result = TournamentResult()
+	clocks = {friendly: [0, 0], enemy: [0, 0]}
+	last = [None]
+
+	stateStr = _scenarios.get(path)
+	if stateStr is None:
+		stateStr = dumps(loadJSON(path)["state"])
+		_scenarios[path] = stateStr
+
+	begin = perf_counter()
+	for i in range(start, start + count):
+		_sim.rng.seed(randseed + i)
+		_sim.loadState(loads(stateStr))
+		for idx, memberID in enumerate(_sim.state.position):
+			if memberID is None: continue
+			name = friendly if idx < 4 else enemy
+			agent = _sim.loadAgent(memberID, name)
+			if hasattr(agent, "budget"):
+				agent.iterations = None
+				agent.budget = searchBudget
+			_timeAgent(agent, clocks[name], name, last)
+
+		status = _sim.run(maxRounds, stallRounds)
+		match status:
+			case Status.A_VICTORY: score = 1
+			case Status.B_VICTORY: score = -1
+			case Status.ERROR:
+				result.recordError(last[0])
+				continue
+			case other: score = 0
+		result.record(friendly, enemy, score)
+
+	result.simSeconds = perf_counter() - begin
+	for name, clock in clocks.items():
+		latency = result.latency.setdefault(name, [0, 0])
+		latency[0] += clock[0]
+		latency[1] += clock[1]
+	return result
+
+
+# -- TOURNAMENT API --
+# Play every pair of agents against each other on every scenario
+# scenarios -> List of state file paths (the agents in the files are ignored)
+# battles -> Battles per pairing, scenario, and side
+# agents -> Agent module names (defaults to everything in agents/)
+# workers -> Size of the process pool (defaults to the number of cores)
+# maxRounds -> Round after which a battle is called a stalemate (a draw)
+# stallRounds -> Rounds without any change to the state after which a battle is called a stalemate
+# searchBudget -> Seconds per decision of search agents (replaces their own iteration or time limits)
+# Returns a TournamentResult
+def runTournament(scenarios, battles, agents = None, workers = None, randseed = 0, maxRounds = 100, stallRounds = 20, chunksize = None, searchBudget = SEARCH_BUDGET):
+	if agents is None: agents = listAgents()
+	if workers is None: workers = cpu_count()
+	if chunksize is None: chunksize = max(1, battles // 4)
+
+	# Both sides of every pairing use the same seeds so the sides are compared on equal battles
+	tasks = []
+	for i, a in enumerate(agents):
+		for b in agents[i + 1:]:
+			for path in scenarios:
+				for friendly, enemy in ((a, b), (b, a)):
+					for start in range(0, battles, chunksize):
+						tasks.append((path, friendly, enemy, start, min(chunksize, battles - start), randseed, maxRounds, stallRounds, searchBudget))
+
+	result = TournamentResult()
+	begin = perf_counter()
+	with Pool(workers, initializer = _initWorker) as pool:
+		for partial in pool.imap_unordered(_runMatch, tasks):
+			result.merge(partial)
+	result.elapsed = perf_counter() - begin
+
+	return result
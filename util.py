@@ -1,19 +1,24 @@
 # Utility functions for handling data I/O and API logic
 
+from array import array
 from collections import deque
 from enum import IntEnum
 
 from json import load, loads
 from json.decoder import JSONDecodeError as JSONError
 
-from random import seed, randrange
+from random import Random
+import random
 
 # -- RANDOMNESS --
 # Shuffle a array in O(n) complexity (in place)
-def shuffle(arr, randseed = None):
-	if isinstance(randseed, int): seed(randseed)
+# rng -> random.Random instance to draw from, or an int to shuffle with a fresh generator of that seed
+#        (None falls back to the global generator)
+def shuffle(arr, rng = None):
+	if isinstance(rng, int): rng = Random(rng)
+	if rng is None: rng = random
 	for i, data in enumerate(arr):
-		swp = randrange(i, len(arr))
+		swp = rng.randrange(i, len(arr))
 		arr[i] = arr[swp]
 		arr[swp] = data
 
@@ -25,6 +30,7 @@ def encodeJSON(obj, omitNone = False):
 		# We need to pull the value out of the enum (matches to int() by default)
 		case IntEnum(): return str(obj.value)
 		case deque(): return encodeJSON(list(obj))
+		case array(): return encodeJSON(obj.tolist())
 
 		# Primitives
 		case bool(): return str(obj).lower()
@@ -56,10 +62,18 @@ def encodeJSON(obj, omitNone = False):
 			return "{" + out[2:] + "}"
 
 	# Otherwise we're a fancy class
+	# Classes with an export() method choose their own serialized attributes
+	export = getattr(obj, "export", None)
+	if export is not None: return encodeJSON(export())
+
 	ret = None
 	try: ret = obj.__dict__
-	except AttributeError: 
-		print(f"Error occurred whilst coverting object of type {type(obj)} to JSON str")
+	except AttributeError:
+		# Slotted classes (such as the state types) have no __dict__
+		slots = getattr(type(obj), "__slots__", None)
+		# Underscored slots are runtime caches and are not serialized
+		if slots is not None: ret = {name: getattr(obj, name) for name in slots if name[0] != "_"}
+		else: print(f"Error occurred whilst coverting object of type {type(obj)} to JSON str")
 	return encodeJSON(ret)
 
 
@@ -0,0 +1,396 @@
+# vectorized.py
+# Lockstep battle engine for population-scale runs
+# Simulates many independent copies of one starting state at once, with every member attribute
+#   stored as a struct-of-arrays NumPy buffer (battle is always the first axis)
+# Mechanics follow Simulation.advance() / updateRound() exactly; only the random streams differ,
+#   so results agree with the scalar engine in distribution (see benchmarks/vectorized.py)
+# Agents are replaced by array policies (see WeightedPolicy)
+
+import numpy as np
+
+from batch import BatchResult
+from datatypes import ActionType, ModifierType, Pip, Status, StatusEffect
+from state import FRIENDLY_HEALTH, ENEMY_HEALTH
+
+SLOTS = 8			# Positions of the battle circle
+PIPS = len(Pip.__members__)
+
+# -- POLICIES --
+# A policy is called once per member turn with the engine, the acting slot, and the indices of the
+#   battles in which that member is acting; it returns (spellIdx, target) arrays for those battles
+#   with spellIdx = -1 for a pass
+
+# Picks a hand index with fixed probabilities (the remainder is a pass) and a fixed target per index
+# Matches the selection logic of agents/Debug_Basic.py and agents/Debug_Basic2.py
+class WeightedPolicy:
+	def __init__(self, weights, targets):
+		assert len(weights) == len(targets)
+		self.cumulative = np.cumsum(weights)
+		self.targets = np.asarray(targets, dtype = np.int8)
+
+	def __call__(self, engine, slot, rows):
+		roll = engine.rng.random(len(rows))
+		spellIdx = np.searchsorted(self.cumulative, roll, side = "right").astype(np.int16)
+		passed = spellIdx >= len(self.cumulative)
+		target = self.targets[np.minimum(spellIdx, len(self.targets) - 1)]
+		spellIdx[passed] = -1
+		return spellIdx, target
+
+
+# -- EVALUATION --
+
+# Simulation.evalState() for many states at once (such as the leaves of a search)
+# Uses the side totals each state maintains (State.totals()), so the cost is one row per state
+# Returns a float array of evaluations
+def evalStates(states):
+	totals = np.array([state.totals() for state in states], dtype = np.float64).reshape(-1, 4)
+	return _evaluate(totals[:, FRIENDLY_HEALTH], totals[:, ENEMY_HEALTH])
+
+# Both sides at zero is an enemy victory (-1)
+def _evaluate(friendly, enemy):
+	total = friendly + enemy
+	return np.where(total > 0, (friendly - enemy) / np.maximum(total, 1), -1.0)
+
+
+# -- ENGINE --
+class VectorSimulation:
+	# sim -> Loaded Simulation whose state is the starting point of every battle
+	# battles -> Number of independent battles
+	# charmSlots -> Capacity of each charm and ward stack
+	def __init__(self, sim, battles, randseed = None, charmSlots = 16):
+		self.rng = np.random.default_rng(randseed)
+		self.battles = battles
+		state = sim.state
+		B = battles
+
+		self.first = state.first
+		self.members = list(state.position)		# MemberID per slot (None if empty)
+		self.policies = [None for x in range(SLOTS)]
+
+		# -- CATALOG --
+		# Spells and modifiers are renumbered densely in order of appearance
+		# (state decks hold catalog.SPELLS numbers and charms / wards hold (spell, modifier) pairs)
+		programs = []
+		for memberID in self.members:
+			if memberID is None: continue
+			for spell in state.members[memberID].deck or []:
+				program = sim.programs[spell]
+				if program is not None and program not in programs: programs.append(program)
+		self.spellIDs = [program.spellID for program in programs]
+		spellIndex = {program.number: i for i, program in enumerate(programs)}
+
+		modifiers = []
+		for memberID in self.members:
+			if memberID is None: continue
+			mstate = state.members[memberID]
+			for modifier in list(mstate.charms) + list(mstate.wards):
+				if modifier not in modifiers: modifiers.append(modifier)
+		for program in programs:
+			for step in program.steps:
+				if step.modifier is not None and step.modifier not in modifiers: modifiers.append(step.modifier)
+		modifierIndex = {modifier: i for i, modifier in enumerate(modifiers)}
+
+		self.modType = np.zeros(len(modifiers) + 1, dtype = np.int8) - 1		# Index -1 (empty stack entry) has no type
+		self.modValue = np.zeros(len(modifiers) + 1)
+		for i, (spell, modID) in enumerate(modifiers):
+			mod = sim.programs[spell].modifiers[modID]
+			self.modType[i] = mod.type
+			self.modValue[i] = mod.value
+
+		S = len(programs)
+		A = max([len(x.steps) for x in programs] + [1])
+		R = max([len(step.values) for x in programs for step in x.steps if step.type == ActionType.DAMAGE] + [1])
+		self.spellRate = np.zeros(S)
+		self.spellSchool = np.zeros(S, dtype = np.int8)
+		self.spellCost = np.zeros(S, dtype = np.int8)
+		self.actionType = np.zeros((S, A), dtype = np.int8) - 1
+		self.actionModifier = np.zeros((S, A), dtype = np.int16) - 1
+		self.damageRange = np.zeros((S, A, R))
+		self.damageCumulative = np.ones((S, A, R))
+		for s, program in enumerate(programs):
+			self.spellRate[s] = program.rate
+			self.spellSchool[s] = program.school
+			self.spellCost[s] = program.cost[0]
+			for a, step in enumerate(program.steps):
+				self.actionType[s, a] = step.type
+				match step.type:
+					case ActionType.CHARM | ActionType.WARD: self.actionModifier[s, a] = modifierIndex[step.modifier]
+					case ActionType.DAMAGE:
+						n = len(step.values)
+						self.damageRange[s, a, :n] = step.values
+						self.damageCumulative[s, a, :n] = np.cumsum(step.weights)
+					case other: raise NotImplementedError(f"Vectorized action type {ActionType(step.type).name}")
+
+		# -- MEMBER STATS (per slot) --
+		self.player = np.zeros(SLOTS, dtype = bool)
+		self.powerpip = np.zeros(SLOTS)
+		self.maxHealth = np.zeros(SLOTS, dtype = np.int32)
+		self.accuracy = np.zeros((SLOTS, S))			# Stats are gathered per spell school up front
+		self.damageMult = np.zeros((SLOTS, S))
+		self.resist = np.zeros((SLOTS, S))
+		self.mastery = np.zeros((SLOTS, S), dtype = bool)
+		for p, memberID in enumerate(self.members):
+			if memberID is None: continue
+			stats = sim.stats[memberID]
+			self.player[p] = stats.player
+			self.powerpip[p] = stats.powerpip
+			self.maxHealth[p] = stats.health
+			for s in range(S):
+				school = self.spellSchool[s]
+				self.accuracy[p, s] = stats.accuracy[school]
+				self.damageMult[p, s] = stats.damage[school][0]
+				self.resist[p, s] = stats.resist[school][0]
+				self.mastery[p, s] = stats.mastery[school]
+
+		# -- BATTLE STATE (struct of arrays) --
+		D = max([len(state.members[m].deck) for m in self.members if m is not None] + [1])
+		self.present = np.zeros((B, SLOTS), dtype = bool)
+		self.health = np.zeros((B, SLOTS), dtype = np.int32)
+		self.pips = np.zeros((B, SLOTS, PIPS), dtype = np.int8)
+		self.status = np.zeros((B, SLOTS, len(StatusEffect.__members__)), dtype = np.int8)
+		self.charms = np.zeros((B, SLOTS, charmSlots), dtype = np.int16) - 1		# Newest first (same order as the deques)
+		self.charmCount = np.zeros((B, SLOTS), dtype = np.int8)
+		self.wards = np.zeros((B, SLOTS, charmSlots), dtype = np.int16) - 1
+		self.wardCount = np.zeros((B, SLOTS), dtype = np.int8)
+		self.deck = np.zeros((B, SLOTS, D + 1), dtype = np.int16) - 1			# One spare column for fizzle reinsertion
+		self.deckLen = np.zeros((B, SLOTS), dtype = np.int16)
+		self.hand = np.zeros((B, SLOTS), dtype = np.int8)
+		self.round = np.zeros(B, dtype = np.int32) + state.round
+		self.outcome = np.zeros(B, dtype = np.int8) + Status.CONTINUE
+		self.tally = np.zeros((B, SLOTS), dtype = np.int64)
+
+		for p, memberID in enumerate(self.members):
+			if memberID is None: continue
+			mstate = state.members[memberID]
+			self.present[:, p] = True
+			self.health[:, p] = mstate.health
+			self.pips[:, p, :] = np.asarray(mstate.pips, dtype = np.int8)
+			self.status[:, p, :] = np.asarray(mstate.status, dtype = np.int8)
+			for i, modifier in enumerate(mstate.charms): self.charms[:, p, i] = modifierIndex[modifier]
+			self.charmCount[:, p] = len(mstate.charms)
+			for i, modifier in enumerate(mstate.wards): self.wards[:, p, i] = modifierIndex[modifier]
+			self.wardCount[:, p] = len(mstate.wards)
+			self.deck[:, p, :len(mstate.deck)] = [spellIndex[x] for x in mstate.deck]
+			self.deckLen[:, p] = len(mstate.deck)
+			self.hand[:, p] = mstate.hand
+
+			# Each battle gets its own shuffle of a player's deck (as loadStats() would have done)
+			if self.player[p] and len(mstate.deck) > 1:
+				order = np.argsort(self.rng.random((B, len(mstate.deck))), axis = 1)
+				self.deck[:, p, :len(mstate.deck)] = np.take_along_axis(self.deck[:, p, :len(mstate.deck)], order, axis = 1)
+
+		self._rows = np.arange(B)
+
+	# Assign the selection policy of a member
+	def setPolicy(self, memberID, policy):
+		self.policies[self.members.index(memberID)] = policy
+
+	# -- CORE OPERATION --
+
+	# Play every battle to completion (or until maxRounds, which ends the battle as a stalemate)
+	# The starting state must be at a round boundary (no events left in the round)
+	# Returns the outcome array (datatypes.Status values)
+	def run(self, maxRounds = 1000):
+		while True:
+			active = self.outcome == Status.CONTINUE
+			if not active.any(): break
+			self._updateRound(active)
+
+			capped = (self.outcome == Status.CONTINUE) & (self.round > maxRounds)
+			self.outcome[capped] = Status.STALEMATE
+
+			# Members act in the order of the battle circle (starting from state.first)
+			# Members defeated before the round began have no turn
+			alive = self.present & (self.health > 0)
+			for x in range(SLOTS):
+				p = (self.first + x) % SLOTS
+				rows = np.nonzero((self.outcome == Status.CONTINUE) & alive[:, p])[0]
+				if len(rows) > 0: self._turn(p, rows)
+
+		return self.outcome
+
+	# One member turn (in every battle of rows)
+	def _turn(self, p, rows):
+		# Members defeated earlier in the round pass
+		rows = rows[self.health[rows, p] > 0]
+		if len(rows) == 0: return
+
+		policy = self.policies[p]
+		if policy is None: raise AssertionError(f"No policy for member '{self.members[p]}'")
+		spellIdx, target = policy(self, p, rows)
+		spellIdx = np.asarray(spellIdx, dtype = np.int16)
+		target = np.asarray(target, dtype = np.int8)
+
+		# -- PLANNING (Simulation.validateSpell()) --
+		valid = (spellIdx >= 0) & (spellIdx < self.deckLen[rows, p]) & (self.status[rows, p, StatusEffect.STUNNED] <= 0)
+		spell = np.where(valid, self.deck[rows, p, np.maximum(spellIdx, 0)], 0)
+		cost = self.spellCost[spell]
+		basic, power, affordable = self._splitPips(rows, p, cost, self.mastery[p, spell])
+		valid &= affordable
+
+		rows, spellIdx, target, spell, basic, power = rows[valid], spellIdx[valid], target[valid], spell[valid], basic[valid], power[valid]
+		if len(rows) == 0: return
+
+		# Players pull the spell from their deck
+		if self.player[p]: self._deckRemove(rows, p, spellIdx)
+
+		# -- CAST --
+		success = (self.spellRate[spell] + self.accuracy[p, spell]) > self.rng.random(len(rows))
+		fizzled = ~success
+		if self.player[p] and fizzled.any():
+			frows = rows[fizzled]
+			self._deckInsert(frows, p, (self.rng.random(len(frows)) * (self.deckLen[frows, p] + 1)).astype(np.int16), spell[fizzled])
+
+		rows, target, spell, basic, power = rows[success], target[success], spell[success], basic[success], power[success]
+		if len(rows) == 0: return
+
+		self.pips[rows, p, Pip.BASIC] -= basic.astype(np.int8)
+		self.pips[rows, p, Pip.POWER] -= power.astype(np.int8)
+
+		# An empty target slot is a simulation error (as in advance())
+		empty = ~self.present[rows, target]
+		if empty.any():
+			self.outcome[rows[empty]] = Status.ERROR
+			rows, target, spell = rows[~empty], target[~empty], spell[~empty]
+
+		# -- ACTIONS --
+		outgoingMod = 1 + self.damageMult[p, spell]
+		incomingMod = np.ones(len(rows))
+		for a in range(self.actionType.shape[1]):
+			atype = self.actionType[spell, a]
+
+			mask = atype == ActionType.CHARM
+			if mask.any(): self._stackPush(self.charms, self.charmCount, rows[mask], target[mask], self.actionModifier[spell[mask], a])
+
+			mask = atype == ActionType.WARD
+			if mask.any(): self._stackPush(self.wards, self.wardCount, rows[mask], target[mask], self.actionModifier[spell[mask], a])
+
+			mask = atype == ActionType.DAMAGE
+			if not mask.any(): continue
+			drows, dtarget, dspell = rows[mask], target[mask], spell[mask]
+
+			# Base damage from the range / distribution
+			cumulative = self.damageCumulative[dspell, a]
+			pick = (self.rng.random(len(drows))[:, None] >= cumulative).sum(axis = 1)
+			base = self.damageRange[dspell, a, np.minimum(pick, cumulative.shape[1] - 1)]
+
+			# First damage charm (newest first) applies; the oldest charm is consumed
+			value, used = self._stackFind(self.charms, self.charmCount, drows, np.full(len(drows), p))
+			outgoingMod[mask] *= np.where(used, 1 + value, 1)
+			self._stackPop(self.charms, self.charmCount, drows[used], np.full(used.sum(), p))
+
+			value, used = self._stackFind(self.wards, self.wardCount, drows, dtarget)
+			incomingMod[mask] *= np.where(used, 1 - value, 1)
+			self._stackPop(self.wards, self.wardCount, drows[used], dtarget[used])
+
+			incomingMod[mask] *= 1 - self.resist[dtarget, dspell]
+			damage = np.round(base * outgoingMod[mask] * incomingMod[mask]).astype(np.int32)
+
+			self.health[drows, dtarget] = np.maximum(0, self.health[drows, dtarget] - damage)
+			np.add.at(self.tally[:, p], drows, damage)
+
+	# End of round (Simulation.advance() with no events left, then updateRound())
+	def _updateRound(self, active):
+		rows = np.nonzero(active)[0]
+
+		# Victory is evaluated before the update
+		health = np.where(self.present[rows], self.health[rows], 0)
+		friendly = health[:, :4].sum(axis = 1)
+		enemy = health[:, 4:].sum(axis = 1)
+
+		self.round[rows] += 1
+
+		# Defeated NPCs leave the battle circle
+		defeated = self.present[rows] & (self.health[rows] <= 0)
+		self.present[rows] &= ~(defeated & ~self.player)
+
+		# Pip gain for the members still standing (only below the maximum of 7)
+		alive = self.present[rows] & (self.health[rows] > 0)
+		power = self.rng.random((len(rows), SLOTS)) < self.powerpip
+		room = self.pips[rows].sum(axis = 2) < 7
+		gain = alive & room
+		self.pips[rows, :, Pip.POWER] += (gain & power).astype(np.int8)
+		self.pips[rows, :, Pip.BASIC] += (gain & ~power).astype(np.int8)
+		self.hand[rows] = np.where(alive & self.player, 7, self.hand[rows])
+
+		self.outcome[rows[(friendly > 0) & (enemy == 0)]] = Status.A_VICTORY
+		self.outcome[rows[friendly == 0]] = Status.B_VICTORY
+
+	# -- ARRAY HELPERS --
+
+	# Vectorized Member.splitPips()
+	# Returns (basic, power, affordable)
+	def _splitPips(self, rows, p, cost, mastery):
+		basicHeld = self.pips[rows, p, Pip.BASIC].astype(np.int16)
+		powerHeld = self.pips[rows, p, Pip.POWER].astype(np.int16)
+		cost = cost.astype(np.int16)
+
+		power = np.where(mastery, np.minimum(powerHeld, cost // 2), 0)
+		basic = cost - 2 * power
+		over = np.maximum(0, basic - basicHeld)
+		power = power + over
+		basic = basic - over
+		return basic, power, power <= powerHeld
+
+	def _deckRemove(self, rows, p, idx):
+		deck = self.deck[rows, p]
+		cols = np.arange(deck.shape[1])[None, :]
+		shifted = np.where(cols < idx[:, None], deck, np.roll(deck, -1, axis = 1))
+		shifted[:, -1] = -1
+		self.deck[rows, p] = shifted
+		self.deckLen[rows, p] -= 1
+		self.hand[rows, p] -= 1
+
+	def _deckInsert(self, rows, p, idx, spell):
+		deck = self.deck[rows, p]
+		cols = np.arange(deck.shape[1])[None, :]
+		shifted = np.where(cols < idx[:, None], deck, np.roll(deck, 1, axis = 1))
+		shifted[cols == idx[:, None]] = spell
+		self.deck[rows, p] = shifted
+		self.deckLen[rows, p] += 1
+
+	# Insert modifiers at the front of a stack (deque.insert(0, ...))
+	def _stackPush(self, stack, count, rows, slots, modifier):
+		stack[rows, slots] = np.roll(stack[rows, slots], 1, axis = 1)
+		stack[rows, slots, 0] = modifier
+		count[rows, slots] = np.minimum(count[rows, slots] + 1, stack.shape[2])
+
+	# Remove the oldest modifier of a stack (deque.pop())
+	def _stackPop(self, stack, count, rows, slots):
+		if len(rows) == 0: return
+		count[rows, slots] -= 1
+		stack[rows, slots, count[rows, slots]] = -1
+
+	# Value of the first (newest) DAMAGE_MULT modifier in a stack
+	# Returns (value, found)
+	def _stackFind(self, stack, count, rows, slots):
+		entries = stack[rows, slots]
+		match = self.modType[entries] == ModifierType.DAMAGE_MULT
+		match &= np.arange(entries.shape[1])[None, :] < count[rows, slots][:, None]
+		found = match.any(axis = 1)
+		first = match.argmax(axis = 1)
+		return self.modValue[entries[self._rows[:len(rows)], first]], found
+
+	# -- RESULTS --
+
+	# Simulation.evalState() of every battle (as a float array)
+	def evaluate(self):
+		health = np.where(self.present, self.health, 0)
+		return _evaluate(health[:, :4].sum(axis = 1).astype(np.float64), health[:, 4:].sum(axis = 1).astype(np.float64))
+
+	# Outcome distributions in the same form as the scalar batch runner
+	def result(self):
+		result = BatchResult()
+		result.battles = self.battles
+		statuses, counts = np.unique(self.outcome, return_counts = True)
+		result.outcomes = {Status(int(s)): int(c) for s, c in zip(statuses, counts)}
+		rounds, counts = np.unique(self.round, return_counts = True)
+		result.rounds = {int(r): int(c) for r, c in zip(rounds, counts)}
+
+		for p, memberID in enumerate(self.members):
+			if memberID is None: continue
+			health, counts = np.unique(self.health[:, p], return_counts = True)
+			result.health[memberID] = {int(h): int(c) for h, c in zip(health, counts)}
+			result.damage[memberID] = int(self.tally[:, p].sum())
+
+		return result
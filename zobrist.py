@@ -0,0 +1,69 @@
+# zobrist.py
+# Zobrist-style hashing support for battle states
+# Every (owner, attribute, index, value) feature maps to a fixed pseudo-random 64-bit key;
+#   a state hash is the XOR of the keys of all its features (see State.hash())
+# Also provides the bounded transposition table used to share results between equal positions
+
+from collections import OrderedDict
+from enum import IntEnum
+from hashlib import blake2b
+
+MASK = (1 << 64) - 1
+
+# Keys are derived from the feature itself (not drawn from a generator) so they are identical
+#   in every process, regardless of PYTHONHASHSEED or the order in which features are first seen
+_keys = {}
+
+def zkey(*feature):
+	key = _keys.get(feature)
+	if key is None:
+		# Enums compare equal to their values, so normalize them before deriving the key
+		stable = tuple(int(x) if isinstance(x, IntEnum) else x for x in feature)
+		key = int.from_bytes(blake2b(repr(stable).encode(), digest_size = 8).digest(), "little")
+		_keys[feature] = key
+	return key
+
+
+# Bounded map of state hash -> result with least-recently-used eviction
+# Keys are usually State.hash() (optionally combined with other data in a tuple)
+class TranspositionTable:
+	def __init__(self, capacity = 1 << 16):
+		assert capacity > 0
+		self.capacity = capacity
+		self._entries = OrderedDict()
+
+		# Statistics (for tuning the capacity)
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def __len__(self):
+		return len(self._entries)
+
+	def __contains__(self, key):
+		return key in self._entries
+
+	# Returns the stored value (marking it as recently used) or default
+	def get(self, key, default = None):
+		value = self._entries.get(key, self)
+		if value is self:
+			self.misses += 1
+			return default
+
+		self._entries.move_to_end(key)
+		self.hits += 1
+		return value
+
+	# Store a value, evicting the least recently used entry if the table is full
+	def put(self, key, value):
+		if key in self._entries: self._entries.move_to_end(key)
+		elif len(self._entries) >= self.capacity:
+			self._entries.popitem(last = False)
+			self.evictions += 1
+		self._entries[key] = value
+
+	def clear(self):
+		self._entries.clear()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0